@@ -0,0 +1,75 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# مقایسه دو گزارش bench/run_bench.py (مثلاً پیش و پس از یک تغییر): زمان هر مرحله، توان عملیاتی هر stage،
+# اوج حافظه و اوج فضای موقت. با --threshold اگر افت یکی از مقادیر بیش از درصد داده شده باشد کد خروج 1 است.
+_PHASE_FIELDS = (
+    ("wall_seconds", "زمان کل (s)", -1),
+    ("peak_rss_bytes", "اوج RSS (MB)", -1),
+    ("peak_temp_bytes", "اوج فضای موقت (MB)", -1),
+)
+_MB = 1024 * 1024
+
+
+def _load(path: str) -> dict:
+    report = json.loads(Path(path).read_text(encoding="utf-8"))
+    return {scenario["name"]: scenario for scenario in report["scenarios"]}
+
+
+def _change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def _format(field: str, value) -> str:
+    if value is None:
+        return "-"
+    return f"{value / _MB:.1f}" if field.endswith("_bytes") else f"{value:g}"
+
+
+def compare(baseline: dict, candidate: dict, threshold: float = None) -> list:
+    """جدول تغییرات را چاپ و لیست افت‌های بیش از threshold درصد را برمی‌گرداند (جهت 1 یعنی بزرگ‌تر بهتر است)."""
+    regressions = []
+    for name in sorted(set(baseline) & set(candidate)):
+        print(f"\n=== {name} ===")
+        for phase in ("backup", "restore"):
+            old, new = baseline[name]["phases"].get(phase, {}), candidate[name]["phases"].get(phase, {})
+            rows = [(label, field, old.get(field), new.get(field), direction)
+                    for field, label, direction in _PHASE_FIELDS]
+            for stage in sorted(set(old.get("stages", {})) | set(new.get("stages", {}))):
+                rows.append((f"{stage} MB/s", "mb_per_second", old.get("stages", {}).get(stage, {}).get("mb_per_second"),
+                             new.get("stages", {}).get(stage, {}).get("mb_per_second"), 1))
+            print(f"  [{phase}]")
+            for label, field, before, after, direction in rows:
+                if before is None or after is None:
+                    print(f"    {label:<24} {_format(field, before):>10} → {_format(field, after):>10}")
+                    continue
+                change = _change(before, after)
+                print(f"    {label:<24} {_format(field, before):>10} → {_format(field, after):>10}  ({change:+.1f}%)")
+                if threshold is not None and change * direction < -threshold:
+                    regressions.append(f"{name}/{phase}/{label}: {change:+.1f}%")
+        if not candidate[name].get("integrity", False):
+            regressions.append(f"{name}: بررسی درستی داده بازیابی شده ناموفق بود")
+    for name in sorted(set(baseline) ^ set(candidate)):
+        print(f"\n⚠️ سناریو '{name}' فقط در یکی از دو گزارش وجود دارد.")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="مقایسه دو گزارش بنچمارک Cloud Haven")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, help="حداکثر افت مجاز به درصد")
+    args = parser.parse_args(argv)
+    regressions = compare(_load(args.baseline), _load(args.candidate), args.threshold)
+    if regressions:
+        print("\n❌ افت عملکرد:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+from bench.synthetic import iter_dump, digest_stream
+from drivers.mysql_driver import MySQLDriver
+from drivers.postgres_driver import PostgresDriver
+
+# پیاده‌سازی ابزارهای جعلی دیتابیس برای بنچمارک (اسکریپت‌های bench/fakebin فقط این ماژول را صدا می‌زنند).
+# agent آن‌ها را از طریق postgres_bin_path / mysql_bin_path پیدا می‌کند. ابزارهای dump یک dump مصنوعی تولید
+# و ابزارهای بازیابی ورودی خود را فقط می‌خوانند؛ هر دو حجم و SHA-256 جریان را در CH_BENCH_REPORT_DIR ثبت می‌کنند
+# تا بنچمارک درستی چرخه بکاپ و بازیابی را هم بررسی کند. کوئری‌های حجم و تعداد جداول برنامه‌ریز بکاپ
+# (psql -c و mysql -e) با حجم dump مصنوعی و یک جدول پاسخ داده می‌شوند.
+#   CH_BENCH_SIZE_MB          حجم dump (پیش‌فرض 64)
+#   CH_BENCH_COMPRESSIBILITY  بین 0 و 1 (پیش‌فرض 0.5)
+#   CH_BENCH_REPORT_DIR       پوشه گزارش dump.json و restore.json
+DIRECTORY_FILES = 4
+READ_SIZE = 1024 * 1024
+
+
+def _report(name: str, size: int, sha256: str):
+    report_dir = os.environ.get("CH_BENCH_REPORT_DIR")
+    if report_dir:
+        with open(Path(report_dir) / f"{name}.json", "w", encoding="utf-8") as f:
+            json.dump({"bytes": size, "sha256": sha256}, f)
+
+
+def _option(args: list, flag: str, default=None):
+    return args[args.index(flag) + 1] if flag in args else default
+
+
+def _dump_size() -> int:
+    return int(float(os.environ.get("CH_BENCH_SIZE_MB", "64")) * 1024 * 1024)
+
+
+def _dump_chunks(dialect: str):
+    return iter_dump(_dump_size(), float(os.environ.get("CH_BENCH_COMPRESSIBILITY", "0.5")), dialect)
+
+
+def _answer_query(sql: str) -> int:
+    """پاسخ کوئری‌های پروفایل دیتابیس (یک مقدار در یک سطر، مانند psql -tA و mysql --batch --skip-column-names)."""
+    answers = {}
+    for driver in (PostgresDriver, MySQLDriver):
+        answers[driver.DATABASE_SIZE_SQL] = _dump_size()
+        answers[driver.TABLE_COUNT_SQL] = 1
+    if sql not in answers:
+        sys.stderr.write(f"bench: query is not simulated: {sql}\n")
+        return 2
+    sys.stdout.write(f"{answers[sql]}\n")
+    return 0
+
+
+def _write_dump(chunks, out) -> tuple:
+    def tee():
+        for chunk in chunks:
+            out.write(chunk)
+            yield chunk
+    result = digest_stream(tee())
+    out.flush()
+    return result
+
+
+def _read_input(source) -> tuple:
+    return digest_stream(iter(lambda: source.read(READ_SIZE), b""))
+
+
+def pg_dump(args: list) -> int:
+    dump_format, target = _option(args, "-F", "p"), _option(args, "-f")
+    if dump_format == "d":
+        # فرمت directory: جریان به ترتیب در چند فایل .dat پشت سر هم نوشته می‌شود
+        directory = Path(target)
+        directory.mkdir(parents=True)
+        (directory / "toc.dat").write_bytes(b"PGDMP-bench-toc\n")
+        per_file = _dump_size() // DIRECTORY_FILES + 1
+        files = [open(directory / f"{3000 + index}.dat", "wb") for index in range(DIRECTORY_FILES)]
+        try:
+            def spread():
+                written = 0
+                for chunk in _dump_chunks("postgresql"):
+                    files[min(written // per_file, DIRECTORY_FILES - 1)].write(chunk)
+                    written += len(chunk)
+                    yield chunk
+            _report("dump", *digest_stream(spread()))
+        finally:
+            for f in files:
+                f.close()
+        return 0
+    if target:
+        with open(target, "wb") as out:
+            _report("dump", *_write_dump(_dump_chunks("postgresql"), out))
+    else:
+        _report("dump", *_write_dump(_dump_chunks("postgresql"), sys.stdout.buffer))
+    return 0
+
+
+def pg_restore(args: list) -> int:
+    source = args[-1] if args and not args[-1].startswith("-") and os.path.exists(args[-1]) else None
+    if source and os.path.isdir(source):
+        def gather():
+            for index in range(DIRECTORY_FILES):
+                with open(Path(source) / f"{3000 + index}.dat", "rb") as f:
+                    yield from iter(lambda: f.read(READ_SIZE), b"")
+        _report("restore", *digest_stream(gather()))
+        return 0
+    with (open(source, "rb") if source else sys.stdin.buffer) as f:
+        _report("restore", *_read_input(f))
+    return 0
+
+
+def mysqldump(args: list) -> int:
+    if "--no-data" in args or "--no-create-info" in args:
+        sys.stderr.write("bench: the parallel MySQL dump format is not simulated\n")
+        return 2
+    _report("dump", *_write_dump(_dump_chunks("mysql"), sys.stdout.buffer))
+    return 0
+
+
+def restore_from_stdin(args: list) -> int:
+    query = _option(args, "-c") or _option(args, "-e")
+    if query is not None:
+        return _answer_query(query)
+    if "--unbuffered" in args:
+        sys.stderr.write("bench: interactive queries are not simulated\n")
+        return 2
+    _report("restore", *_read_input(sys.stdin.buffer))
+    return 0
+
+
+TOOLS = {
+    "pg_dump": pg_dump,
+    "pg_restore": pg_restore,
+    "psql": restore_from_stdin,
+    "mysql": restore_from_stdin,
+    "mysqldump": mysqldump,
+    "createdb": lambda args: 0,
+    "dropdb": lambda args: 0,
+}
+
+
+def main(tool: str, args: list) -> int:
+    return TOOLS[tool](args)
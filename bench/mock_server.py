@@ -0,0 +1,275 @@
+import argparse
+import hashlib
+import json
+import queue
+import re
+import shutil
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from websockets.exceptions import ConnectionClosed
+from websockets.server import ServerProtocol
+from websockets.sync.connection import Connection
+
+# جایگزین محلی سرور Cloud Haven برای بنچمارک و آزمایش دستی agent. اشیاء روی دیسک (root/<bucket>/<object>)
+# ذخیره می‌شوند و همه مسیرهایی که agent استفاده می‌کند روی یک پورت پاسخ داده می‌شوند:
+#   PUT    /api/v1/storage/upload/{bucket}/{object}
+#   GET    /api/v1/storage/download/{bucket}/{object}           (با پشتیبانی Range)
+#   GET    /api/v1/storage/list/{bucket}
+#   DELETE /api/v1/storage/delete/{bucket}/{object}
+#   POST/PUT/DELETE /api/v1/storage/multipart/...                (آپلود چندبخشی)
+#   GET    /api/v1/agent/my-schedules
+#   GET    /api/v1/clients/ws                                    (WebSocket فرمان‌ها و رویدادها)
+_MULTIPART_RE = re.compile(r"^/api/v1/storage/multipart/([^/]+)/([^/]+)(?:/([^/]+)(?:/(\d+|complete))?)?$")
+_OBJECT_RE = re.compile(r"^/api/v1/storage/(upload|download|delete)/([^/]+)/([^/]+)$")
+
+
+class MockServer:
+    """
+    سرور ساختگی در نخ پس‌زمینه. schedules پاسخ my-schedules است، send_command یک فرمان را برای agent متصل
+    ارسال می‌کند و پیام‌های دریافتی از agent (identify، job_status، job_metrics) در messages جمع می‌شوند.
+    """
+
+    def __init__(self, root: Path, host: str = "127.0.0.1", port: int = 0, schedules: list = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.schedules = schedules or []
+        self.messages = []
+        self.stats = {"requests": 0, "bytes_in": 0, "bytes_out": 0, "connections": 0}
+        self._commands = queue.Queue()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def send_command(self, command: dict):
+        self._commands.put(command)
+
+    def count(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def object_path(self, bucket: str, name: str) -> Path:
+        return self.root / bucket / name
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(_Handler):
+            mock = server
+        return Handler
+
+
+class _PrefixedSocket:
+    """سوکتی که ابتدا بایت‌های از پیش بافر شده توسط rfile (فریم‌های اولیه WebSocket) را برمی‌گرداند."""
+
+    def __init__(self, sock, pending: bytes):
+        self._sock = sock
+        self._pending = pending
+
+    def recv(self, size: int) -> bytes:
+        if self._pending:
+            data, self._pending = self._pending[:size], self._pending[size:]
+            return data
+        return self._sock.recv(size)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    mock: MockServer = None
+
+    def setup(self):
+        super().setup()
+        self.mock.count(connections=1)
+
+    def log_message(self, *args):
+        pass
+
+    # ----------------------------------------------------------------- I/O
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+            body = b"".join(parts)
+        else:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.mock.count(requests=1, bytes_in=len(body))
+        return body
+
+    def _reply(self, status: int, body: bytes = b"", headers: dict = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.mock.count(bytes_out=len(body))
+
+    def _json(self, payload, status: int = 200):
+        self._reply(status, json.dumps(payload).encode(), {"Content-Type": "application/json"})
+
+    # ------------------------------------------------------------- routes
+    def do_PUT(self):
+        body = self._read_body()
+        match = _OBJECT_RE.match(self.path)
+        if match and match.group(1) == "upload":
+            path = self.mock.object_path(match.group(2), match.group(3))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(body)
+            return self._json({"object": match.group(3), "size": len(body)})
+        match = _MULTIPART_RE.match(self.path)
+        if match and match.group(4) and match.group(4) != "complete":
+            part_dir = self.mock.root / ".multipart" / match.group(3)
+            if not part_dir.is_dir():
+                return self._reply(404)
+            (part_dir / f"{int(match.group(4)):06d}").write_bytes(body)
+            return self._reply(200, headers={"ETag": f'"{uuid.uuid4().hex}"'})
+        self._reply(404)
+
+    def do_POST(self):
+        body = self._read_body()
+        match = _MULTIPART_RE.match(self.path)
+        if not match:
+            return self._reply(404)
+        bucket, name, upload_id, tail = match.groups()
+        if upload_id is None:
+            upload_id = uuid.uuid4().hex
+            (self.mock.root / ".multipart" / upload_id).mkdir(parents=True)
+            return self._json({"upload_id": upload_id})
+        if tail != "complete":
+            return self._reply(404)
+        part_dir = self.mock.root / ".multipart" / upload_id
+        numbers = [part["part_number"] for part in json.loads(body or b"{}").get("parts", [])]
+        path = self.mock.object_path(bucket, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as out:
+            for number in sorted(numbers):
+                with open(part_dir / f"{number:06d}", "rb") as part:
+                    shutil.copyfileobj(part, out)
+        shutil.rmtree(part_dir, ignore_errors=True)
+        self._json({"object": name, "size": path.stat().st_size})
+
+    def do_DELETE(self):
+        self._read_body()
+        match = _OBJECT_RE.match(self.path)
+        if match and match.group(1) == "delete":
+            self.mock.object_path(match.group(2), match.group(3)).unlink(missing_ok=True)
+            return self._reply(204)
+        match = _MULTIPART_RE.match(self.path)
+        if match and match.group(3):
+            shutil.rmtree(self.mock.root / ".multipart" / match.group(3), ignore_errors=True)
+            return self._reply(204)
+        self._reply(404)
+
+    def do_GET(self):
+        self.mock.count(requests=1)
+        if self.path == "/api/v1/clients/ws":
+            return self._websocket()
+        if self.path.split("?")[0] == "/api/v1/agent/my-schedules":
+            body = json.dumps(self.mock.schedules).encode()
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._reply(304, headers={"ETag": etag})
+            return self._reply(200, body, {"Content-Type": "application/json", "ETag": etag})
+        if self.path.startswith("/api/v1/storage/list/"):
+            # cursor پشتیبانی نمی‌شود (لیست کامل)، اما ETag برای همگام‌سازی کاتالوگ agent پشتیبانی می‌شود
+            bucket_dir = self.mock.root / self.path.split("?")[0].rsplit("/", 1)[1]
+            files = sorted(p.name for p in bucket_dir.iterdir()) if bucket_dir.is_dir() else []
+            etag = f'"{hashlib.sha1("/".join(files).encode()).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._reply(304, headers={"ETag": etag})
+            return self._reply(200, json.dumps({"files": files}).encode(),
+                               {"Content-Type": "application/json", "ETag": etag})
+        match = _OBJECT_RE.match(self.path)
+        if not match or match.group(1) != "download":
+            return self._reply(404)
+        path = self.mock.object_path(match.group(2), match.group(3))
+        if not path.is_file():
+            return self._reply(404)
+        size = path.stat().st_size
+        requested = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        with open(path, "rb") as f:
+            if requested:
+                start = int(requested.group(1))
+                end = min(int(requested.group(2) or size - 1), size - 1)
+                f.seek(start)
+                return self._reply(206, f.read(end - start + 1), {"Content-Range": f"bytes {start}-{end}/{size}"})
+            self.send_response(200)
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+            self.mock.count(bytes_out=size)
+
+    def _websocket(self):
+        """ارتقای همین اتصال HTTP به WebSocket؛ فرمان‌های صف ارسال و پیام‌های agent ثبت می‌شوند."""
+        # درخواست handshake دوباره به پروتکل داده می‌شود تا parser آن به مرحله دریافت فریم‌ها برود
+        protocol = ServerProtocol()
+        protocol.receive_data(self.raw_requestline + b"".join(
+            f"{key}: {value}\r\n".encode("latin-1") for key, value in self.headers.items()) + b"\r\n")
+        response = protocol.accept(protocol.events_received()[0])
+        protocol.send_response(response)
+        self.connection.sendall(b"".join(protocol.data_to_send()))
+        self.close_connection = True
+        if response.status_code != 101:
+            return
+        # ممکن است کلاینت بلافاصله پس از handshake پیام فرستاده و rfile آن را بافر کرده باشد
+        self.connection.setblocking(False)
+        try:
+            pending = self.rfile.read1(len(self.rfile.peek()))
+        finally:
+            self.connection.setblocking(True)
+        websocket = Connection(_PrefixedSocket(self.connection, pending), protocol)
+        try:
+            while True:
+                try:
+                    while True:
+                        websocket.send(json.dumps(self.mock._commands.get_nowait()))
+                except queue.Empty:
+                    pass
+                try:
+                    message = websocket.recv(timeout=0.2)
+                except TimeoutError:
+                    continue
+                with self.mock._lock:
+                    self.mock.messages.append(json.loads(message))
+        except ConnectionClosed:
+            pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="سرور محلی ساختگی Cloud Haven برای بنچمارک و آزمایش agent")
+    parser.add_argument("--root", default="bench_storage", help="پوشه ذخیره اشیاء")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    mock = MockServer(Path(args.root), port=args.port)
+    print(f"🧪 سرور ساختگی روی {mock.url} (ذخیره‌سازی در '{args.root}')")
+    try:
+        mock._httpd.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# بنچمارک چرخه کامل بکاپ و بازیابی روی dump مصنوعی، ابزارهای جعلی (bench/fakebin) و سرور ساختگی محلی.
+# هر مرحله (backup / restore) هر سناریو در یک پروسس فرزند جدا اجرا می‌شود تا اوج مصرف حافظه (RSS) هر مرحله
+# مستقل اندازه‌گیری شود. خروجی یک گزارش JSON است که با bench/compare.py با گزارش دیگری مقایسه می‌شود.
+#
+#   python -m bench.run_bench --db postgresql,mysql --mode file,streaming,dedup --size-mb 256 --output base.json
+REPO_ROOT = Path(__file__).resolve().parent.parent
+FAKEBIN = REPO_ROOT / "bench" / "fakebin"
+REPORT_VERSION = 1
+SAMPLE_INTERVAL = 0.1
+_DB_CONFIG = {
+    "postgresql": {"host": "localhost", "port": 5432, "dbname": "bench", "user": "bench", "password": "bench"},
+    "mysql": {"host": "localhost", "port": 3306, "database": "bench", "user": "bench", "password": "bench"},
+}
+
+
+def build_job(db: str, mode: str, codec: str) -> dict:
+    """codec می‌تواند سطح را هم مشخص کند، مثلاً 'gzip:1' یا 'pgzip:adaptive'."""
+    codec, _, level = codec.partition(":")
+    compression = {"codec": codec, **({"level": level if level == "adaptive" else int(level)} if level else {})}
+    # streaming صریحاً تعیین می‌شود تا برنامه‌ریز بکاپ حالت اجرای بنچمارک را عوض نکند
+    job = {"type": db, "bucket": "bench", "compression": compression, "streaming": mode == "streaming",
+           "config": dict(_DB_CONFIG[db])}
+    if mode == "dedup":
+        job["dedup"] = {"avg_kb": 1024}
+    elif mode not in ("file", "streaming"):
+        raise ValueError(f"حالت بنچمارک '{mode}' نامعتبر است (file، streaming یا dedup).")
+    return job
+
+
+def _directory_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class _DiskSampler:
+    """اوج حجم پوشه موقت agent را در طول یک مرحله نمونه‌برداری می‌کند."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _directory_size(self.path))
+            self._stop.wait(SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _directory_size(self.path))
+
+
+# ------------------------------------------------------------------ child process
+def _write_client_config(spec: dict):
+    import configparser
+    from utils.security import generate_key
+
+    if os.path.exists("client_config.ini"):
+        return  # مرحله restore از همان کلید و تنظیمات مرحله backup استفاده می‌کند
+    config = configparser.ConfigParser()
+    config["Auth"] = {"AccessToken": "bench-token"}
+    config["Security"] = {"EncryptionKey": generate_key().decode()}
+    config["Paths"] = {"postgres_bin_path": str(FAKEBIN), "mysql_bin_path": str(FAKEBIN)}
+    config["Upload"] = {"multipart": str(spec["multipart"]).lower(), "workers": str(spec["workers"])}
+    config["Download"] = {"parallel": str(spec["parallel_download"]).lower(), "workers": str(spec["workers"])}
+    with open("client_config.ini", "w") as f:
+        config.write(f)
+
+
+def run_phase(spec: dict) -> dict:
+    """یک مرحله (backup یا restore) را در پروسس جاری اجرا و نتیجه را برمی‌گرداند."""
+    from client_agent import ClientAgent
+
+    _write_client_config(spec)
+    job = spec["job"]
+    agent = ClientAgent(spec["server_url"], {"bench": job})
+    started = time.perf_counter()
+    with _DiskSampler(agent.temp_dir) as disk:
+        if spec["phase"] == "backup":
+            succeeded = agent.run_backup_job(job)
+        else:
+            objects = sorted(agent.list_backups(job["bucket"]))
+            succeeded = bool(objects) and agent.run_restore_job(job, objects[-1])
+    wall = time.perf_counter() - started
+    metrics = {}
+    metrics_path = agent.temp_dir / "metrics.jsonl"
+    if metrics_path.exists():
+        metrics = json.loads(metrics_path.read_text(encoding="utf-8").splitlines()[-1])
+    # ru_maxrss در لینوکس کیلوبایت و در macOS بایت است
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "succeeded": bool(succeeded),
+        "wall_seconds": round(wall, 3),
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "peak_children_rss_bytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+        "peak_temp_bytes": disk.peak,
+        "retries": metrics.get("retries", 0),
+        "stages": metrics.get("stages", {}),
+    }
+
+
+def _child_main(spec_path: str):
+    spec = json.loads(Path(spec_path).read_text(encoding="utf-8"))
+    os.chdir(spec["work_dir"])
+    result = run_phase(spec)
+    Path(spec["result_path"]).write_text(json.dumps(result), encoding="utf-8")
+
+
+# ----------------------------------------------------------------- orchestrator
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": _git_commit(),
+    }
+
+
+def _read_json(path: Path) -> dict:
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+
+def run_scenario(server, args, db: str, mode: str, codec: str, scratch: Path) -> dict:
+    name = f"{db}-{mode}-{codec}"
+    work_dir = scratch / name
+    report_dir = work_dir / "report"
+    report_dir.mkdir(parents=True)
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT), CH_BENCH_SIZE_MB=str(args.size_mb),
+               CH_BENCH_COMPRESSIBILITY=str(args.compressibility), CH_BENCH_REPORT_DIR=str(report_dir))
+    scenario = {"name": name, "db": db, "mode": mode, "codec": codec, "phases": {}}
+    print(f"🏁 [{datetime.now()}] سناریو '{name}'...")
+    for phase in ("backup", "restore"):
+        spec = {
+            "phase": phase, "job": build_job(db, mode, codec), "server_url": server.url,
+            "work_dir": str(work_dir), "result_path": str(work_dir / f"{phase}.result.json"),
+            "multipart": args.multipart, "parallel_download": args.parallel_download, "workers": args.workers,
+        }
+        spec_path = work_dir / f"{phase}.spec.json"
+        spec_path.write_text(json.dumps(spec), encoding="utf-8")
+        with open(work_dir / f"{phase}.log", "w", encoding="utf-8") as log:
+            subprocess.run([sys.executable, "-m", "bench.run_bench", "--child", str(spec_path)],
+                           cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+        result = _read_json(Path(spec["result_path"])) or {"succeeded": False}
+        scenario["phases"][phase] = result
+        if not result["succeeded"]:
+            print(f"❌ مرحله '{phase}' سناریو '{name}' ناموفق بود؛ لاگ: {work_dir / f'{phase}.log'}")
+            break
+    dump, restore = _read_json(report_dir / "dump.json"), _read_json(report_dir / "restore.json")
+    scenario["dump_bytes"] = dump.get("bytes", 0)
+    scenario["stored_bytes"] = _directory_size(server.root / "bench")
+    scenario["integrity"] = bool(dump) and dump.get("sha256") == restore.get("sha256")
+    status = "✅" if scenario["integrity"] else "❌"
+    print(f"{status} سناریو '{name}': " + ", ".join(
+        f"{phase} {result.get('wall_seconds', '-')}s" for phase, result in scenario["phases"].items()))
+    return scenario
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="بنچمارک چرخه کامل بکاپ و بازیابی Cloud Haven")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--db", default="postgresql", help="لیست جداشده با کاما: postgresql,mysql")
+    parser.add_argument("--mode", default="file,streaming", help="لیست جداشده با کاما: file,streaming,dedup")
+    parser.add_argument("--codec", default="gzip", help="لیست جداشده با کاما، مثلاً gzip,pgzip,zstd یا با سطح: gzip:1,pgzip:adaptive")
+    parser.add_argument("--size-mb", type=float, default=64)
+    parser.add_argument("--compressibility", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--no-multipart", dest="multipart", action="store_false")
+    parser.add_argument("--no-parallel-download", dest="parallel_download", action="store_false")
+    parser.add_argument("--keep", action="store_true", help="پوشه کاری بنچمارک پاک نشود")
+    parser.add_argument("--output", default="bench_report.json")
+    args = parser.parse_args(argv)
+    if args.child:
+        return _child_main(args.child)
+
+    from bench.mock_server import MockServer
+
+    scratch = Path(tempfile.mkdtemp(prefix="cloud_haven_bench_"))
+    server = MockServer(scratch / "storage").start()
+    report = {
+        "version": REPORT_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": _environment(),
+        "parameters": {"size_mb": args.size_mb, "compressibility": args.compressibility, "workers": args.workers,
+                       "multipart": args.multipart, "parallel_download": args.parallel_download},
+        "scenarios": [],
+    }
+    try:
+        for db in args.db.split(","):
+            for mode in args.mode.split(","):
+                for codec in args.codec.split(","):
+                    shutil.rmtree(server.root / "bench", ignore_errors=True)
+                    report["scenarios"].append(run_scenario(server, args, db.strip(), mode.strip(), codec.strip(),
+                                                            scratch))
+    finally:
+        server.stop()
+        if args.keep:
+            print(f"📁 پوشه کاری بنچمارک: {scratch}")
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+    Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"📄 گزارش بنچمارک در '{args.output}' ذخیره شد.")
+    return 0 if all(scenario["integrity"] for scenario in report["scenarios"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import base64
+import hashlib
+import os
+
+# تولید dump مصنوعی برای بنچمارک: سطرهای INSERT با اندازه کل و میزان فشرده‌پذیری قابل تنظیم.
+# compressibility بین 0 (هر سطر تماماً داده تصادفی) و 1 (هر سطر تماماً متن تکراری) است؛ نسبت
+# فشرده‌سازی واقعی در گزارش بنچمارک (مرحله compress) ثبت می‌شود.
+ROW_PAYLOAD = 160
+BLOCK_SIZE = 1024 * 1024
+_VOCABULARY = (b"customer order invoice shipped pending delivered returned warehouse tehran mashhad isfahan "
+               b"product category price quantity discount total status created updated ")
+_REPEATED = _VOCABULARY * (ROW_PAYLOAD // len(_VOCABULARY) + 2)
+
+
+def iter_dump(size_bytes: int, compressibility: float = 0.5, dialect: str = "postgresql", table: str = "bench_rows"):
+    """قطعات حدوداً BLOCK_SIZE بایتی یک dump SQL مصنوعی به حجم size_bytes را تولید می‌کند."""
+    compressibility = min(1.0, max(0.0, compressibility))
+    text_length = int(ROW_PAYLOAD * compressibility)
+    random_length = ROW_PAYLOAD - text_length
+    quote = b"`" if dialect == "mysql" else b'"'
+    prefix = b"INSERT INTO " + quote + table.encode() + quote + b" VALUES ("
+    header = (f"-- synthetic {dialect} dump: {size_bytes} bytes, compressibility {compressibility}\n"
+              f"CREATE TABLE {table} (id bigint, payload text);\n").encode()
+    rows_per_block = max(1, BLOCK_SIZE // (len(prefix) + ROW_PAYLOAD + 12))
+    produced, row_id, first = 0, 0, True
+    while produced < size_bytes:
+        # base64 داده تصادفی: تقریباً غیرقابل فشرده‌سازی و بدون کاراکترهای خاص SQL
+        noise = base64.b64encode(os.urandom(rows_per_block * random_length * 3 // 4 + 3))
+        rows = [header] if first else []
+        for index in range(rows_per_block):
+            row_id += 1
+            start = (row_id * 7) % len(_VOCABULARY)
+            rows.append(b"%s%d, '%s%s');\n" % (prefix, row_id, _REPEATED[start:start + text_length],
+                                               noise[index * random_length:(index + 1) * random_length]))
+        block = b"".join(rows)[:size_bytes - produced]
+        produced += len(block)
+        first = False
+        yield block
+
+
+def digest_stream(chunks) -> tuple:
+    """(تعداد بایت، SHA-256) یک جریان؛ برای مقایسه خروجی dump با ورودی ابزار بازیابی."""
+    sha256, size = hashlib.sha256(), 0
+    for chunk in chunks:
+        sha256.update(chunk)
+        size += len(chunk)
+    return size, sha256.hexdigest()
@@ -1,22 +1,39 @@
 import os
-import requests
 import socket
 import platform
 import configparser
 from pathlib import Path
 from datetime import datetime
 import subprocess
-import gzip
 import shutil
 import time
 import argparse
 import asyncio
+import threading
 import websockets
 import json
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 # فرض بر این است که این فایل‌ها در کنار agent وجود دارند
-from utils.security import generate_key, encrypt_file, decrypt_file
+from utils.security import generate_key, encrypt_file, decrypt_file, StreamEncryptor, StreamDecryptor
+from utils.pipeline import StreamPipeline, CHUNK_SIZE
+from utils.compression import (create_compressor, create_decompressor, decompress_file, suffix_for, strip_codec_suffix,
+                               compression_report, ADAPTIVE)
+from utils.transfer import MultipartUploader, RangedDownloader, RangeNotSupported, ManifestBuilder, MANIFEST_SUFFIX
+from utils.executor import JobExecutor, JobRejected, report_progress, current_task, QUEUE_SIZE
+from utils.metrics import JobMetrics, REGISTRY, append_jsonl, start_metrics_server, current as current_metrics
+from utils.resources import ResourceBudget, ResourceRequest
+from utils.dedup import DedupStore, ChunkIndex, DEDUP_SUFFIX, GC_GRACE_HOURS
+from utils.wal import WalArchiver, plan_restore, parse_target_time
+from utils.archive import extract_tar_stream
+from utils.transport import Transport, BandwidthLimiter, BandwidthSchedule
+from utils.catalog import BackupCatalog, backup_kind, manifest_checksum
+from utils.schedules import ScheduleSource, active_schedules, diff_schedules
+from utils.verify import DigestSink, verify_sampled, verify_dedup_sampled, QUICK_SAMPLES, VERIFY_MODES
+from utils.jobs import JobSource, RELOAD_SECONDS, DISCOVER_SECONDS
+from utils.planner import plan_backup, recent_runs, history_rates, pinned_settings, describe as describe_plan, PLANNED_KEYS
+from utils.toc import SectionedCompressor, SectionReader, TOC_SUFFIX, seal_toc, open_toc, find_table, table_count
+from drivers.base_driver import RESTORE_MODES
 from drivers.postgres_driver import PostgresDriver
 from drivers.mysql_driver import MySQLDriver
 
@@ -27,6 +44,16 @@ JOBS = {
     "pg_main": {
         "type": "postgresql",
         "bucket": "pg-main-backups",
+        "streaming": True,  # dump → فشرده‌سازی → رمزگذاری → آپلود بدون فایل موقت
+        "compression": {"codec": "pgzip", "level": 6, "workers": 8},  # gzip بلوکی و چند هسته‌ای
+        "dump": {"format": "plain", "toc": True},  # toc: فهرست جداول برای بازیابی تک‌جدول (run-restore --table)
+        # "dump": {"format": "directory", "jobs": 8},  # dump/restore موازی
+        # "dedup": {"avg_kb": 1024},  # فقط قطعات تغییر یافته آپلود می‌شوند
+        # "physical": {"slot": "cloud_haven"},  # بکاپ پایه + آرشیو پیوسته WAL برای بازیابی تا یک لحظه مشخص
+        # "restore": {"mode": "swap", "checks": ["SELECT count(*) > 0 FROM orders"]},  # بازیابی در staging و جایگزینی سریع
+        # "plan": False,  # خاموش کردن برنامه‌ریز بکاپ؛ کلیدهای streaming/dump/compression بالا همیشه ثابت می‌مانند
+        "priority": 10,  # هنگام هم‌زمانی جاب‌ها، اولویت بالاتر زودتر اجرا می‌شود
+        "deadline_minutes": 120,
         "config": {
             "host": "localhost", "port": 5432, "dbname": "online_shop",
             "user": "postgres", "password": "12345678"
@@ -35,6 +62,8 @@ JOBS = {
     "mysql_web": {
         "type": "mysql",
         "bucket": "mysql-web-backups",
+        # "dump": {"format": "parallel", "jobs": 8},  # dump/restore موازی جدول به جدول
+        # "plan": {"streaming": True},  # برنامه‌ریز فرمت dump و فشرده‌سازی را انتخاب می‌کند، اجرا همیشه جریانی
         "config": {
             "host": "localhost", "port": 3306, "database": "your_mysql_db",
             "user": "your_mysql_user", "password": "your_mysql_password"
@@ -48,12 +77,33 @@ JOBS = {
 class ClientAgent:
     def __init__(self, server_url: str, jobs_config: dict):
         self.server_url = server_url
+        # JOBS داخلی؛ با بخش [Jobs] جاب‌های پوشه کانفیگ به آن افزوده می‌شوند (reload_jobs)
+        self.builtin_jobs = jobs_config
         self.jobs_config = jobs_config
         self.config_path = Path("client_config.ini")
         self.config = configparser.ConfigParser()
         self.access_token = None
         self.encryption_key = None
         self.paths_config = {}
+        self.upload_config = {}
+        self.download_config = {}
+        self.executor_config = {}
+        self.resources_config = {}
+        self.bandwidth_config = {}
+        self.metrics_config = {}
+        self.jobs_section = {}
+        self.transport = None
+        self.uploader = None
+        self.downloader = None
+        self.executor = None
+        self.chunk_index = None
+        self.uplink_mbps = None
+        self.catalogs = {}
+        self.schedule_source = None
+        self.job_source = None
+        self._scheduled = {}
+        self._wal_archivers = {}
+        self._events = None
         self.temp_dir = Path("./temp_backups")
         self.temp_dir.mkdir(exist_ok=True)
         self._load_config()
@@ -71,6 +121,20 @@ class ClientAgent:
                 self.encryption_key = self.config['Security']['EncryptionKey'].encode()
             if 'Paths' in self.config:
                 self.paths_config = dict(self.config['Paths'])
+            if 'Upload' in self.config:
+                self.upload_config = dict(self.config['Upload'])
+            if 'Download' in self.config:
+                self.download_config = dict(self.config['Download'])
+            if 'Executor' in self.config:
+                self.executor_config = dict(self.config['Executor'])
+            if 'Resources' in self.config:
+                self.resources_config = dict(self.config['Resources'])
+            if 'Bandwidth' in self.config:
+                self.bandwidth_config = dict(self.config['Bandwidth'])
+            if 'Metrics' in self.config:
+                self.metrics_config = dict(self.config['Metrics'])
+            if 'Jobs' in self.config:
+                self.jobs_section = dict(self.config['Jobs'])
 
     def _save_config(self):
         with open(self.config_path, 'w') as f:
@@ -87,135 +151,1157 @@ class ClientAgent:
         if not self.access_token: raise ValueError("Token not found.")
         return {"Authorization": f"Bearer {self.access_token}"}
 
+    def _compression_settings(self, job_config: dict):
+        """
+        تنظیمات فشرده‌سازی جاب. در حالت تطبیقی بدون uplink_mbps، آخرین سرعت آپلود اندازه‌گیری شده به عنوان تخمین
+        ظرفیت آپلود داده می‌شود (در بکاپ فایلی آپلود پس از فشرده‌سازی انجام می‌شود و هم‌زمان قابل اندازه‌گیری نیست).
+        """
+        compression = job_config.get("compression")
+        if compression and compression.get("level") == ADAPTIVE and self.uplink_mbps and "uplink_mbps" not in compression:
+            return {**compression, "uplink_mbps": self.uplink_mbps}
+        return compression
+
     def _get_driver(self, job_config):
         db_type = job_config.get("type")
         bin_path = None
         if db_type == "postgresql":
             bin_path = self.paths_config.get("postgres_bin_path")
-            return PostgresDriver(job_config["config"], self.temp_dir, bin_path)
+            return PostgresDriver(job_config["config"], self.temp_dir, bin_path, self._compression_settings(job_config),
+                                  job_config.get("dump"), job_config.get("restore"))
         elif db_type == "mysql":
             bin_path = self.paths_config.get("mysql_bin_path")
-            return MySQLDriver(job_config["config"], self.temp_dir, bin_path)
+            return MySQLDriver(job_config["config"], self.temp_dir, bin_path, self._compression_settings(job_config),
+                               job_config.get("dump"), job_config.get("restore"))
         else:
             raise ValueError(f"درایور برای دیتابیس نوع '{db_type}' پشتیبانی نمی‌شود.")
 
-    def upload_backup(self, file_path: Path, bucket_name: str):
+    def _get_transport(self) -> Transport:
+        """
+        لایه انتقال مشترک (یک استخر اتصال keep-alive و یک محدودکننده پهنای باند بر اساس بخش [Bandwidth])؛
+        آپلودر، دانلودر و انبار dedup نیز از session همین لایه استفاده می‌کنند.
+        """
+        if self.transport is None:
+            pool_size = max(int(self.upload_config.get("workers", 4)), int(self.download_config.get("workers", 4)),
+                            int(self.executor_config.get("workers", 2))) + 2
+            self.transport = Transport(
+                self.server_url, self.get_headers, pool_size=pool_size,
+                limiter=BandwidthLimiter(BandwidthSchedule.from_config(self.bandwidth_config)),
+                proxies=self.no_proxy,
+            )
+        return self.transport
+
+    def _multipart_enabled(self) -> bool:
+        return self.upload_config.get("multipart", "false").lower() in ("1", "true", "yes", "on")
+
+    def _get_uploader(self) -> MultipartUploader:
+        """آپلودر چندبخشی را بر اساس بخش [Upload] فایل کانفیگ می‌سازد (یک بار برای هر agent)."""
+        if self.uploader is None:
+            self.uploader = MultipartUploader(
+                self.server_url, self.get_headers(), self.temp_dir / "upload_journal",
+                part_size=int(self.upload_config.get("part_size_mb", 16)) * 1024 * 1024,
+                workers=int(self.upload_config.get("workers", 4)),
+                max_retries=int(self.upload_config.get("max_retries", 5)),
+                proxies=self.no_proxy,
+                session=self._get_transport().session,
+            )
+        return self.uploader
+
+    def _part_size(self) -> int:
+        return int(self.upload_config.get("part_size_mb", 16)) * 1024 * 1024
+
+    def _parallel_download_enabled(self) -> bool:
+        return self.download_config.get("parallel", "false").lower() in ("1", "true", "yes", "on")
+
+    def _get_downloader(self) -> RangedDownloader:
+        """دانلودر موازی را بر اساس بخش [Download] فایل کانفیگ می‌سازد (یک بار برای هر agent)."""
+        if self.downloader is None:
+            self.downloader = RangedDownloader(
+                self.server_url, self.get_headers(),
+                range_size=int(self.download_config.get("range_size_mb", 16)) * 1024 * 1024,
+                workers=int(self.download_config.get("workers", 4)),
+                max_retries=int(self.download_config.get("max_retries", 5)),
+                proxies=self.no_proxy,
+                session=self._get_transport().session,
+            )
+        return self.downloader
+
+    def _get_executor(self) -> JobExecutor:
+        """executor جاب‌ها را بر اساس بخش [Executor] فایل کانفیگ می‌سازد (یک بار برای هر agent)."""
+        if self.executor is None:
+            budget = ResourceBudget(
+                dumps_per_host=int(self.resources_config.get("dumps_per_host", 1)),
+                cpu_workers=int(self.resources_config.get("cpu_workers", 0)) or None,
+                scratch_bytes=int(self.resources_config.get("scratch_mb", 0)) * 1024 * 1024,
+                upload_mbps=float(self.resources_config.get("upload_mbps", 0)),
+                scratch_dir=self.temp_dir,
+            )
+            self.executor = JobExecutor(
+                workers=int(self.executor_config.get("workers", 2)),
+                queue_size=self._queue_size(),
+                on_event=self._publish_event,
+                budget=budget,
+                history_path=self.temp_dir / "job_history.jsonl",
+            )
+            self.executor.start()
+        return self.executor
+
+    def _queue_size(self) -> int:
+        """اندازه صف executor؛ بدون تنظیم صریح، صف برای اجرای هم‌زمان زمان‌بندی همه جاب‌ها جا دارد."""
+        return int(self.executor_config.get("queue_size", max(QUEUE_SIZE, len(self.jobs_config))))
+
+    def _get_job_source(self):
+        """منبع جاب‌های پوشه کانفیگ (بخش [Jobs])، یا None اگر پوشه‌ای تنظیم نشده باشد."""
+        if self.job_source is None and self.jobs_section.get("dir"):
+            self.job_source = JobSource(
+                self.builtin_jobs, Path(self.jobs_section["dir"]),
+                lambda job_config: self._get_driver(job_config).list_databases(),
+                discover_seconds=float(self.jobs_section.get("discover_seconds", DISCOVER_SECONDS)),
+            )
+        return self.job_source
+
+    def reload_jobs(self, force: bool = False):
+        """
+        جاب‌ها را از پوشه کانفیگ دوباره می‌خواند و قالب‌ها را با دیتابیس‌های کشف شده گسترش می‌دهد. (اضافه شده،
+        تغییر یافته، حذف شده) یا None (بدون تغییر یا بدون پوشه جاب) برمی‌گرداند. (مسدودکننده است؛ در event loop
+        باید با asyncio.to_thread اجرا شود.)
+        """
+        source = self._get_job_source()
+        if source is None:
+            return None
+        changes = source.reload(force)
+        if changes is None:
+            return None
+        self.jobs_config = source.jobs
+        added, changed, removed = changes
+        print(f"🗂️ جاب‌ها به‌روز شدند: {len(self.jobs_config)} جاب ({len(added)} جدید، {len(changed)} تغییر یافته، "
+              f"{len(removed)} حذف شده).")
+        if self.executor is not None:
+            self.executor.queue_size = self._queue_size()
+        return changes
+
+    def _jobs_map(self) -> dict:
+        return {name: details['bucket'] for name, details in self.jobs_config.items()}
+
+    @staticmethod
+    def _job_resources(job_config: dict) -> ResourceRequest:
+        """
+        منابع مورد نیاز یک جاب: میزبان دیتابیس، نخ‌های CPU (کارگرهای dump موازی یا فشرده‌سازی، هر کدام بیشتر باشد)،
+        فضای دیسک موقت و پهنای باند آپلود. مقادیر را می‌توان با کلید 'resources' در JOBS صریحاً تعیین کرد.
+        """
+        overrides = job_config.get("resources", {})
+        config = job_config["config"]
+        compression_workers = int((job_config.get("compression") or {}).get("workers", 1))
+        dump_workers = int((job_config.get("dump") or {}).get("jobs", 1))
+        return ResourceRequest(
+            db_host=f"{config.get('host', 'localhost')}:{config.get('port', '')}",
+            cpu=overrides.get("cpu", max(compression_workers, dump_workers)),
+            scratch_bytes=int(overrides.get("scratch_mb", 0)) * 1024 * 1024,
+            bandwidth_mbps=overrides.get("bandwidth_mbps", 0),
+        )
+
+    def _get_dedup_store(self, job_config: dict) -> DedupStore:
+        """انبار قطعات dedup با تنظیمات قطعه‌بندی جاب؛ ایندکس محلی قطعات بین همه جاب‌ها مشترک است."""
+        if self.chunk_index is None:
+            self.chunk_index = ChunkIndex(self.temp_dir / "chunk_index.sqlite")
+        dedup = job_config.get("dedup")
+        return DedupStore(
+            self.server_url, self.get_headers(), self.encryption_key, self.chunk_index,
+            workers=int(self.upload_config.get("workers", 4)),
+            max_retries=int(self.upload_config.get("max_retries", 5)),
+            proxies=self.no_proxy,
+            chunking=dedup if isinstance(dedup, dict) else None,
+            session=self._get_transport().session,
+        )
+
+    def submit_job(self, job_name: str, action: str, file_name: str = None, params: dict = None):
+        """
+        یک جاب بکاپ/بازیابی/بررسی را برای اجرا در پس‌زمینه به executor می‌سپارد. params تنظیمات فرمان است:
+        برای بررسی {"mode": "quick" یا "full", "scratch_db": ..., "samples": ...} و برای بازیابی
+        {"table": ..., "target_schema": ...} (بازیابی تک‌جدول) یا {"swap": true} (بازیابی در staging و جایگزینی).
+        """
+        job_config = self.jobs_config[job_name]
+        deadline_minutes = job_config.get("deadline_minutes")
+        options = {
+            "priority": int(job_config.get("priority", 0)),
+            "deadline": time.time() + deadline_minutes * 60 if deadline_minutes else None,
+            "resources": self._job_resources(job_config),
+        }
+        if action == "backup":
+            return self._get_executor().submit(job_name, action, self.run_backup_job, job_config, **options)
+        if action == "gc":
+            return self._get_executor().submit(job_name, action, self.run_gc_job, job_config, **options)
+        if action == "rollback":
+            return self._get_executor().submit(job_name, action, self.run_rollback_job, job_config, **options)
+        params = params or {}
+        if action == "verify":
+            if not params.get("scratch_db"):
+                # بدون دیتابیس آزمایشی، بررسی سراغ سرور دیتابیس نمی‌رود
+                options["resources"].db_host = None
+            return self._get_executor().submit(job_name, action, self.run_verify_job, job_config, file_name,
+                                               params.get("mode", "quick"), params.get("scratch_db"),
+                                               int(params.get("samples", QUICK_SAMPLES)), **options)
+        return self._get_executor().submit(job_name, action, self.run_restore_job, job_config, file_name,
+                                           params.get("table"), params.get("target_schema"), params.get("swap"),
+                                           **options)
+
+    def _run_scheduled_backup(self, job_name: str):
+        try:
+            self.submit_job(job_name, "backup")
+        except JobRejected as e:
+            print(f"⏭️ [{datetime.now()}] اجرای زمان‌بندی شده '{job_name}' رد شد: {e}")
+
+    def _job_name(self, job_config: dict) -> str:
+        return next((name for name, config in self.jobs_config.items() if config is job_config), job_config["bucket"])
+
+    def _measured(self, job_config: dict, action: str, func, *args):
+        """
+        func را با یک JobMetrics متصل به نخ جاری اجرا می‌کند تا مراحل آن اندازه‌گیری شوند و در پایان خلاصه
+        آمار را ثبت می‌کند. بازگرداندن False یا رخ دادن خطا به معنی شکست جاب است.
+        """
+        metrics = JobMetrics(self._job_name(job_config), action)
+        task = current_task()
+        if task is not None:
+            metrics.queue_wait_seconds = task.started_at - task.submitted_at
+        result = False
+        try:
+            with metrics.bind():
+                result = func(*args)
+            return result
+        finally:
+            self._record_metrics(metrics.finish("failed" if result is False else "succeeded"))
+
+    def _record_metrics(self, summary: dict):
+        """خلاصه آمار جاب را در endpoint آمار، فایل metrics.jsonl و (در حالت سرویس) برای سرور ثبت می‌کند."""
+        REGISTRY.record_job(summary)
+        append_jsonl(self.temp_dir / "metrics.jsonl", summary)
+        upload = summary["stages"].get("upload", {})
+        if summary["status"] == "succeeded" and upload.get("bytes_in") and upload.get("seconds"):
+            self.uplink_mbps = round(upload["bytes_in"] * 8 / 1_000_000 / upload["seconds"], 2)
+        self._publish_event({"type": "job_metrics", **summary})
+        stages = "، ".join(
+            f"{name} {stats['seconds']}s" + (f" ({stats['mb_per_second']} MB/s)" if "mb_per_second" in stats else "")
+            for name, stats in summary["stages"].items()
+        )
+        print(f"📊 [{datetime.now()}] آمار '{summary['job']}' ({summary['action']}): "
+              f"{summary['duration_seconds']} ثانیه، {summary['retries']} تلاش مجدد — {stages or '-'}")
+
+    def _start_metrics_server(self):
+        """در صورت تعیین Port در بخش [Metrics]، endpoint متنی /metrics (قالب Prometheus) را اجرا می‌کند."""
+        port = int(self.metrics_config.get("port", 0))
+        if not port:
+            return
+        try:
+            start_metrics_server(port, self.metrics_config.get("bind", "127.0.0.1"))
+        except OSError as e:
+            print(f"⚠️ اجرای endpoint آمار روی پورت {port} ناموفق بود: {e}")
+
+    def _publish_event(self, event: dict):
+        """رویدادهای executor (از نخ کارگر) را به صف ارسال WebSocket در event loop منتقل می‌کند."""
+        if self._events is None:
+            return
+        events, loop = self._events
+        loop.call_soon_threadsafe(self._queue_event, events, event)
+
+    @staticmethod
+    def _queue_event(events: asyncio.Queue, event: dict):
+        if events.full():
+            # هنگام قطع طولانی اتصال، قدیمی‌ترین رویدادها کنار گذاشته می‌شوند
+            events.get_nowait()
+        events.put_nowait(event)
+
+    async def _send_events(self, websocket):
+        events, _ = self._events
+        while True:
+            event = await events.get()
+            try:
+                await websocket.send(json.dumps(event))
+            except Exception:
+                self._queue_event(events, event)
+                raise
+
+    def _get_catalog(self, bucket_name: str) -> BackupCatalog:
+        """کاتالوگ محلی بکاپ‌های یک باکت (temp_backups/catalog/<bucket>.sqlite)."""
+        if bucket_name not in self.catalogs:
+            catalog_dir = self.temp_dir / "catalog"
+            catalog_dir.mkdir(exist_ok=True)
+            self.catalogs[bucket_name] = BackupCatalog(catalog_dir / f"{bucket_name}.sqlite", bucket_name)
+        return self.catalogs[bucket_name]
+
+    def _catalog_backup(self, bucket_name: str, object_name: str, size: int, checksum: str = None):
+        """بکاپ آپلود شده را با حجم، checksum و نام جاب در کاتالوگ محلی ثبت می‌کند."""
+        metrics = current_metrics()
+        try:
+            self._get_catalog(bucket_name).record(object_name, size=size, checksum=checksum,
+                                                  job=metrics.job_name if metrics else None)
+        except Exception as e:
+            print(f"⚠️ ثبت '{object_name}' در کاتالوگ محلی ناموفق بود: {e}")
+
+    def _upload_manifest(self, manifest: dict, bucket_name: str):
+        """مانیفست هش بخش‌های بکاپ را در کنار آن ذخیره می‌کند؛ شکست در این مرحله بکاپ را باطل نمی‌کند."""
+        self._catalog_backup(bucket_name, manifest["object"], manifest["size"], manifest_checksum(manifest))
+        upload_path = f"/api/v1/storage/upload/{bucket_name}/{manifest['object']}{MANIFEST_SUFFIX}"
+        try:
+            self._get_transport().request("PUT", upload_path, data=json.dumps(manifest).encode(),
+                                          headers={'Content-Type': 'application/json'}, timeout=60)
+        except Exception as e:
+            print(f"⚠️ ذخیره مانیفست بکاپ ناموفق بود (بررسی هش هنگام دانلود انجام نخواهد شد): {e}")
+
+    def _upload_toc(self, toc: dict, object_name: str, bucket_name: str):
+        """فهرست جداول بکاپ را رمزگذاری شده در کنار آن ذخیره می‌کند؛ شکست در این مرحله بکاپ را باطل نمی‌کند."""
+        upload_path = f"/api/v1/storage/upload/{bucket_name}/{object_name}{TOC_SUFFIX}"
+        try:
+            self._get_transport().request("PUT", upload_path, data=seal_toc(self.encryption_key, toc, object_name),
+                                          headers={'Content-Type': 'application/octet-stream'}, timeout=60)
+            print(f"📑 فهرست {table_count(toc)} جدول ({len(toc['sections'])} بخش) در کنار بکاپ ذخیره شد.")
+        except Exception as e:
+            print(f"⚠️ ذخیره فهرست جداول ناموفق بود (بازیابی تک‌جدول برای این بکاپ ممکن نخواهد بود): {e}")
+
+    def resume_pending_uploads(self):
+        """آپلودهای چندبخشی نیمه‌تمام قبلی را (فقط با ارسال بخش‌های باقی‌مانده) تکمیل می‌کند."""
+        for journal in self._get_uploader().pending_uploads():
+            file_path = Path(journal["file"])
+            try:
+                self._get_uploader().upload_file(file_path, journal["bucket"], journal["object"])
+                file_path.unlink()
+                print(f"🎉 [{datetime.now()}] آپلود '{journal['object']}' تکمیل شد.")
+            except Exception as e:
+                print(f"❌ ادامه آپلود '{journal['object']}' ناموفق بود: {e}")
+
+    def upload_backup(self, file_path: Path, bucket_name: str, metadata: dict = None):
         print(f"📤 [{datetime.now()}] در حال آپلود فایل '{file_path.name}'...")
-        upload_url = f"{self.server_url}/api/v1/storage/upload/{bucket_name}/{file_path.name}"
+        if self._multipart_enabled():
+            try:
+                result = self._get_uploader().upload_file(file_path, bucket_name, file_path.name)
+                print(f"🎉 [{datetime.now()}] آپلود چندبخشی موفق! ({len(result['parts'])} بخش)")
+                self._upload_manifest({**ManifestBuilder.from_file(file_path, file_path.name, self._part_size()), **(metadata or {})},
+                                      bucket_name)
+                return True
+            except Exception as e:
+                raise RuntimeError(f"آپلود ناموفق بود: {e}")
+        upload_path = f"/api/v1/storage/upload/{bucket_name}/{file_path.name}"
         try:
             with open(file_path, 'rb') as f:
                 data = f.read()
-            headers = self.get_headers()
-            headers['Content-Type'] = 'application/octet-stream'
-            response = requests.put(upload_url, data=data, headers=headers, timeout=300, proxies=self.no_proxy)
-            response.raise_for_status()
+            self._get_transport().request("PUT", upload_path, data=data,
+                                          headers={'Content-Type': 'application/octet-stream'})
             print(f"🎉 [{datetime.now()}] آپلود موفق!")
+            self._upload_manifest({**ManifestBuilder.from_file(file_path, file_path.name, self._part_size()), **(metadata or {})},
+                                      bucket_name)
             return True
         except Exception as e:
             raise RuntimeError(f"آپلود ناموفق بود: {e}")
 
-    def download_backup(self, object_name: str, bucket_name: str, destination_path: Path):
+    def upload_stream(self, chunks, object_name: str, bucket_name: str, metadata: dict = None):
+        """
+        قطعات خروجی پایپ‌لاین را با Transfer-Encoding: chunked و بدون بافر کردن کل فایل آپلود می‌کند.
+        metadata (اختیاری) پس از پایان آپلود به مانیفست بکاپ اضافه می‌شود.
+        """
+        print(f"📤 [{datetime.now()}] در حال آپلود جریانی '{object_name}'...")
+        manifest = ManifestBuilder(object_name, self._part_size())
+        chunks = manifest.wrap(chunks)
+        if self._multipart_enabled():
+            try:
+                result = self._get_uploader().upload_stream(chunks, bucket_name, object_name)
+                print(f"🎉 [{datetime.now()}] آپلود چندبخشی موفق! ({len(result['parts'])} بخش)")
+                self._upload_manifest({**manifest.finish(), **(metadata or {})}, bucket_name)
+                return True
+            except Exception as e:
+                raise RuntimeError(f"آپلود ناموفق بود: {e}")
+        upload_path = f"/api/v1/storage/upload/{bucket_name}/{object_name}"
+        try:
+            self._get_transport().request("PUT", upload_path, data=chunks,
+                                          headers={'Content-Type': 'application/octet-stream'})
+            print(f"🎉 [{datetime.now()}] آپلود موفق!")
+            self._upload_manifest({**manifest.finish(), **(metadata or {})}, bucket_name)
+            return True
+        except Exception as e:
+            raise RuntimeError(f"آپلود ناموفق بود: {e}")
+
+    def download_stream(self, object_name: str, bucket_name: str):
+        """
+        فایل بکاپ را به صورت جریانی دانلود کرده و قطعات آن را (بدون ذخیره روی دیسک) برمی‌گرداند.
+        چون قطعه بعدی تنها پس از مصرف قطعه قبلی خوانده می‌شود، کندی مراحل بعدی به TCP منتقل می‌شود.
+        """
         print(f"📥 [{datetime.now()}] در حال دانلود فایل '{object_name}'...")
-        download_url = f"{self.server_url}/api/v1/storage/download/{bucket_name}/{object_name}"
+        if self._parallel_download_enabled():
+            try:
+                size = self._get_downloader().probe(bucket_name, object_name)
+            except RangeNotSupported:
+                print("ℹ️ سرور درخواست Range را پشتیبانی نمی‌کند؛ دانلود به صورت تک‌جریانی انجام می‌شود.")
+            else:
+                yield from self._get_downloader().iter_stream(bucket_name, object_name, size)
+                return
+        try:
+            response = self._get_transport().request("GET", f"/api/v1/storage/download/{bucket_name}/{object_name}",
+                                                     stream=True)
+        except Exception as e:
+            raise RuntimeError(f"دانلود ناموفق بود: {e}")
+        with response:
+            # decode_content=False: بایت‌ها دقیقاً همان‌طور که ذخیره شده‌اند (بدون باز کردن Content-Encoding)
+            yield from response.raw.stream(CHUNK_SIZE, decode_content=False)
+
+    def download_backup(self, object_name: str, bucket_name: str, destination_path: Path):
         try:
-            response = requests.get(download_url, headers=self.get_headers(), timeout=300, stream=True, proxies=self.no_proxy)
-            response.raise_for_status()
+            if self._parallel_download_enabled():
+                print(f"📥 [{datetime.now()}] در حال دانلود موازی فایل '{object_name}'...")
+                try:
+                    self._get_downloader().download_file(bucket_name, object_name, destination_path)
+                    print("✅ دانلود با موفقیت انجام شد.")
+                    return True
+                except RangeNotSupported:
+                    print("ℹ️ سرور درخواست Range را پشتیبانی نمی‌کند؛ دانلود به صورت تک‌جریانی انجام می‌شود.")
             with open(destination_path, 'wb') as f:
-                shutil.copyfileobj(response.raw, f)
+                for chunk in self.download_stream(object_name, bucket_name):
+                    f.write(chunk)
             print("✅ دانلود با موفقیت انجام شد.")
             return True
         except Exception as e:
             raise RuntimeError(f"دانلود ناموفق بود: {e}")
 
+    def _list_objects(self, bucket_name: str) -> list:
+        """لیست کامل اشیاء باکت (شامل مانیفست‌ها و قطعات dedup)."""
+        response = self._get_transport().request("GET", f"/api/v1/storage/list/{bucket_name}", timeout=60)
+        return [f["name"] if isinstance(f, dict) else f for f in response.json().get("files", [])]
+
+    def sync_catalog(self, bucket_name: str) -> BackupCatalog:
+        """کاتالوگ باکت را (افزایشی) با سرور همگام می‌کند؛ در صورت خطا کاتالوگ محلی فعلی استفاده می‌شود."""
+        catalog = self._get_catalog(bucket_name)
+        try:
+            stats = catalog.sync(self._get_transport())
+            if not stats["unchanged"]:
+                print(f"🔄 کاتالوگ باکت '{bucket_name}' همگام شد ({stats['received']} مورد دریافت، "
+                      f"{stats['removed']} مورد حذف).")
+        except Exception as e:
+            synced_at = catalog.synced_at()
+            since = datetime.fromtimestamp(synced_at).isoformat(timespec="seconds") if synced_at else "هرگز"
+            print(f"⚠️ همگام‌سازی کاتالوگ ناموفق بود ({e}); از کاتالوگ محلی (آخرین همگام‌سازی: {since}) استفاده می‌شود.")
+        return catalog
+
+    def query_backups(self, bucket_name: str, sync: bool = True, **filters) -> list:
+        """جستجوی بکاپ‌ها در کاتالوگ محلی (فیلترهای BackupCatalog.query)."""
+        catalog = self.sync_catalog(bucket_name) if sync else self._get_catalog(bucket_name)
+        return catalog.query(**filters)
+
+    def find_backup(self, bucket_name: str, before: str = None) -> str:
+        """نام آخرین بکاپ باکت، یا آخرین بکاپ پیش از زمان before."""
+        until = parse_target_time(before).timestamp() if before else None
+        latest = self.sync_catalog(bucket_name).latest(before=until)
+        if latest is None:
+            raise ValueError(f"هیچ بکاپی{' پیش از ' + before if before else ''} در باکت '{bucket_name}' یافت نشد.")
+        return latest["name"]
+
     def list_backups(self, bucket_name: str) -> list:
         print(f"🔍 در حال دریافت لیست بکاپ‌ها از باکت '{bucket_name}'...")
-        list_url = f"{self.server_url}/api/v1/storage/list/{bucket_name}"
         try:
-            response = requests.get(list_url, headers=self.get_headers(), timeout=60, proxies=self.no_proxy)
-            response.raise_for_status()
-            files = response.json().get("files", [])
+            files = [row["name"] for row in self.query_backups(bucket_name, descending=False)]
             print(f"✅ {len(files)} فایل بکاپ یافت شد.")
             return files
         except Exception as e:
             raise RuntimeError(f"دریافت لیست بکاپ‌ها ناموفق بود: {e}")
 
     def run_backup_job(self, job_config: dict):
+        return self._measured(job_config, "backup", self._backup_cycle, job_config)
+
+    def _backup_cycle(self, job_config: dict):
         db_name = job_config['config'].get('dbname') or job_config['config'].get('database')
         print(f"--- شروع چرخه امن پشتیبان‌گیری برای '{db_name}' ---")
         if not self.encryption_key:
             raise RuntimeError("کلید رمزگذاری یافت نشد. لطفاً ابتدا با دستور 'generate-key' یک کلید بسازید.")
+        if self._multipart_enabled():
+            self.resume_pending_uploads()
         compressed_path, encrypted_path = None, None
         try:
+            job_config = self._plan_backup(job_config)
             driver = self._get_driver(job_config)
-            compressed_path = driver.backup()
+            if job_config.get("physical"):
+                report_progress("basebackup")
+                self._run_base_backup(driver, job_config)
+                return True
+            if job_config.get("dedup"):
+                report_progress("dedup")
+                self._run_dedup_backup(driver, job_config)
+                return True
+            if job_config.get("streaming"):
+                report_progress("streaming")
+                self._run_streaming_backup(driver, job_config["bucket"])
+                return True
+            metrics = current_metrics()
+            report_progress("dump")
+            with metrics.timed("dump"):
+                compressed_path = driver.backup()
+            metrics.add("dump", bytes_out=compressed_path.stat().st_size)
+            self._log_compression(driver.compression_report)
             encrypted_path = compressed_path.with_suffix(compressed_path.suffix + '.enc')
             print(f"🔒 در حال رمزگذاری فایل بکاپ...")
-            encrypt_file(self.encryption_key, compressed_path, encrypted_path)
+            report_progress("encrypt")
+            with metrics.timed("encrypt"):
+                encrypt_file(self.encryption_key, compressed_path, encrypted_path)
+            metrics.add("encrypt", bytes_in=compressed_path.stat().st_size, bytes_out=encrypted_path.stat().st_size)
             print("✅ رمزگذاری با موفقیت انجام شد.")
             if encrypted_path and encrypted_path.exists():
-                self.upload_backup(encrypted_path, job_config["bucket"])
+                report_progress("upload", size=encrypted_path.stat().st_size)
+                with metrics.timed("upload"):
+                    self.upload_backup(encrypted_path, job_config["bucket"],
+                                       {"compression": driver.compression_report} if driver.compression_report else None)
+                metrics.add("upload", bytes_in=encrypted_path.stat().st_size)
+                if driver.toc:
+                    self._upload_toc(driver.toc, encrypted_path.name, job_config["bucket"])
+            return True
         except Exception as e:
             print(f"🔥 یک خطای کلی در چرخه پشتیبان‌گیری رخ داد: {e}")
+            return False
         finally:
             if compressed_path and compressed_path.exists(): compressed_path.unlink()
-            if encrypted_path and encrypted_path.exists(): encrypted_path.unlink()
+            if encrypted_path and encrypted_path.exists():
+                if self._multipart_enabled() and self._get_uploader().has_pending(encrypted_path):
+                    # فایل رمزگذاری شده برای ادامه آپلود در اجرای بعدی نگه داشته می‌شود
+                    print(f"⏸️ آپلود '{encrypted_path.name}' نیمه‌تمام ماند و در اجرای بعدی ادامه می‌یابد.")
+                else:
+                    encrypted_path.unlink()
             print("🗑️ فایل‌های موقت پاک شدند.")
-        print("--- پایان چرخه امن پشتیبان‌گیری ---")
+            print("--- پایان چرخه امن پشتیبان‌گیری ---")
+
+    def _plan_backup(self, job_config: dict) -> dict:
+        """
+        تعریف جاب با طرح برنامه‌ریز بکاپ (utils/planner.py) برای همین اجرا. بکاپ فیزیکی و dedup، جاب‌های با
+        "plan": false و جاب‌هایی که هر سه کلید streaming، dump و compression را ثابت کرده‌اند بدون تغییر
+        برمی‌گردند. اگر پروفایل دیتابیس گرفته نشود، اجرا با همان تعریف جاب ادامه می‌یابد.
+        """
+        if job_config.get("plan") is False or job_config.get("physical") or job_config.get("dedup"):
+            return job_config
+        pinned = pinned_settings(job_config)
+        if all(key in pinned for key in PLANNED_KEYS):
+            return {**job_config, **pinned}
+        try:
+            profile = self._get_driver(job_config).database_profile()
+        except Exception as e:
+            print(f"⚠️ گرفتن حجم دیتابیس برای برنامه‌ریزی بکاپ ناموفق بود (تعریف جاب بدون تغییر اجرا می‌شود): {e}")
+            return job_config
+        free_bytes = shutil.disk_usage(self.temp_dir).free
+        scratch_bytes = int(self.resources_config.get("scratch_mb", 0)) * 1024 * 1024
+        if scratch_bytes:
+            free_bytes = min(free_bytes, scratch_bytes)
+        cpu_count = (int(job_config.get("resources", {}).get("cpu", 0))
+                     or int(self.resources_config.get("cpu_workers", 0)) or os.cpu_count() or 1)
+        rates = history_rates(recent_runs(self.temp_dir / "metrics.jsonl", self._job_name(job_config)))
+        task = current_task()
+        budget = self.executor.budget if task is not None and self.executor is not None else None
+        if budget is None:
+            plan = plan_backup(job_config["type"], profile, free_bytes, cpu_count, rates, pinned)
+        else:
+            # سهم رزرو شده هنگام پذیرش جاب از تعریف پیش از برنامه‌ریزی حساب شده است؛ طرح فقط در محدوده بودجه‌ای
+            # چیده می‌شود که جاب‌های دیگر رزرو نکرده‌اند و سپس سهم جاب به اندازه نیاز طرح تنظیم می‌شود
+            requested = (task.resources.cpu, task.resources.scratch_bytes)
+            plan = None
+            try:
+                cpu_count, reserved = budget.resize(task.resources, cpu_count, free_bytes)
+                plan = plan_backup(job_config["type"], profile, min(free_bytes, reserved), cpu_count, rates, pinned)
+            finally:
+                budget.resize(task.resources, *((plan["cpu_needed"], plan["scratch_bytes"]) if plan else requested))
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.plan = plan
+        print(f"🧭 طرح بکاپ: {describe_plan(plan)}")
+        return {**job_config, **{key: plan[key] for key in PLANNED_KEYS}}
+
+    def _run_streaming_backup(self, driver, bucket_name: str):
+        """
+        حالت جریانی: stdout ابزار dump مستقیماً از فشرده‌سازی و رمزگذاری عبور کرده و آپلود می‌شود.
+        تمام مراحل هم‌زمان اجرا می‌شوند و هیچ فایل میانی روی دیسک ساخته نمی‌شود.
+        """
+        base_name, chunks = driver.backup_stream()
+        object_name = f"{base_name}{suffix_for(driver.compression)}.enc"
+        print(f"🔀 پایپ‌لاین جریانی: dump → فشرده‌سازی → رمزگذاری → آپلود ('{object_name}')")
+        self._ship_stream(chunks, object_name, bucket_name, driver.compression,
+                          toc_dialect=driver.TOC_DIALECT if driver.toc_enabled() else None)
+
+    def _ship_stream(self, chunks, object_name: str, bucket_name: str, compression: dict = None,
+                     source_stage: str = "dump", toc_dialect: str = None):
+        """
+        قطعات خام را از پایپ‌لاین فشرده‌سازی و رمزگذاری عبور داده و با نام object_name آپلود می‌کند.
+        با toc_dialect فهرست جداول dump هنگام فشرده‌سازی ساخته و پس از آپلود در کنار بکاپ ذخیره می‌شود.
+        """
+        metrics = current_metrics() or JobMetrics(object_name, "upload")
+        source = metrics.source(source_stage, chunks)
+        # در حالت تطبیقی سطح هر بلوک بر اساس سرعت زنده dump و ظرفیت آپلود همین اجرا انتخاب می‌شود. آپلود
+        # چندبخشی بخش‌ها را بافر می‌کند، پس ظرفیت آن از درخواست‌های شبکه (مرحله network) خوانده می‌شود.
+        uplink_stage = "network" if self._multipart_enabled() else "upload"
+        compressor = create_compressor(compression,
+                                       lambda: (metrics.capacity(source_stage), metrics.capacity(uplink_stage)))
+        if toc_dialect:
+            compressor = SectionedCompressor(compressor, toc_dialect, compression)
+        transforms = [metrics.instrument("compress", compressor),
+                      metrics.instrument("encrypt", StreamEncryptor(self.encryption_key))]
+        metadata = {"compression": compression_report(compressor, compression)}
+
+        def sink(stream):
+            with metrics.timed("upload"):
+                return self.upload_stream(metrics.sink("upload", stream), object_name, bucket_name, metadata)
+        StreamPipeline(source, transforms).run(sink)
+        self._log_compression(metadata["compression"])
+        if toc_dialect:
+            self._upload_toc(compressor.toc, object_name, bucket_name)
+
+    @staticmethod
+    def _log_compression(report: dict):
+        if not report or report.get("level") != ADAPTIVE or not report["blocks"]:
+            return
+        levels = "، ".join(f"سطح {level}: {count}" for level, count in sorted(report["levels"].items(), key=lambda i: int(i[0])))
+        ratio = report["bytes_in"] / report["bytes_out"] if report["bytes_out"] else 0
+        print(f"🎚️ فشرده‌سازی تطبیقی: {report['blocks']} بلوک ({levels})، {report['stored_blocks']} بلوک "
+              f"غیرقابل فشرده‌سازی بدون فشرده‌سازی ذخیره شد، نسبت {ratio:.2f}")
+
+    def _fetch_stream(self, object_name: str, bucket_name: str, sink, sink_stage: str = "restore", chunks=None):
+        """
+        یک شیء را دانلود، رمزگشایی و از حالت فشرده خارج کرده و قطعات خام را به sink می‌دهد.
+        chunks (اختیاری) جایگزین جریان دانلود می‌شود، مثلاً همان جریان پیچیده شده در ManifestBuilder.
+        """
+        metrics = current_metrics() or JobMetrics(object_name, "download")
+        chunks = self.download_stream(object_name, bucket_name) if chunks is None else chunks
+        source = metrics.source("download", chunks)
+        transforms = [metrics.instrument("decrypt", StreamDecryptor(self.encryption_key)),
+                      metrics.instrument("decompress", create_decompressor(object_name))]
 
-    def run_restore_job(self, job_config: dict, object_name: str):
+        def measured_sink(stream):
+            with metrics.timed(sink_stage):
+                return sink(metrics.sink(sink_stage, stream))
+        return StreamPipeline(source, transforms).run(measured_sink)
+
+    def _run_base_backup(self, driver, job_config: dict):
+        """بکاپ پایه فیزیکی (جریانی، بدون فایل موقت)؛ بازیابی تا یک لحظه مشخص از آخرین بکاپ پایه قبل از آن شروع می‌شود."""
+        if not isinstance(driver, PostgresDriver):
+            raise ValueError("بکاپ فیزیکی (physical) فقط برای جاب‌های PostgreSQL پشتیبانی می‌شود.")
+        base_name, chunks = driver.base_backup_stream()
+        object_name = f"{base_name}{suffix_for(driver.compression)}.enc"
+        print(f"🔀 پایپ‌لاین جریانی: pg_basebackup → فشرده‌سازی → رمزگذاری → آپلود ('{object_name}')")
+        self._ship_stream(chunks, object_name, job_config["bucket"], driver.compression, "basebackup")
+
+    def run_wal_archiver(self, job_config: dict, stop_event: threading.Event = None):
+        """
+        آرشیو پیوسته WAL یک جاب فیزیکی: pg_receivewal سگمنت‌ها را در پوشه موقت می‌نویسد و سگمنت‌های کامل
+        به صورت دسته‌ای فشرده، رمزگذاری و در باکت جاب آپلود می‌شوند. تا set شدن stop_event اجرا می‌شود.
+        """
+        driver = self._get_driver(job_config)
+        if not isinstance(driver, PostgresDriver):
+            raise ValueError("آرشیو WAL فقط برای جاب‌های PostgreSQL پشتیبانی می‌شود.")
+        physical = job_config.get("physical") or {}
+        if not isinstance(physical, dict):
+            physical = {}
+        slot = physical.get("slot", "cloud_haven")
+        driver.create_wal_slot(slot)
+        suffix = suffix_for(driver.compression)
+        archiver = WalArchiver(
+            lambda directory: driver.receivewal_command(directory, slot),
+            self.temp_dir / f"wal_{job_config['bucket']}",
+            lambda name, chunks: self._measured(job_config, "wal", self._ship_stream, chunks, f"{name}{suffix}.enc",
+                                                job_config["bucket"], driver.compression, "wal"),
+            batch_segments=int(physical.get("batch_segments", 16)),
+            batch_seconds=float(physical.get("batch_seconds", 300)),
+            env=driver._env(),
+        )
+        archiver.run(stop_event)
+
+    def _start_wal_archivers(self):
+        """
+        در حالت سرویس، برای هر جاب فیزیکی یک نخ آرشیو WAL اجرا می‌شود. پس از بارگذاری دوباره جاب‌ها، آرشیو
+        جاب‌های حذف یا تغییر یافته متوقف و برای جاب‌های جدید یا تغییر یافته آرشیو تازه شروع می‌شود.
+        """
+        for job_name, (stop_event, job_config) in list(self._wal_archivers.items()):
+            if self.jobs_config.get(job_name) is not job_config:
+                print(f"🛑 توقف آرشیو WAL جاب '{job_name}'...")
+                stop_event.set()
+                del self._wal_archivers[job_name]
+        for job_name, job_config in self.jobs_config.items():
+            if job_config.get("physical") and job_name not in self._wal_archivers:
+                print(f"📡 شروع آرشیو پیوسته WAL برای جاب '{job_name}'...")
+                stop_event = threading.Event()
+                self._wal_archivers[job_name] = (stop_event, job_config)
+                threading.Thread(target=self.run_wal_archiver, args=(job_config, stop_event), name=f"wal-{job_name}",
+                                 daemon=True).start()
+
+    def run_pitr_restore(self, job_config: dict, target_time: str, data_dir: str):
+        return self._measured(job_config, "pitr", self._pitr_cycle, job_config, target_time, data_dir)
+
+    def _pitr_cycle(self, job_config: dict, target_time: str, data_dir: str):
+        """
+        بازیابی تا یک لحظه مشخص: آخرین بکاپ پایه پیش از آن در data_dir باز شده و فقط دسته‌های WAL لازم
+        (تا اولین دسته پس از لحظه هدف) در پوشه آرشیو کنار آن قرار می‌گیرند. سپس recovery.signal و تنظیمات
+        recovery نوشته می‌شود؛ با اجرای PostgreSQL روی data_dir، WAL تا لحظه هدف اعمال و سرور promote می‌شود.
+        """
+        target = parse_target_time(target_time)
+        data_dir = Path(data_dir)
+        archive_dir = data_dir.with_name(f"{data_dir.name}_wal_archive")
+        if data_dir.exists() and any(data_dir.iterdir()):
+            raise ValueError(f"پوشه داده '{data_dir}' خالی نیست؛ بازیابی فیزیکی باید در یک پوشه خالی انجام شود.")
+        bucket_name = job_config["bucket"]
+        print(f"--- شروع بازیابی PostgreSQL تا لحظه {target.isoformat()} در '{data_dir}' ---")
+        base_name, batches = plan_restore(self._list_objects(bucket_name), target)
+        print(f"🧭 بکاپ پایه: '{base_name}'، {len(batches)} دسته WAL")
+        report_progress("basebackup")
+        self._fetch_stream(base_name, bucket_name, lambda stream: extract_tar_stream(stream, data_dir), "extract")
+        for index, batch in enumerate(batches, 1):
+            report_progress("wal", batch=index, batches=len(batches))
+            print(f"📥 [{index}/{len(batches)}] دریافت '{batch}'...")
+            self._fetch_stream(batch, bucket_name, lambda stream: extract_tar_stream(stream, archive_dir), "extract")
+        PostgresDriver.prepare_pitr(data_dir, archive_dir, target)
+        print(f"✅ پوشه داده آماده است. PostgreSQL را روی '{data_dir}' اجرا کنید (مثلاً pg_ctl -D \"{data_dir}\" start)؛")
+        print(f"   WAL تا {target.isoformat()} از '{archive_dir}' اعمال شده و سرور promote می‌شود.")
+
+    def _run_dedup_backup(self, driver, job_config: dict):
+        """
+        حالت dedup: خروجی dump قطعه‌بندی شده و فقط قطعاتی که باکت هنوز ندارد آپلود می‌شوند؛
+        نتیجه هر بکاپ یک مانیفست کوچک رمزگذاری شده است.
+        """
+        base_name, chunks = driver.backup_stream()
+        object_name = f"{base_name}{DEDUP_SUFFIX}"
+        print(f"🧩 بکاپ dedup: dump → قطعه‌بندی → آپلود قطعات جدید ('{object_name}')")
+        metrics = current_metrics()
+        with metrics.timed("dedup"):
+            stats = self._get_dedup_store(job_config).backup(metrics.sink("dedup", metrics.source("dump", chunks)),
+                                                             job_config["bucket"], object_name, base_name,
+                                                             driver.compression)
+        metrics.add("dedup", bytes_out=stats["uploaded_bytes"])
+        self._catalog_backup(job_config["bucket"], object_name, stats["bytes"])
+        print(f"🎉 [{datetime.now()}] بکاپ dedup موفق! {stats['new_chunks']}/{stats['chunks']} قطعه جدید، "
+              f"{stats['new_bytes'] / 1024 / 1024:.1f} از {stats['bytes'] / 1024 / 1024:.1f} مگابایت داده جدید "
+              f"({stats['uploaded_bytes'] / 1024 / 1024:.1f} مگابایت آپلود شد)")
+
+    def run_gc_job(self, job_config: dict, grace_hours: float = GC_GRACE_HOURS, dry_run: bool = False):
+        """قطعات dedup باکت جاب را که هیچ بکاپی به آن‌ها ارجاع نمی‌دهد حذف می‌کند."""
+        bucket_name = job_config["bucket"]
+        print(f"--- شروع جمع‌آوری زباله قطعات dedup در باکت '{bucket_name}' ---")
+        try:
+            result = self._get_dedup_store(job_config).gc(bucket_name, self._list_objects(bucket_name), grace_hours,
+                                                          dry_run)
+            verb = "قابل حذف" if dry_run else "حذف شد"
+            print(f"🧹 {result['manifests']} مانیفست، {result['chunks']} قطعه ذخیره شده، "
+                  f"{result['deleted']} قطعه بدون ارجاع {verb}.")
+            if result["missing"]:
+                print(f"⚠️ {result['missing']} قطعه مورد ارجاع در باکت یافت نشد!")
+            return True
+        except Exception as e:
+            print(f"🔥 جمع‌آوری زباله ناموفق بود: {e}")
+            return False
+        finally:
+            print("--- پایان جمع‌آوری زباله ---")
+
+    def run_restore_job(self, job_config: dict, object_name: str, table: str = None, target_schema: str = None,
+                        swap: bool = None):
+        """
+        بکاپ را بازیابی می‌کند. با table فقط همان جدول (از بکاپ دارای فهرست) روی دیتابیس فعلی یا schema جانبی
+        target_schema بازیابی می‌شود و دیتابیس حذف نمی‌شود. با swap (پیش‌فرض: "restore": {"mode": "swap"} در
+        تنظیمات جاب، برای بازیابی کامل) بکاپ در دیتابیس staging بارگذاری و پس از بررسی جایگزین دیتابیس جاب می‌شود.
+        """
+        if swap is None:
+            swap = not table and self._restore_mode(job_config) == "swap"
+        if swap:
+            return self._measured(job_config, "restore", self._swap_restore_cycle, job_config, object_name, table)
+        return self._measured(job_config, "restore", self._restore_cycle, job_config, object_name, table,
+                              target_schema)
+
+    @staticmethod
+    def _restore_mode(job_config: dict) -> str:
+        mode = (job_config.get("restore") or {}).get("mode", "replace")
+        if mode not in RESTORE_MODES:
+            raise ValueError(f"حالت بازیابی '{mode}' نامعتبر است ({' یا '.join(RESTORE_MODES)}).")
+        return mode
+
+    @staticmethod
+    def _swap_names(job_config: dict) -> tuple:
+        """(کلید نام دیتابیس در کانفیگ، دیتابیس جاب، دیتابیس staging، دیتابیس نسخه قبلی) برای حالت swap."""
+        db_key = "dbname" if "dbname" in job_config["config"] else "database"
+        live = job_config["config"][db_key]
+        options = job_config.get("restore") or {}
+        staging, previous = options.get("staging", f"{live}_staging"), options.get("previous", f"{live}_previous")
+        if len({live, staging, previous}) < 3:
+            raise ValueError("نام دیتابیس‌های staging، نسخه قبلی و دیتابیس جاب باید متفاوت باشند.")
+        return db_key, live, staging, previous
+
+    def _swap_restore_cycle(self, job_config: dict, object_name: str, table: str = None):
+        """
+        بازیابی بدون قطعی طولانی: بکاپ (با هر یک از مسیرهای فایل، جریانی یا dedup) در دیتابیس staging بارگذاری
+        می‌شود و دیتابیس جاب در این مدت سرویس می‌دهد. پس از بررسی سلامت staging، دیتابیس‌ها با تغییر نام جابجا
+        شده و نسخه قبلی برای run-rollback نگه داشته می‌شود. در صورت هر خطا دیتابیس جاب دست‌نخورده می‌ماند.
+        """
+        if table:
+            raise ValueError("بازیابی تک‌جدول با حالت swap ترکیب نمی‌شود.")
+        if backup_kind(object_name) == "base":
+            raise ValueError("بکاپ پایه فیزیکی با حالت swap بازیابی نمی‌شود (از run-pitr استفاده کنید).")
+        db_key, live, staging, previous = self._swap_names(job_config)
+        options = job_config.get("restore") or {}
+        # در staging بازیابی با اولین خطا متوقف می‌شود، مگر این‌که on_error_stop صریحاً خاموش شده باشد
+        staging_job = {**job_config, "config": {**job_config["config"], db_key: staging},
+                       "restore": {"on_error_stop": True, **options}}
+        staging_driver = self._get_driver(staging_job)
+        print(f"🪜 بازیابی در دیتابیس staging '{staging}'؛ دیتابیس '{live}' تا پایان بارگذاری سرویس می‌دهد.")
+        try:
+            staging_driver.drop_database()
+            staging_driver.create_database()
+        except Exception as e:
+            print(f"🔥 آماده‌سازی دیتابیس staging ناموفق بود: {e}")
+            return False
+        if not self._restore_cycle(staging_job, object_name):
+            print(f"⚠️ دیتابیس '{live}' دست‌نخورده ماند؛ دیتابیس staging '{staging}' برای بررسی نگه داشته شد.")
+            return False
+
+        metrics = current_metrics()
+        try:
+            report_progress("checks")
+            with metrics.timed("checks"):
+                result = staging_driver.check_database(options.get("checks"), int(options.get("min_tables", 1)))
+            print(f"🩺 بررسی staging موفق بود: {result['tables']} جدول، {result['checks']} بررسی سفارشی.")
+            report_progress("swap")
+            started = time.perf_counter()
+            with metrics.timed("swap"):
+                self._get_driver(job_config).swap_database(staging, previous)
+        except Exception as e:
+            print(f"🔥 جایگزینی انجام نشد و دیتابیس '{live}' دست‌نخورده ماند: {e}")
+            print(f"ℹ️ دیتابیس staging '{staging}' برای بررسی نگه داشته شد.")
+            return False
+        print(f"🔁 دیتابیس '{live}' در {time.perf_counter() - started:.2f} ثانیه جایگزین شد؛ نسخه قبلی در "
+              f"'{previous}' نگه داشته شد (بازگشت با run-rollback).")
+        return True
+
+    def run_rollback_job(self, job_config: dict):
+        """
+        آخرین جایگزینی حالت swap را برمی‌گرداند: نسخه قبلی دوباره دیتابیس جاب می‌شود و دیتابیس فعلی به نام
+        staging منتقل می‌شود.
+        """
+        return self._measured(job_config, "rollback", self._rollback_cycle, job_config)
+
+    def _rollback_cycle(self, job_config: dict):
+        _, live, staging, previous = self._swap_names(job_config)
+        print(f"⏪ بازگرداندن دیتابیس '{live}' از نسخه قبلی '{previous}'...")
+        try:
+            report_progress("swap")
+            with current_metrics().timed("swap"):
+                self._get_driver(job_config).swap_database(previous, staging)
+        except Exception as e:
+            print(f"🔥 بازگشت به نسخه قبلی ناموفق بود: {e}")
+            return False
+        print(f"✅ دیتابیس '{live}' به نسخه قبلی برگشت؛ نسخه جایگزین شده در '{staging}' نگه داشته شد.")
+        return True
+
+    def _restore_cycle(self, job_config: dict, object_name: str, table: str = None, target_schema: str = None):
         if not object_name.endswith('.enc'):
             raise ValueError("فایل انتخابی یک فایل رمزگذاری شده (با پسوند .enc) نیست.")
         if not self.encryption_key:
             raise RuntimeError("کلید رمزگذاری یافت نشد. امکان رمزگشایی وجود ندارد.")
+        if target_schema and not table:
+            raise ValueError("schema جانبی فقط همراه با بازیابی تک‌جدول (table) معنا دارد.")
         db_name = job_config['config'].get('dbname') or job_config['config'].get('database')
         print(f"--- شروع چرخه امن بازیابی برای '{db_name}' ---")
+        if table:
+            succeeded = True
+            try:
+                report_progress("table")
+                self._run_table_restore(self._get_driver(job_config), object_name, job_config['bucket'], table,
+                                        target_schema)
+            except Exception as e:
+                print(f"🔥 یک خطای کلی در چرخه بازیابی رخ داد: {e}")
+                succeeded = False
+            print("--- پایان چرخه امن بازیابی ---")
+            return succeeded
+        if object_name.endswith(DEDUP_SUFFIX):
+            succeeded = True
+            try:
+                report_progress("dedup")
+                self._run_dedup_restore(self._get_driver(job_config), object_name, job_config)
+            except Exception as e:
+                print(f"🔥 یک خطای کلی در چرخه بازیابی رخ داد: {e}")
+                succeeded = False
+            print("--- پایان چرخه امن بازیابی ---")
+            return succeeded
+        if job_config.get("streaming"):
+            succeeded = True
+            try:
+                report_progress("streaming")
+                self._run_streaming_restore(self._get_driver(job_config), object_name, job_config['bucket'])
+            except Exception as e:
+                print(f"🔥 یک خطای کلی در چرخه بازیابی رخ داد: {e}")
+                succeeded = False
+            print("--- پایان چرخه امن بازیابی ---")
+            return succeeded
         encrypted_path = self.temp_dir / object_name
         compressed_path = self.temp_dir / object_name.removesuffix('.enc')
-        raw_path = self.temp_dir / compressed_path.name.removesuffix('.gz')
+        raw_path = self.temp_dir / strip_codec_suffix(object_name)
+        succeeded = True
         try:
-            self.download_backup(object_name, job_config['bucket'], encrypted_path)
+            metrics = current_metrics()
+            report_progress("download")
+            with metrics.timed("download"):
+                self.download_backup(object_name, job_config['bucket'], encrypted_path)
+            metrics.add("download", bytes_out=encrypted_path.stat().st_size)
             print(f"🔑 در حال رمزگشایی فایل '{encrypted_path.name}'...")
-            decrypt_file(self.encryption_key, encrypted_path, compressed_path)
+            report_progress("decrypt")
+            with metrics.timed("decrypt"):
+                decrypt_file(self.encryption_key, encrypted_path, compressed_path)
+            metrics.add("decrypt", bytes_in=encrypted_path.stat().st_size, bytes_out=compressed_path.stat().st_size)
             print("✅ رمزگشایی با موفقیت انجام شد.")
-            print(f"📦 در حال استخراج فایل '{compressed_path.name}'...")
-            with gzip.open(compressed_path, 'rb') as f_in, open(raw_path, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
+            if raw_path != compressed_path:
+                print(f"📦 در حال استخراج فایل '{compressed_path.name}'...")
+                report_progress("decompress")
+                with metrics.timed("decompress"):
+                    decompress_file(compressed_path, raw_path)
+                metrics.add("decompress", bytes_in=compressed_path.stat().st_size, bytes_out=raw_path.stat().st_size)
             driver = self._get_driver(job_config)
-            driver.restore(raw_path)
+            report_progress("restore")
+            with metrics.timed("restore"):
+                driver.restore(raw_path)
+            metrics.add("restore", bytes_in=raw_path.stat().st_size)
         except Exception as e:
             print(f"🔥 یک خطای کلی در چرخه بازیابی رخ داد: {e}")
+            succeeded = False
         finally:
-            if encrypted_path.exists(): encrypted_path.unlink()
+            if encrypted_path.exists():
+                if self._parallel_download_enabled() and self._get_downloader().has_state(encrypted_path):
+                    # دانلود نیمه‌تمام برای ادامه در اجرای بعدی نگه داشته می‌شود
+                    print(f"⏸️ دانلود '{object_name}' نیمه‌تمام ماند و در اجرای بعدی ادامه می‌یابد.")
+                else:
+                    encrypted_path.unlink()
             if compressed_path.exists(): compressed_path.unlink()
             if raw_path.exists(): raw_path.unlink()
             print("🗑️ تمام فایل‌های موقت بازیابی پاک شدند.")
         print("--- پایان چرخه امن بازیابی ---")
+        return succeeded
+
+    def _run_streaming_restore(self, driver, object_name: str, bucket_name: str):
+        """
+        حالت جریانی بازیابی: دانلود → رمزگشایی → باز کردن فشرده‌سازی (بر اساس پسوند) → stdin ابزار psql/mysql.
+        همه مراحل هم‌زمان اجرا می‌شوند و هیچ فایل میانی روی دیسک ساخته نمی‌شود.
+        """
+        print(f"🔀 پایپ‌لاین جریانی: دانلود → رمزگشایی → باز کردن فشرده‌سازی → بازیابی ('{object_name}')")
+        backup_name = strip_codec_suffix(object_name)
+        self._fetch_stream(object_name, bucket_name, lambda stream: driver.restore_stream(stream, backup_name))
+
+    def _run_table_restore(self, driver, object_name: str, bucket_name: str, table: str, target_schema: str = None):
+        """
+        بازیابی تک‌جدول: فقط بخش‌های پیش‌درآمد، ساختار و داده جدول (طبق فهرست بکاپ) با Range request دریافت،
+        رمزگشایی و باز شده و مستقیماً به ابزار بازیابی داده می‌شوند.
+        """
+        if object_name.endswith(DEDUP_SUFFIX):
+            raise ValueError("بکاپ‌های dedup فهرست جداول ندارند و فقط به صورت کامل بازیابی می‌شوند.")
+        downloader = self._get_downloader()
+        sealed = downloader.fetch_sidecar(bucket_name, object_name, TOC_SUFFIX)
+        if sealed is None:
+            raise ValueError(f"بکاپ '{object_name}' فهرست جداول ندارد (کلید 'toc' در تنظیمات dump جاب).")
+        sections = find_table(open_toc(self.encryption_key, sealed, object_name), table)
+        try:
+            reader = SectionReader(downloader, self.encryption_key, bucket_name, object_name)
+        except RangeNotSupported:
+            raise RuntimeError("سرور درخواست Range را پشتیبانی نمی‌کند؛ بازیابی تک‌جدول ممکن نیست.")
+        selected = sum(section["length"] for section in sections.values() if section)
+        print(f"📑 بازیابی جدول '{table}': {selected / 1024 / 1024:.1f} از {reader.size / 1024 / 1024:.1f} "
+              f"مگابایت بکاپ دریافت می‌شود.")
+        metrics = current_metrics()
+        with metrics.timed("restore"):
+            driver.restore_table(sections, lambda section: metrics.source("download", reader.read(section)),
+                                 target_schema)
+
+    def _run_dedup_restore(self, driver, object_name: str, job_config: dict):
+        """جریان dump را از روی مانیفست و با دانلود موازی قطعات بازسازی کرده و مستقیماً به ابزار بازیابی می‌دهد."""
+        store = self._get_dedup_store(job_config)
+        manifest = store.load_manifest(job_config["bucket"], object_name)
+        print(f"🧩 بازسازی '{manifest['backup_name']}' از {len(manifest['chunks'])} قطعه "
+              f"({manifest['size'] / 1024 / 1024:.1f} مگابایت)...")
+        metrics = current_metrics()
+        chunks = metrics.source("download", store.iter_restore(job_config["bucket"], manifest))
+        with metrics.timed("restore"):
+            driver.restore_stream(metrics.sink("restore", chunks), manifest["backup_name"])
+
+    def run_verify_job(self, job_config: dict, object_name: str, mode: str = "quick", scratch_db: str = None,
+                       samples: int = QUICK_SAMPLES):
+        """
+        درستی یک بکاپ را بدون دست زدن به دیتابیس اصلی بررسی می‌کند (حالت‌ها در utils/verify.py). با scratch_db
+        بکاپ در یک دیتابیس آزمایشی (که پس از بررسی حذف می‌شود) بازیابی می‌شود تا اجرای dump هم آزموده شود.
+        """
+        return self._measured(job_config, "verify", self._verify_cycle, job_config, object_name, mode, scratch_db,
+                              samples)
+
+    def _verify_cycle(self, job_config: dict, object_name: str, mode: str, scratch_db: str, samples: int):
+        if mode not in VERIFY_MODES:
+            raise ValueError(f"حالت بررسی '{mode}' نامعتبر است ({' یا '.join(VERIFY_MODES)}).")
+        if not object_name.endswith('.enc'):
+            raise ValueError("فایل انتخابی یک فایل رمزگذاری شده (با پسوند .enc) نیست.")
+        if not self.encryption_key:
+            raise RuntimeError("کلید رمزگذاری یافت نشد. امکان رمزگشایی وجود ندارد.")
+        scratch_job = self._scratch_job(job_config, object_name, scratch_db) if scratch_db else None
+        print(f"--- شروع بررسی بکاپ '{object_name}' (حالت {mode}) ---")
+        succeeded, result = True, {}
+        try:
+            report_progress("verify")
+            if object_name.endswith(DEDUP_SUFFIX):
+                result = self._verify_dedup(job_config, object_name, mode, samples)
+            else:
+                result = self._verify_object(job_config, object_name, mode, samples)
+            if scratch_job:
+                report_progress("scratch_restore")
+                result["scratch"] = self._verify_scratch_restore(scratch_job, object_name)
+            print(f"✅ بکاپ '{object_name}' سالم است.")
+        except Exception as e:
+            print(f"🔥 بررسی بکاپ ناموفق بود: {e}")
+            succeeded, result = False, {**result, "error": str(e)}
+        print("--- پایان بررسی بکاپ ---")
+        self._publish_event({"type": "verify_result", "job": self._job_name(job_config), "file": object_name,
+                             "mode": mode, "ok": succeeded, **result})
+        return succeeded
+
+    def _verify_object(self, job_config: dict, object_name: str, mode: str, samples: int) -> dict:
+        bucket_name = job_config["bucket"]
+        manifest = self._get_downloader().fetch_manifest(bucket_name, object_name)
+        if manifest is None:
+            print("⚠️ مانیفست هش بخش‌ها یافت نشد؛ فقط احراز اصالت رمزگذاری بررسی می‌شود.")
+        else:
+            recorded = (self._get_catalog(bucket_name).get(object_name) or {}).get("checksum")
+            if recorded and recorded != manifest_checksum(manifest):
+                raise ValueError("مانیفست ذخیره شده با checksum ثبت شده هنگام آپلود مطابقت ندارد.")
+        metrics = current_metrics()
+        if mode == "quick":
+            try:
+                with metrics.timed("verify"):
+                    result = verify_sampled(self._get_downloader(), self.encryption_key, bucket_name, object_name,
+                                            manifest, samples)
+            except RangeNotSupported:
+                raise RuntimeError("سرور درخواست Range را پشتیبانی نمی‌کند؛ از حالت full استفاده کنید.")
+            metrics.add("verify", bytes_in=result["checked_bytes"])
+            print(f"🔎 {result['checked_parts']}/{result['parts']} بخش ({result['checked_bytes'] / 1024 / 1024:.1f} "
+                  f"مگابایت) و {result['frames']} فریم رمزگذاری شده بررسی شد.")
+            return {"mode": "quick", **result}
+        builder = ManifestBuilder(object_name, manifest["part_size"]) if manifest else None
+        chunks = self.download_stream(object_name, bucket_name)
+        digest = DigestSink()
+        self._fetch_stream(object_name, bucket_name, digest, "verify", builder.wrap(chunks) if builder else chunks)
+        if builder:
+            stored = builder.finish()
+            if stored["size"] != manifest["size"] or manifest_checksum(stored) != manifest_checksum(manifest):
+                raise ValueError("هش داده دانلود شده با مانیفست مطابقت ندارد.")
+        print(f"🔎 کل بکاپ رمزگشایی و باز شد: {digest.size / 1024 / 1024:.1f} مگابایت داده خام (SHA-256 {digest.sha256[:16]}…)")
+        return {"mode": "full", "size": manifest["size"] if manifest else None, "raw_bytes": digest.size,
+                "raw_sha256": digest.sha256, "hashed": bool(manifest)}
+
+    def _verify_dedup(self, job_config: dict, object_name: str, mode: str, samples: int) -> dict:
+        bucket_name = job_config["bucket"]
+        store = self._get_dedup_store(job_config)
+        manifest = store.load_manifest(bucket_name, object_name)
+        metrics = current_metrics()
+        if mode == "quick":
+            with metrics.timed("verify"):
+                result = verify_dedup_sampled(store, bucket_name, manifest, set(self._list_objects(bucket_name)),
+                                              samples)
+            metrics.add("verify", bytes_in=result["checked_bytes"])
+            print(f"🔎 همه {result['chunks']} قطعه در باکت موجودند؛ محتوای {result['checked_chunks']} قطعه بررسی شد.")
+            return {"mode": "quick", **result}
+        digest = DigestSink()
+        with metrics.timed("verify"):
+            digest(metrics.sink("verify", metrics.source("download", store.iter_restore(bucket_name, manifest))))
+        if digest.size != manifest["size"]:
+            raise ValueError(f"حجم داده بازسازی شده ({digest.size}) با مانیفست ({manifest['size']}) مطابقت ندارد.")
+        print(f"🔎 همه {len(manifest['chunks'])} قطعه بررسی شد: {digest.size / 1024 / 1024:.1f} مگابایت داده خام "
+              f"(SHA-256 {digest.sha256[:16]}…)")
+        return {"mode": "full", "size": manifest["size"], "raw_bytes": digest.size, "raw_sha256": digest.sha256}
+
+    @staticmethod
+    def _scratch_job(job_config: dict, object_name: str, scratch_db: str) -> dict:
+        """کپی کانفیگ جاب که به جای دیتابیس اصلی به دیتابیس آزمایشی scratch_db اشاره می‌کند."""
+        if backup_kind(object_name) == "base":
+            raise ValueError("بکاپ پایه فیزیکی در دیتابیس آزمایشی قابل بازیابی نیست (از run-pitr استفاده کنید).")
+        db_key = "dbname" if "dbname" in job_config["config"] else "database"
+        if scratch_db == job_config["config"][db_key]:
+            raise ValueError("نام دیتابیس آزمایشی نباید با دیتابیس اصلی جاب یکسان باشد.")
+        return {**job_config, "config": {**job_config["config"], db_key: scratch_db}}
+
+    def _verify_scratch_restore(self, job_config: dict, object_name: str) -> dict:
+        """بکاپ را به صورت جریانی در دیتابیس آزمایشی جاب بازیابی و سپس آن دیتابیس را حذف می‌کند."""
+        driver = self._get_driver(job_config)
+        scratch_db = driver.db_config.get("dbname") or driver.db_config.get("database")
+        print(f"🧪 بازیابی آزمایشی در دیتابیس '{scratch_db}'...")
+        driver.drop_database()
+        driver.create_database()
+        started = time.perf_counter()
+        try:
+            if object_name.endswith(DEDUP_SUFFIX):
+                self._run_dedup_restore(driver, object_name, job_config)
+            else:
+                self._run_streaming_restore(driver, object_name, job_config["bucket"])
+        finally:
+            try:
+                driver.drop_database()
+                print(f"🗑️ دیتابیس آزمایشی '{scratch_db}' حذف شد.")
+            except Exception as e:
+                print(f"⚠️ حذف دیتابیس آزمایشی '{scratch_db}' ناموفق بود: {e}")
+        return {"database": scratch_db, "seconds": round(time.perf_counter() - started, 3)}
+
+    def _get_schedule_source(self) -> ScheduleSource:
+        if self.schedule_source is None:
+            self.schedule_source = ScheduleSource(self.temp_dir / "schedules.json")
+        return self.schedule_source
+
+    def _apply_schedules(self, scheduler: AsyncIOScheduler, schedules: list):
+        """
+        فقط تفاوت زمان‌بندی‌های جدید با زمان‌بندی‌های فعلی را اعمال می‌کند؛ جاب‌های بدون تغییر دست نمی‌خورند
+        و زمان اجرای بعدی آن‌ها حفظ می‌شود. شناسه هر جاب زمان‌بند همان کلید پایدار زمان‌بندی است. زمان‌بندی
+        محلی جاب‌ها (کلید 'schedule' در تعریف جاب، مثلاً برای جاب‌های کشف شده از قالب) به زمان‌بندی‌های سرور افزوده می‌شود.
+        """
+        local = [{"id": f"local-{name}", "job_name": name, "cron_string": job_config["schedule"]}
+                 for name, job_config in self.jobs_config.items() if job_config.get("schedule")]
+        desired = {}
+        for key, entry in active_schedules(list(schedules) + local).items():
+            if entry['job_name'] in self.jobs_config:
+                desired[key] = entry
+            else:
+                print(f"  - هشدار: جاب با نام '{entry['job_name']}' در کانفیگ محلی (JOBS) یافت نشد.")
+        added, changed, removed = diff_schedules(self._scheduled, desired)
+        for key in removed:
+            print(f"  - حذف زمان‌بندی وظیفه '{self._scheduled[key]['job_name']}'")
+            scheduler.remove_job(key)
+        for key in changed:
+            entry = desired[key]
+            print(f"  ~ تغییر زمان‌بندی وظیفه '{entry['job_name']}' به cron: '{entry['cron_string']}'")
+            scheduler.modify_job(key, kwargs={"job_name": entry['job_name']})
+            scheduler.reschedule_job(key, trigger='cron', **self._parse_cron(entry['cron_string']))
+        for key in added:
+            entry = desired[key]
+            print(f"  + زمان‌بندی وظیفه '{entry['job_name']}' با cron: '{entry['cron_string']}'")
+            # تریگر فقط جاب را به executor می‌سپارد؛ اجرای واقعی در نخ‌های کارگر انجام می‌شود
+            scheduler.add_job(
+                self._run_scheduled_backup, 'cron', id=key, replace_existing=True,
+                **self._parse_cron(entry['cron_string']),
+                kwargs={"job_name": entry['job_name']}
+            )
+        self._scheduled = desired
+        if not (added or changed or removed):
+            print("ℹ️ زمان‌بندی‌ها تغییری نکرده‌اند.")
 
     async def _fetch_and_apply_schedules(self, scheduler: AsyncIOScheduler):
-        """زمان‌بندی‌ها را از API اختصاصی Agent دریافت و در زمان‌بند محلی اعمال می‌کند."""
+        """زمان‌بندی‌ها را (به صورت شرطی) از API اختصاصی Agent دریافت و تغییرات را در زمان‌بند محلی اعمال می‌کند."""
         print(f"[{datetime.now()}] در حال دریافت و به‌روزرسانی زمان‌بندی‌ها از سرور...")
         try:
-            response = requests.get(f"{self.server_url}/api/v1/agent/my-schedules", headers=self.get_headers(), proxies=self.no_proxy)
-            response.raise_for_status()
-            schedules = response.json()
-
-            scheduler.remove_all_jobs()
-            print(f"[{datetime.now()}] به‌روزرسانی زمان‌بندی‌ها...")
-            for schedule_data in schedules:
-                if not schedule_data['is_active']: continue
-                job_name = schedule_data['job_name']
-                if job_name in self.jobs_config:
-                    job_config = self.jobs_config[job_name]
-                    print(f"  + زمان‌بندی وظیفه '{job_name}' با cron: '{schedule_data['cron_string']}'")
-                    scheduler.add_job(
-                        self.run_backup_job, 'cron',
-                        **self._parse_cron(schedule_data['cron_string']),
-                        kwargs={"job_config": job_config}
-                    )
-                else:
-                    print(f"  - هشدار: جاب با نام '{job_name}' در کانفیگ محلی (JOBS) یافت نشد.")
+            # درخواست در نخ جداگانه اجرا می‌شود تا شنونده WebSocket در این مدت مسدود نشود
+            schedules = await asyncio.to_thread(self._get_schedule_source().fetch, self._get_transport())
         except Exception as e:
-            print(f"❌ خطا در دریافت زمان‌بندی‌ها: {e}")
+            print(f"❌ خطا در دریافت زمان‌بندی‌ها (زمان‌بندی‌های فعلی حفظ می‌شوند): {e}")
+            return
+        if schedules is None:
+            print("ℹ️ زمان‌بندی‌ها از دریافت قبلی تغییری نکرده‌اند.")
+            return
+        print(f"[{datetime.now()}] به‌روزرسانی زمان‌بندی‌ها...")
+        self._apply_schedules(scheduler, schedules)
+
+    async def _watch_jobs(self, scheduler: AsyncIOScheduler):
+        """
+        تغییرات پوشه جاب‌ها (و دیتابیس‌های کشف شده قالب‌ها) را بدون راه‌اندازی دوباره شنونده اعمال می‌کند:
+        زمان‌بندی‌ها و آرشیوهای WAL به‌روز می‌شوند و لیست جدید جاب‌ها به سرور معرفی می‌شود.
+        """
+        try:
+            changes = await asyncio.to_thread(self.reload_jobs)
+        except Exception as e:
+            print(f"❌ بارگذاری دوباره جاب‌ها ناموفق بود (جاب‌های فعلی حفظ می‌شوند): {e}")
+            return
+        if changes is None:
+            return
+        self._start_wal_archivers()
+        self._apply_schedules(scheduler, self._get_schedule_source().schedules or [])
+        self._publish_event({"type": "identify", "jobs": self._jobs_map()})
 
     @staticmethod
     def _parse_cron(cron_string: str) -> dict:
@@ -224,10 +1310,22 @@ class ClientAgent:
         return {'minute': parts[0], 'hour': parts[1], 'day': parts[2], 'month': parts[3], 'day_of_week': parts[4]}
 
     async def _websocket_listener(self):
+        self._events = (asyncio.Queue(maxsize=1000), asyncio.get_running_loop())
+        self._get_executor()
+        self._start_wal_archivers()
+        self._start_metrics_server()
         scheduler = AsyncIOScheduler()
-        await self._fetch_and_apply_schedules(scheduler)
+        cached = self._get_schedule_source().load_cached()
+        if cached is not None:
+            # زمان‌بندی از آخرین مجموعه معتبر شروع می‌شود، حتی اگر سرور هنوز در دسترس نباشد
+            print(f"📂 اعمال زمان‌بندی‌های ذخیره شده در '{self.schedule_source.cache_path}'...")
+        self._apply_schedules(scheduler, cached or [])
+        if self._get_job_source() is not None:
+            scheduler.add_job(self._watch_jobs, 'interval', id="reload-jobs", args=[scheduler],
+                              seconds=float(self.jobs_section.get("reload_seconds", RELOAD_SECONDS)))
         scheduler.start()
         print("\n✅ زمان‌بند محلی فعال شد.")
+        await self._fetch_and_apply_schedules(scheduler)
 
         ws_uri = f"ws://{self.server_url.split('//')[1]}/api/v1/clients/ws"
         headers = {"Authorization": f"Bearer {self.access_token}"}
@@ -238,7 +1336,7 @@ class ClientAgent:
                     print("✅ با موفقیت به سرور WebSocket متصل شد.")
 
                     # --- معرفی خود با جزئیات کامل (نام جاب -> نام باکت) ---
-                    jobs_map = {name: details['bucket'] for name, details in self.jobs_config.items()}
+                    jobs_map = self._jobs_map()
                     identify_payload = {
                         "type": "identify",
                         "jobs": jobs_map
@@ -247,34 +1345,57 @@ class ClientAgent:
                     print(f"ℹ️ قابلیت‌ها به سرور معرفی شد: {jobs_map}")
                     print("...منتظر دریافت فرمان...")
 
-                    async for message in websocket:
-                        print(f"\n📨 فرمان جدید دریافت شد: {message}")
-                        command = json.loads(message)
-                        action = command.get("action")
-
-                        if action == "reload_schedules":
-                            print("🔄 دریافت فرمان به‌روزرسانی زمان‌بندی...")
-                            await self._fetch_and_apply_schedules(scheduler)
-                            continue
-
-                        job_name = command.get("job")
-                        if not job_name or job_name not in self.jobs_config:
-                            print(f"❌ فرمان نامعتبر: job '{job_name}' در کانفیگ محلی تعریف نشده است.")
-                            continue
-
-                        job_config = self.jobs_config[job_name]
-                        if action == "backup":
-                            self.run_backup_job(job_config)
-                        elif action == "restore":
-                            file_name = command.get("file")
-                            if not file_name:
-                                print("❌ فرمان نامعتبر: برای restore نام فایل الزامی است.")
-                                continue
-                            self.run_restore_job(job_config, file_name)
+                    sender = asyncio.create_task(self._send_events(websocket))
+                    try:
+                        await self._handle_commands(websocket, scheduler)
+                    finally:
+                        sender.cancel()
             except Exception as e:
                 print(f"🔥 خطای WebSocket: {e}. تلاش برای اتصال مجدد تا 10 ثانیه دیگر...")
                 await asyncio.sleep(10)
 
+    async def _handle_commands(self, websocket, scheduler: AsyncIOScheduler):
+        """
+        فرمان‌های سرور را می‌خواند. بکاپ و بازیابی فقط به executor سپرده می‌شوند، بنابراین این حلقه
+        هیچ‌وقت مسدود نمی‌شود و وضعیت جاب‌ها به صورت پیام‌های job_status به سرور ارسال می‌شود.
+        """
+        async for message in websocket:
+            print(f"\n📨 فرمان جدید دریافت شد: {message}")
+            command = json.loads(message)
+            action = command.get("action")
+
+            if action == "reload_schedules":
+                print("🔄 دریافت فرمان به‌روزرسانی زمان‌بندی...")
+                await self._fetch_and_apply_schedules(scheduler)
+                continue
+
+            if action == "status":
+                await websocket.send(json.dumps({
+                    "type": "job_status_list", "jobs": self.executor.status(), "resources": self.executor.budget.usage(),
+                }))
+                continue
+
+            job_name = command.get("job")
+            if not job_name or job_name not in self.jobs_config:
+                print(f"❌ فرمان نامعتبر: job '{job_name}' در کانفیگ محلی تعریف نشده است.")
+                continue
+
+            if action in ("restore", "verify") and not command.get("file"):
+                print(f"❌ فرمان نامعتبر: برای {action} نام فایل الزامی است.")
+                continue
+            if action not in ("backup", "restore", "gc", "verify", "rollback"):
+                print(f"❌ فرمان ناشناخته: '{action}'")
+                continue
+
+            try:
+                task = self.submit_job(job_name, action, command.get("file"), params=command)
+                print(f"📥 جاب '{job_name}' ({action}) در صف اجرا قرار گرفت (شناسه: {task.id}).")
+            except JobRejected as e:
+                print(f"⏭️ {e}")
+                await websocket.send(json.dumps({
+                    "type": "job_status", "event": "rejected", "job": job_name, "action": action, "error": str(e),
+                }))
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="کلاینت امن سیستم پشتیبان‌گیری")
@@ -282,16 +1403,58 @@ if __name__ == "__main__":
 
     parser_keygen = subparsers.add_parser('generate-key', help="یک کلید رمزگذاری جدید تولید می‌کند.")
     parser_listen = subparsers.add_parser('listen', help="به عنوان یک سرویس اجرا شده و منتظر دستورات از سرور می‌ماند.")
+    parser_jobs = subparsers.add_parser('list-jobs', help="جاب‌های تعریف شده (JOBS و پوشه جاب‌ها) را نمایش می‌دهد.")
 
     parser_backup = subparsers.add_parser('run-backup', help="یک وظیفه بکاپ را به صورت دستی اجرا می‌کند.")
-    parser_backup.add_argument('--job', choices=JOBS.keys(), required=True, help="نام وظیفه‌ای که باید اجرا شود")
+    parser_backup.add_argument('--job', required=True, help="نام وظیفه‌ای که باید اجرا شود")
 
     parser_list = subparsers.add_parser('run-list', help="لیست بکاپ‌های یک جاب را به صورت دستی دریافت می‌کند.")
-    parser_list.add_argument('--job', choices=JOBS.keys(), required=True)
+    parser_list.add_argument('--job', required=True)
+    parser_list.add_argument('--since', help="فقط بکاپ‌های پس از این زمان (مثلاً '2024-05-01' یا '2024-05-01 13:45:00')")
+    parser_list.add_argument('--before', help="فقط بکاپ‌های پیش از این زمان")
+    parser_list.add_argument('--largest', action='store_true', help="مرتب‌سازی بر اساس حجم (بزرگ‌ترین اول)")
+    parser_list.add_argument('--limit', type=int, default=50, help="حداکثر تعداد ردیف (0 = همه)")
+    parser_list.add_argument('--offset', type=int, default=0)
+    parser_list.add_argument('--offline', action='store_true', help="فقط کاتالوگ محلی، بدون همگام‌سازی با سرور")
 
     parser_restore = subparsers.add_parser('run-restore', help="یک بکاپ را به صورت دستی بازیابی می‌کند.")
-    parser_restore.add_argument('--job', choices=JOBS.keys(), required=True)
-    parser_restore.add_argument('--file', required=True)
+    parser_restore.add_argument('--job', required=True)
+    restore_target = parser_restore.add_mutually_exclusive_group(required=True)
+    restore_target.add_argument('--file', help="نام شیء بکاپ")
+    restore_target.add_argument('--latest', action='store_true', help="آخرین بکاپ کاتالوگ")
+    restore_target.add_argument('--before', help="آخرین بکاپ پیش از این زمان")
+    parser_restore.add_argument('--table', help="فقط این جدول (یا schema.table) از بکاپ دارای فهرست، بدون حذف دیتابیس")
+    parser_restore.add_argument('--target-schema', help="بازیابی جدول در این schema (در MySQL دیتابیس) جانبی")
+    parser_restore.add_argument('--swap', action='store_true', default=None,
+                                help="بارگذاری در دیتابیس staging و جایگزینی سریع پس از بررسی (نسخه قبلی نگه داشته می‌شود)")
+
+    parser_rollback = subparsers.add_parser('run-rollback', help="آخرین جایگزینی بازیابی swap را برمی‌گرداند.")
+    parser_rollback.add_argument('--job', required=True)
+
+    parser_verify = subparsers.add_parser('run-verify', help="درستی یک بکاپ را بدون بازیابی روی دیتابیس اصلی بررسی می‌کند.")
+    parser_verify.add_argument('--job', required=True)
+    verify_target = parser_verify.add_mutually_exclusive_group(required=True)
+    verify_target.add_argument('--file', help="نام شیء بکاپ")
+    verify_target.add_argument('--latest', action='store_true', help="آخرین بکاپ کاتالوگ")
+    verify_target.add_argument('--before', help="آخرین بکاپ پیش از این زمان")
+    parser_verify.add_argument('--mode', choices=VERIFY_MODES, default="quick",
+                               help="quick: نمونه‌برداری تصادفی با Range request؛ full: بررسی جریانی کل بکاپ")
+    parser_verify.add_argument('--samples', type=int, default=QUICK_SAMPLES, help="تعداد بخش‌های نمونه در حالت quick")
+    parser_verify.add_argument('--scratch-db', help="بازیابی آزمایشی در این دیتابیس (پس از بررسی حذف می‌شود)")
+
+    parser_wal = subparsers.add_parser('run-wal', help="آرشیو پیوسته WAL یک جاب فیزیکی PostgreSQL را اجرا می‌کند.")
+    parser_wal.add_argument('--job', required=True)
+
+    parser_pitr = subparsers.add_parser('run-pitr', help="PostgreSQL را تا یک لحظه مشخص در یک پوشه داده جدید بازیابی می‌کند.")
+    parser_pitr.add_argument('--job', required=True)
+    parser_pitr.add_argument('--target-time', required=True, help="مثلاً '2024-05-01 13:45:00' (وقت محلی) یا با منطقه زمانی")
+    parser_pitr.add_argument('--data-dir', required=True, help="پوشه خالی برای داده‌های بازیابی شده")
+
+    parser_gc = subparsers.add_parser('run-gc', help="قطعات dedup بدون ارجاع را از باکت یک جاب حذف می‌کند.")
+    parser_gc.add_argument('--job', required=True)
+    parser_gc.add_argument('--grace-hours', type=float, default=GC_GRACE_HOURS,
+                           help="قطعاتی که در این بازه توسط بکاپی استفاده شده‌اند حذف نمی‌شوند")
+    parser_gc.add_argument('--dry-run', action='store_true', help="فقط گزارش، بدون حذف")
 
     args = parser.parse_args()
 
@@ -301,30 +1464,66 @@ if __name__ == "__main__":
         if args.action == 'generate-key':
             key = generate_key()
             agent.save_encryption_key(key)
+        elif args.action == 'list-jobs':
+            agent.reload_jobs()
+            print(f"\n--- {len(agent.jobs_config)} جاب ---")
+            for name, details in sorted(agent.jobs_config.items()):
+                database = details['config'].get('dbname') or details['config'].get('database') or '-'
+                template = f"  (قالب '{details['template']}')" if details.get('template') else ""
+                print(f"  {name:<32} {details['type']:<11} {database:<24} {details['bucket']}{template}")
         else:
             if not agent.access_token:
                 raise ValueError(
                     "توکن دسترسی در client_config.ini یافت نشد. لطفاً ابتدا از طریق داشبورد ادمین، یک کلاینت بسازید و توکن آن را در این فایل قرار دهید.")
 
+            agent.reload_jobs()
             if args.action == 'listen':
                 if not agent.encryption_key: raise ValueError(
                     "کلید رمزگذاری در client_config.ini یافت نشد. لطفاً ابتدا دستور 'generate-key' را اجرا کنید.")
                 asyncio.run(agent._websocket_listener())
             else:
                 job_config = agent.jobs_config.get(args.job)
-                # Note: job_config is guaranteed to exist due to 'choices=JOBS.keys()' in argparse
+                if job_config is None:
+                    raise ValueError(f"جاب '{args.job}' نه در JOBS و نه در پوشه جاب‌ها تعریف شده است "
+                                     f"(لیست جاب‌ها: list-jobs).")
 
                 if args.action == 'run-backup':
                     if not agent.encryption_key: raise ValueError("کلید رمزگذاری برای بکاپ الزامی است.")
                     agent.run_backup_job(job_config)
                 elif args.action == 'run-list':
-                    backups = agent.list_backups(job_config['bucket'])
-                    if backups:
-                        print(f"\n--- لیست بکاپ‌ها در باکت '{job_config['bucket']}' ---")
-                        for f in backups: print(f"  - {f}")
+                    backups = agent.query_backups(
+                        job_config['bucket'], sync=not args.offline,
+                        since=parse_target_time(args.since).timestamp() if args.since else None,
+                        until=parse_target_time(args.before).timestamp() if args.before else None,
+                        order="size" if args.largest else "created_at", limit=args.limit or None, offset=args.offset,
+                    )
+                    print(f"\n--- لیست بکاپ‌ها در باکت '{job_config['bucket']}' ({len(backups)} مورد) ---")
+                    for row in backups:
+                        created = datetime.fromtimestamp(row['created_at']).strftime("%Y-%m-%d %H:%M:%S") if row['created_at'] else "?"
+                        size = f"{row['size'] / 1024 / 1024:10.1f} MB" if row['size'] is not None else f"{'?':>13}"
+                        checksum = (row['checksum'] or "")[:12]
+                        print(f"  {created}  {size}  {row['kind']:<7}  {checksum:<12}  {row['name']}")
                 elif args.action == 'run-restore':
                     if not agent.encryption_key: raise ValueError("کلید رمزگذاری برای بازیابی الزامی است.")
-                    agent.run_restore_job(job_config, args.file)
+                    file_name = args.file or agent.find_backup(job_config['bucket'], args.before)
+                    print(f"🎯 بکاپ انتخاب شده: '{file_name}'")
+                    agent.run_restore_job(job_config, file_name, args.table, args.target_schema, args.swap)
+                elif args.action == 'run-rollback':
+                    agent.run_rollback_job(job_config)
+                elif args.action == 'run-verify':
+                    if not agent.encryption_key: raise ValueError("کلید رمزگذاری برای بررسی بکاپ الزامی است.")
+                    file_name = args.file or agent.find_backup(job_config['bucket'], args.before)
+                    print(f"🎯 بکاپ انتخاب شده: '{file_name}'")
+                    agent.run_verify_job(job_config, file_name, args.mode, args.scratch_db, args.samples)
+                elif args.action == 'run-wal':
+                    if not agent.encryption_key: raise ValueError("کلید رمزگذاری برای آرشیو WAL الزامی است.")
+                    agent.run_wal_archiver(job_config)
+                elif args.action == 'run-pitr':
+                    if not agent.encryption_key: raise ValueError("کلید رمزگذاری برای بازیابی الزامی است.")
+                    agent.run_pitr_restore(job_config, args.target_time, args.data_dir)
+                elif args.action == 'run-gc':
+                    if not agent.encryption_key: raise ValueError("کلید رمزگذاری برای خواندن مانیفست‌ها الزامی است.")
+                    agent.run_gc_job(job_config, args.grace_hours, args.dry_run)
 
     except (ValueError, RuntimeError, FileNotFoundError) as e:
         print(f"\n🔴 یک خطای عملیاتی رخ داد: {e}")
@@ -1,15 +1,44 @@
+import subprocess
+import tempfile
 from abc import ABC, abstractmethod
 from pathlib import Path
 
+from utils.compression import compress_file, create_compressor, suffix_for
+from utils.toc import SectionedCompressor
+
+# اندازه قطعاتی که از stdout ابزارهای dump خوانده می‌شوند
+STREAM_CHUNK_SIZE = 1024 * 1024
+# حالت‌های بازیابی کامل: replace (حذف و بازیابی روی همان دیتابیس) یا swap (بارگذاری در staging و جایگزینی)
+RESTORE_MODES = ("replace", "swap")
+
+
 class BaseDriver(ABC):
     """
     کلاس پایه انتزاعی برای تمام درایورهای دیتابیس.
     هر درایور جدید باید از این کلاس ارث‌بری کرده و متدهای آن را پیاده‌سازی کند.
     """
-    def __init__(self, db_config: dict, temp_dir: Path):
+    # نوع خطوط توضیح dump متنی برای ساخت فهرست جداول (utils/toc.py)
+    TOC_DIALECT = None
+    # کوئری شمارش جداول کاربر در دیتابیس جاب (بررسی دیتابیس staging پیش از جایگزینی)
+    TABLE_COUNT_SQL = None
+    # کوئری حجم دیتابیس جاب به بایت (برنامه‌ریز بکاپ، utils/planner.py)
+    DATABASE_SIZE_SQL = None
+
+    def __init__(self, db_config: dict, temp_dir: Path, compression: dict = None, dump_options: dict = None,
+                 restore_options: dict = None):
         self.db_config = db_config
         self.temp_dir = temp_dir
         self.temp_dir.mkdir(exist_ok=True)
+        # تنظیمات فشرده‌سازی جاب، مثلاً {"codec": "pgzip", "level": 6, "workers": 8}
+        self.compression = compression or {}
+        # تنظیمات dump جاب (کلید 'dump' در JOBS)، مثلاً {"format": "directory", "jobs": 4}
+        self.dump_options = dump_options or {}
+        # تنظیمات بازیابی جاب (کلید 'restore' در JOBS)، مثلاً {"mode": "swap", "checks": [...]}
+        self.restore_options = restore_options or {}
+        # تنظیمات فشرده‌سازی استفاده شده در آخرین backup() (برای ثبت در مانیفست بکاپ)
+        self.compression_report = None
+        # فهرست بخش‌های dump در آخرین backup() (برای بازیابی تک‌جدول) یا None
+        self.toc = None
 
     @abstractmethod
     def backup(self) -> Path:
@@ -17,6 +46,161 @@ class BaseDriver(ABC):
         pass
 
     @abstractmethod
+    def backup_stream(self) -> tuple:
+        """
+        پشتیبان‌گیری جریانی بدون فایل موقت.
+        یک تاپل (نام پایه فایل بکاپ مثل 'db_20240101_000000.sql', iterator قطعات خام dump) برمی‌گرداند.
+        """
+        pass
+
+    @abstractmethod
+    def restore_stream(self, chunks, backup_name: str = None):
+        """
+        بازیابی جریانی: قطعات dump خام (iterable از bytes) مستقیماً به stdin ابزار کلاینت دیتابیس داده می‌شوند.
+        backup_name نام بکاپ بدون پسوندهای فشرده‌سازی و رمزگذاری است و فرمت dump از روی آن تشخیص داده می‌شود.
+        چون نوشتن در pipe تا آماده شدن ابزار بلاک می‌شود، سرعت مراحل قبلی خودبه‌خود با آن تنظیم می‌شود.
+        """
+        pass
+
+    @abstractmethod
+    def create_database(self):
+        """دیتابیس جاب را (در صورت نبود) ایجاد می‌کند؛ برای دیتابیس آزمایشی بررسی بکاپ."""
+        pass
+
+    @abstractmethod
+    def drop_database(self):
+        """دیتابیس جاب را در صورت وجود حذف می‌کند؛ برای پاک کردن دیتابیس آزمایشی پس از بررسی بکاپ."""
+        pass
+
+    @abstractmethod
+    def restore_table(self, sections: dict, read, target_schema: str = None):
+        """
+        بازیابی یک جدول از بکاپ دارای فهرست، بدون حذف دیتابیس. sections بخش‌های فهرست آن جدول است
+        ({PREAMBLE, TABLE, TABLE DATA}، بخش ناموجود None) و read(section) قطعات خام یک بخش را برمی‌گرداند.
+        با target_schema جدول در یک schema (در MySQL دیتابیس) جانبی بازیابی می‌شود.
+        """
+        pass
+
+    @abstractmethod
+    def query_value(self, sql: str) -> str:
+        """یک کوئری را روی دیتابیس جاب اجرا کرده و اولین مقدار نتیجه را به صورت متن برمی‌گرداند."""
+        pass
+
+    @abstractmethod
+    def swap_database(self, incoming: str, outgoing: str):
+        """
+        دیتابیس incoming را با تغییر نام جایگزین دیتابیس جاب می‌کند؛ دیتابیس فعلی با نام outgoing نگه داشته
+        می‌شود (نسخه قبلی outgoing حذف می‌شود).
+        """
+        pass
+
+    @abstractmethod
+    def list_databases(self) -> list:
+        """نام دیتابیس‌های کاربر روی سرور جاب با یک کوئری کاتالوگ (برای کشف دیتابیس‌های قالب‌های جاب)."""
+        pass
+
+    def check_database(self, checks: list = None, min_tables: int = 1) -> dict:
+        """
+        بررسی سلامت دیتابیس جاب پس از بازیابی در staging: حداقل تعداد جداول و کوئری‌های سفارشی checks که هر کدام
+        باید مقدار درست (true یا 1) برگردانند، مثلاً "SELECT count(*) > 0 FROM orders". در صورت شکست RuntimeError.
+        """
+        tables = int(self.query_value(self.TABLE_COUNT_SQL) or 0)
+        if tables < min_tables:
+            raise RuntimeError(f"دیتابیس بازیابی شده {tables} جدول دارد (حداقل {min_tables}).")
+        for sql in checks or []:
+            value = self.query_value(sql)
+            if value.strip().lower() not in ("t", "true", "1"):
+                raise RuntimeError(f"بررسی '{sql}' ناموفق بود (نتیجه: {value!r}).")
+        return {"tables": tables, "checks": len(checks or [])}
+
+    def database_profile(self) -> dict:
+        """حجم (بایت) و تعداد جداول دیتابیس جاب از کاتالوگ سرور، برای انتخاب طرح بکاپ."""
+        return {"size_bytes": int(self.query_value(self.DATABASE_SIZE_SQL) or 0),
+                "tables": int(self.query_value(self.TABLE_COUNT_SQL) or 0)}
+
+    def toc_enabled(self) -> bool:
+        """آیا dump این جاب با فهرست جداول ذخیره می‌شود (کلید 'toc' در تنظیمات dump، فقط فرمت plain)."""
+        if not self.dump_options.get("toc"):
+            return False
+        if self.dump_options.get("format", "plain") != "plain":
+            raise ValueError("فهرست جداول (toc) فقط برای dump با فرمت plain پشتیبانی می‌شود.")
+        return True
+
+    def create_compressor(self, rates=None):
+        """کمپرسور جاب؛ اگر فهرست جداول فعال باشد، بخش‌های dump هم‌زمان در SectionedCompressor ثبت می‌شوند."""
+        compressor = create_compressor(self.compression, rates)
+        return SectionedCompressor(compressor, self.TOC_DIALECT, self.compression) if self.toc_enabled() else compressor
+
     def restore(self, backup_file_path: Path):
         """یک فایل بکاپ استخراج شده (.sql) را روی دیتابیس بازیابی می‌کند."""
-        pass
\ No newline at end of file
+        with open(backup_file_path, 'rb') as f:
+            self.restore_stream(iter(lambda: f.read(STREAM_CHUNK_SIZE), b""), Path(backup_file_path).name)
+
+    def _compress(self, raw_path: Path) -> Path:
+        """
+        فایل dump خام را با کدک تنظیم شده برای جاب فشرده کرده و مسیر خروجی را برمی‌گرداند.
+        پسوند خروجی کدک را مشخص می‌کند؛ با کدک 'none' همان فایل خام برگردانده می‌شود.
+        """
+        suffix = suffix_for(self.compression)
+        compressor = self.create_compressor()
+        if not suffix:
+            if isinstance(compressor, SectionedCompressor):
+                # بدون فشرده‌سازی، offset بخش‌ها همان offset فایل خام است و فقط فهرست ساخته می‌شود
+                with open(raw_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+                        compressor.update(chunk)
+                compressor.finalize()
+                self.toc = compressor.toc
+            return raw_path
+        compressed_path = raw_path.with_name(raw_path.name + suffix)
+        self.compression_report = compress_file(raw_path, compressed_path, self.compression, compressor=compressor)
+        self.toc = getattr(compressor, "toc", None)
+        return compressed_path
+
+    def _stream_command(self, command: list, error_message: str, env: dict = None):
+        """
+        یک ابزار خط فرمان را اجرا کرده و stdout آن را قطعه‌به‌قطعه برمی‌گرداند (generator).
+        stderr در یک فایل موقت نگه داشته می‌شود تا پر شدن بافر آن پروسس را قفل نکند.
+        اگر مصرف‌کننده پیش از پایان جریان را رها کند، پروسس kill می‌شود.
+        """
+        with tempfile.TemporaryFile(dir=self.temp_dir) as stderr_file:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file, env=env)
+            try:
+                for chunk in iter(lambda: process.stdout.read(STREAM_CHUNK_SIZE), b""):
+                    yield chunk
+                if process.wait() != 0:
+                    stderr_file.seek(0)
+                    raise RuntimeError(f"{error_message}: {stderr_file.read().decode(errors='replace')}")
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+
+    def _feed_command(self, command: list, chunks, error_message: str, env: dict = None):
+        """
+        یک ابزار خط فرمان را اجرا کرده و قطعات ورودی را در stdin آن می‌نویسد.
+        اگر ابزار زودتر از پایان داده خارج شود یا کد خطا برگرداند، RuntimeError همراه با stderr رخ می‌دهد.
+        """
+        with tempfile.TemporaryFile(dir=self.temp_dir) as stderr_file:
+            process = subprocess.Popen(
+                command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr_file, env=env
+            )
+            broken_pipe = False
+            try:
+                for chunk in chunks:
+                    process.stdin.write(chunk)
+                process.stdin.close()
+            except BrokenPipeError:
+                broken_pipe = True
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+            except BaseException:
+                process.kill()
+                process.wait()
+                raise
+            if process.wait() != 0 or broken_pipe:
+                stderr_file.seek(0)
+                raise RuntimeError(f"{error_message}: {stderr_file.read().decode(errors='replace')}")
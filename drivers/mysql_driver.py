@@ -1,21 +1,46 @@
 import subprocess
-import gzip
 import shutil
 from datetime import datetime
 from pathlib import Path
 import os
 import platform
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # ایمپورت کلاس پایه
-from .base_driver import BaseDriver
+from .base_driver import BaseDriver, STREAM_CHUNK_SIZE
+from utils.archive import iter_tar_files, iter_tar_stream
+from utils.toc import PREAMBLE, TABLE, TABLE_DATA
+
+# فرمت‌های خروجی: plain (یک اسکریپت SQL) یا parallel (آرشیو tar با یک عضو برای هر جدول)
+DUMP_FORMATS = {"plain": ".sql", "parallel": ".tar"}
+# خطوطی از خروجی mysqldump که جدول مربوط به خود را مشخص می‌کنند
+_TABLE_LINE_RE = re.compile(rb"^(?:INSERT INTO|/\*!40000 ALTER TABLE) `((?:[^`]|``)+)`")
+_LOCK_MARKER = b"CHVN_LOCKED"
+# پیش‌نیاز هر اتصال بارگذاری داده: خروجی --compact تنظیمات هدر mysqldump را ندارد و جداول به ترتیب
+# دلخواه روی چند اتصال بارگذاری می‌شوند، بنابراین بررسی کلید خارجی موقتاً غیرفعال می‌شود.
+_DATA_PREAMBLE = (b"SET NAMES utf8mb4; SET TIME_ZONE='+00:00'; SET FOREIGN_KEY_CHECKS=0; SET UNIQUE_CHECKS=0; "
+                  b"SET SQL_MODE='NO_AUTO_VALUE_ON_ZERO';\n")
+
+
+def _quote_ident(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
 
 
 class MySQLDriver(BaseDriver):
     """درایور مخصوص پشتیبان‌گیری و بازیابی دیتابیس MySQL."""
+    TOC_DIALECT = "mysql"
+    TABLE_COUNT_SQL = ("SELECT COUNT(*) FROM information_schema.tables "
+                       "WHERE table_schema = DATABASE() AND table_type = 'BASE TABLE'")
+    DATABASE_SIZE_SQL = ("SELECT COALESCE(SUM(data_length + index_length), 0) FROM information_schema.tables "
+                         "WHERE table_schema = DATABASE()")
 
-    def __init__(self, db_config: dict, temp_dir: Path, bin_path: str = None):
-        """سازنده درایور، مسیر اختیاری پوشه bin را دریافت می‌کند."""
-        super().__init__(db_config, temp_dir)
+    def __init__(self, db_config: dict, temp_dir: Path, bin_path: str = None, compression: dict = None,
+                 dump_options: dict = None, restore_options: dict = None):
+        """سازنده درایور، مسیر اختیاری پوشه bin و تنظیمات فشرده‌سازی، dump و بازیابی جاب را دریافت می‌کند."""
+        super().__init__(db_config, temp_dir, compression, dump_options, restore_options)
         self.bin_path = Path(bin_path) if bin_path else None
         self.tool_paths = {}
 
@@ -39,16 +64,32 @@ class MySQLDriver(BaseDriver):
 
         raise FileNotFoundError(f"ابزار '{tool_name}' نه در مسیر مشخص شده و نه در PATH سیستم یافت نشد.")
 
+    def _connection_args(self) -> list:
+        return [
+            f"--host={self.db_config.get('host', 'localhost')}",
+            f"--port={self.db_config.get('port', 3306)}",
+            f"--user={self.db_config.get('user')}",
+            f"--password={self.db_config.get('password')}",
+        ]
+
+    def _dump_format(self) -> str:
+        dump_format = self.dump_options.get("format", "plain")
+        if dump_format not in DUMP_FORMATS:
+            raise ValueError(f"فرمت dump '{dump_format}' برای MySQL پشتیبانی نمی‌شود. فرمت‌های مجاز: {', '.join(DUMP_FORMATS)}")
+        return dump_format
+
     def backup(self) -> Path:
-        """از mysqldump برای ایجاد بکاپ استفاده کرده و خروجی را با gzip فشرده می‌کند."""
+        """از mysqldump برای ایجاد بکاپ استفاده کرده و خروجی را با کدک تنظیم شده برای جاب فشرده می‌کند."""
         db_name = self.db_config['database']
         print(f"🚀 [{datetime.now()}] شروع پشتیبان‌گیری از MySQL: {db_name}...")
 
         mysqldump_path = self._get_tool_path("mysqldump")
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        raw_backup_path = self.temp_dir / f"{db_name}_{timestamp}.sql"
-        compressed_backup_path = self.temp_dir / f"{db_name}_{timestamp}.sql.gz"
+        dump_format = self._dump_format()
+        raw_backup_path = self.temp_dir / f"{db_name}_{timestamp}{DUMP_FORMATS[dump_format]}"
+        compressed_backup_path = None
+        work_dir = self.temp_dir / f"{db_name}_{timestamp}.parallel"
 
         command = [
             mysqldump_path,
@@ -63,27 +104,72 @@ class MySQLDriver(BaseDriver):
         ]
 
         try:
-            with open(raw_backup_path, 'w', encoding='utf-8') as f:
-                subprocess.run(command, check=True, stdout=f, text=True)
+            if dump_format == "parallel":
+                members = self._parallel_dump(work_dir)
+                with open(raw_backup_path, 'wb') as f:
+                    for chunk in iter_tar_files(work_dir, members):
+                        f.write(chunk)
+            else:
+                # خروجی به صورت باینری ذخیره می‌شود تا داده‌های غیر UTF-8 (BLOB و ...) دست‌نخورده بمانند
+                with open(raw_backup_path, 'wb') as f:
+                    subprocess.run(command, check=True, stdout=f, stderr=subprocess.PIPE)
 
-            with open(raw_backup_path, 'rb') as f_in, gzip.open(compressed_backup_path, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
+            compressed_backup_path = self._compress(raw_backup_path)
 
             print(f"✅ فایل بکاپ MySQL با موفقیت در '{compressed_backup_path}' ایجاد شد.")
             return compressed_backup_path
         except subprocess.CalledProcessError as e:
             # mysqldump خطاها را در stderr چاپ می‌کند اما ممکن است stdout هم داشته باشد
             error_output = e.stderr if e.stderr else e.stdout
+            if isinstance(error_output, bytes):
+                error_output = error_output.decode(errors='replace')
             raise RuntimeError(f"پشتیبان‌گیری از MySQL شکست خورد: {error_output}") from e
         finally:
-            if raw_backup_path.exists():
+            if raw_backup_path.exists() and raw_backup_path != compressed_backup_path:
                 raw_backup_path.unlink()
+            shutil.rmtree(work_dir, ignore_errors=True)
 
-    def restore(self, backup_file_path: Path):
-        """یک فایل بکاپ .sql را روی دیتابیس MySQL بازیابی می‌کند."""
+    def backup_stream(self) -> tuple:
+        """خروجی mysqldump را به صورت باینری و بدون فایل موقت از stdout برمی‌گرداند."""
+        db_name = self.db_config['database']
+        print(f"🚀 [{datetime.now()}] شروع پشتیبان‌گیری جریانی از MySQL: {db_name}...")
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if self._dump_format() == "parallel":
+            def parallel_chunks():
+                work_dir = self.temp_dir / f"{db_name}_{timestamp}.parallel"
+                try:
+                    yield from iter_tar_files(work_dir, self._parallel_dump(work_dir))
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+
+            return f"{db_name}_{timestamp}{DUMP_FORMATS['parallel']}", parallel_chunks()
+
+        mysqldump_path = self._get_tool_path("mysqldump")
+        command = [
+            mysqldump_path,
+            f"--host={self.db_config.get('host', 'localhost')}",
+            f"--port={self.db_config.get('port', 3306)}",
+            f"--user={self.db_config.get('user')}",
+            f"--password={self.db_config.get('password')}",
+            "--single-transaction",
+            "--routines",
+            "--triggers",
+            db_name,
+        ]
+        chunks = self._stream_command(command, "پشتیبان‌گیری از MySQL شکست خورد")
+        return f"{db_name}_{timestamp}.sql", chunks
+
+    def restore_stream(self, chunks, backup_name: str = None):
+        """قطعات یک dump خام را به صورت باینری و جریانی به stdin کلاینت mysql می‌دهد."""
         db_name = self.db_config['database']
         print(f"🔄 [{datetime.now()}] شروع فرآیند بازیابی دیتابیس MySQL: {db_name}...")
 
+        if backup_name and backup_name.endswith(DUMP_FORMATS["parallel"]):
+            self._parallel_restore(chunks)
+            print(f"✅ بازیابی دیتابیس '{db_name}' با موفقیت کامل شد.")
+            return
+
         mysql_path = self._get_tool_path("mysql")
 
         command = [
@@ -95,10 +181,296 @@ class MySQLDriver(BaseDriver):
             db_name,
         ]
 
+        self._feed_command(command, chunks, "فرآیند بازیابی MySQL شکست خورد")
+        print(f"✅ بازیابی دیتابیس '{db_name}' با موفقیت کامل شد.")
+
+
+    def restore_table(self, sections: dict, read, target_schema: str = None):
+        """
+        بخش ساختار بکاپ (DROP TABLE IF EXISTS و CREATE TABLE) و سپس داده جدول اجرا می‌شوند؛ با target_schema
+        جدول در دیتابیس جانبی (در صورت نبود ساخته می‌شود) بازیابی می‌شود. دستورهای DDL در MySQL تراکنشی نیستند.
+        """
+        table = sections[TABLE] or sections[TABLE_DATA]
+        database = target_schema or self.db_config['database']
+        if target_schema:
+            self._admin_query(f"CREATE DATABASE IF NOT EXISTS `{target_schema.replace('`', '``')}`")
+        print(f"🔄 [{datetime.now()}] بازیابی جدول `{table['name']}` در دیتابیس MySQL '{database}'...")
+
+        def statements():
+            for kind in (PREAMBLE, TABLE, TABLE_DATA):
+                if sections[kind]:
+                    yield from read(sections[kind])
+
+        command = [self._get_tool_path("mysql"), *self._connection_args(), database]
+        self._feed_command(command, statements(), "بازیابی جدول MySQL شکست خورد")
+        print(f"✅ جدول `{table['name']}` با موفقیت بازیابی شد.")
+
+    # ------------------------------------------------------------------ حالت موازی
+    def _query(self, sql: str, use_database: bool = True) -> list:
+        """
+        یک کوئری کوتاه را با کلاینت mysql اجرا کرده و سطرهای خروجی (جدا شده با tab) را برمی‌گرداند. با
+        use_database=False دیتابیس جاب انتخاب نمی‌شود (برای کوئری‌های information_schema روی دیتابیس‌های دیگر).
+        """
+        command = [self._get_tool_path("mysql"), *self._connection_args(), "--batch", "--skip-column-names",
+                   "-e", sql]
+        if use_database:
+            command.append(self.db_config['database'])
         try:
-            with open(backup_file_path, 'r', encoding='utf-8') as f:
-                subprocess.run(command, check=True, stdin=f, text=True)
-            print(f"✅ بازیابی دیتابیس '{db_name}' با موفقیت کامل شد.")
+            result = subprocess.run(command, check=True, capture_output=True)
         except subprocess.CalledProcessError as e:
-            error_output = e.stderr if e.stderr else e.stdout
-            raise RuntimeError(f"فرآیند بازیابی MySQL شکست خورد: {error_output}") from e
\ No newline at end of file
+            raise RuntimeError(f"اجرای کوئری MySQL شکست خورد: {e.stderr.decode(errors='replace')}") from e
+        return [line.split(b"\t") for line in result.stdout.splitlines() if line]
+
+    def _admin_query(self, sql: str):
+        """یک دستور مدیریتی (بدون انتخاب دیتابیس جاب، چون ممکن است هنوز وجود نداشته باشد) اجرا می‌کند."""
+        command = [self._get_tool_path("mysql"), *self._connection_args(), "-e", sql]
+        try:
+            subprocess.run(command, check=True, capture_output=True)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"اجرای کوئری MySQL شکست خورد: {e.stderr.decode(errors='replace')}") from e
+
+    def query_value(self, sql: str) -> str:
+        rows = self._query(sql)
+        return rows[0][0].decode("utf-8", "replace") if rows else ""
+
+    def list_databases(self) -> list:
+        rows = self._query("SELECT schema_name FROM information_schema.schemata WHERE schema_name NOT IN "
+                           "('mysql', 'information_schema', 'performance_schema', 'sys') ORDER BY schema_name",
+                           use_database=False)
+        return [row[0].decode("utf-8") for row in rows]
+
+    def _base_tables(self, database: str) -> list:
+        literal = database.replace("'", "''")
+        rows = self._query("SELECT table_name FROM information_schema.tables "
+                           f"WHERE table_schema = '{literal}' AND table_type = 'BASE TABLE'", use_database=False)
+        return [row[0].decode("utf-8") for row in rows]
+
+    def swap_database(self, incoming: str, outgoing: str):
+        """
+        MySQL تغییر نام دیتابیس ندارد؛ جداول هر دو دیتابیس با یک دستور RENAME TABLE (که به صورت اتمی اجرا
+        می‌شود) جابجا می‌شوند: جداول فعلی به outgoing و جداول incoming به دیتابیس جاب. view ها، routine ها و
+        event های دیتابیس جاب سر جای خود می‌مانند و با نام به جداول جدید اشاره می‌کنند. RENAME TABLE جدول دارای
+        trigger را به دیتابیس دیگر منتقل نمی‌کند، بنابراین جابجایی دیتابیس‌های دارای trigger انجام نمی‌شود.
+        """
+        live = self.db_config['database']
+        databases = ", ".join("'" + name.replace("'", "''") + "'" for name in (live, incoming))
+        triggers = self._query(f"SELECT COUNT(*) FROM information_schema.triggers WHERE trigger_schema IN ({databases})",
+                               use_database=False)
+        if triggers and int(triggers[0][0]):
+            raise RuntimeError(f"دیتابیس '{live}' یا '{incoming}' trigger دارد و جداول آن با RENAME TABLE بین "
+                               f"دیتابیس‌ها جابجا نمی‌شوند؛ از بازیابی عادی استفاده کنید.")
+        incoming_tables = self._base_tables(incoming)
+        if not incoming_tables:
+            raise RuntimeError(f"دیتابیس '{incoming}' جدولی برای جایگزینی ندارد.")
+
+        self._admin_query(f"DROP DATABASE IF EXISTS {_quote_ident(outgoing)}")
+        self._admin_query(f"CREATE DATABASE {_quote_ident(outgoing)}")
+        self._admin_query(f"CREATE DATABASE IF NOT EXISTS {_quote_ident(live)}")
+        renames = [f"{_quote_ident(live)}.{_quote_ident(table)} TO {_quote_ident(outgoing)}.{_quote_ident(table)}"
+                   for table in self._base_tables(live)]
+        renames += [f"{_quote_ident(incoming)}.{_quote_ident(table)} TO {_quote_ident(live)}.{_quote_ident(table)}"
+                    for table in incoming_tables]
+        self._admin_query("RENAME TABLE " + ", ".join(renames))
+        # باقی‌مانده دیتابیس incoming (view ها و routine هایی که به جداول منتقل شده اشاره می‌کنند) حذف می‌شود
+        self._admin_query(f"DROP DATABASE {_quote_ident(incoming)}")
+
+    def create_database(self):
+        db_name = self.db_config['database'].replace("`", "``")
+        self._admin_query(f"CREATE DATABASE IF NOT EXISTS `{db_name}`")
+
+    def drop_database(self):
+        db_name = self.db_config['database'].replace("`", "``")
+        self._admin_query(f"DROP DATABASE IF EXISTS `{db_name}`")
+
+    def _list_tables(self) -> list:
+        """لیست جداول پایه دیتابیس به همراه حجم تقریبی داده هر کدام (برای تقسیم متوازن بین کارگرها)."""
+        db_name = self.db_config['database'].replace("'", "''")
+        rows = self._query(
+            "SELECT table_name, COALESCE(data_length, 0) FROM information_schema.tables "
+            f"WHERE table_schema = '{db_name}' AND table_type = 'BASE TABLE'"
+        )
+        return [(row[0].decode("utf-8"), int(row[1])) for row in rows]
+
+    @staticmethod
+    def _partition_tables(tables: list, workers: int) -> list:
+        """جداول را به روش «بزرگ‌ترین ابتدا» بین کارگرها پخش می‌کند تا حجم کار هر کارگر نزدیک به هم باشد."""
+        groups = [{"size": 0, "tables": []} for _ in range(max(1, min(workers, len(tables))))]
+        for name, size in sorted(tables, key=lambda t: t[1], reverse=True):
+            group = min(groups, key=lambda g: g["size"])
+            group["size"] += size
+            group["tables"].append(name)
+        return [g["tables"] for g in groups if g["tables"]]
+
+    def _split_table_output(self, process, started: threading.Event, data_dir: Path, members: dict, lock: threading.Lock):
+        """
+        خروجی یک کارگر mysqldump (چند جدول پشت سر هم) را خط به خط خوانده و داده هر جدول را در فایل
+        جداگانه می‌نویسد. mysqldump کاراکتر خط جدید داخل داده را escape می‌کند، بنابراین هر خط یک دستور کامل است.
+        """
+        current_table, current_file, pending = None, None, []
+        try:
+            for line in process.stdout:
+                started.set()
+                match = _TABLE_LINE_RE.match(line)
+                if match:
+                    table = match.group(1).replace(b"``", b"`").decode("utf-8")
+                    if table != current_table:
+                        if current_file:
+                            current_file.close()
+                        with lock:
+                            member = members.setdefault(table, f"data/{len(members) + 1:05d}.sql")
+                        current_table, current_file = table, open(data_dir.parent / member, 'ab')
+                        current_file.writelines(pending)
+                        pending = []
+                if current_file:
+                    current_file.write(line)
+                else:
+                    pending.append(line)
+        finally:
+            started.set()
+            if current_file:
+                current_file.close()
+
+    def _parallel_dump(self, work_dir: Path) -> list:
+        """
+        dump موازی و سازگار (consistent) جداول:
+        1. یک نشست کنترلی FLUSH TABLES WITH READ LOCK می‌گیرد تا هیچ نوشتنی انجام نشود.
+        2. schema.sql و triggers.sql در حالی که قفل برقرار است کامل گرفته می‌شوند تا هیچ DDL بعدی در آن‌ها نیاید.
+        3. کارگرهای mysqldump با --single-transaction شروع می‌شوند؛ snapshot همه آن‌ها در همین لحظه ثابت گرفته می‌شود.
+        4. به محض این‌که همه کارگرها شروع به خروجی دادن کردند (یعنی snapshot گرفته شد) قفل آزاد می‌شود.
+        داده هر جدول در یک عضو جداگانه آرشیو قرار می‌گیرد. لیست اعضا به ترتیب مناسب بازیابی برگردانده می‌شود:
+        manifest.json، schema.sql (جداول، view ها و routine ها)، داده جداول و در پایان triggers.sql.
+        """
+        db_name = self.db_config['database']
+        workers = int(self.dump_options.get("jobs", 4))
+        mysqldump_path = self._get_tool_path("mysqldump")
+        data_dir = work_dir / "data"
+        data_dir.mkdir(parents=True, exist_ok=True)
+
+        tables = self._list_tables()
+        groups = self._partition_tables(tables, workers)
+        print(f"🧵 dump موازی {len(tables)} جدول MySQL با {len(groups)} کارگر...")
+
+        base = [mysqldump_path, *self._connection_args(), "--single-transaction", "--default-character-set=utf8mb4"]
+        commands = {
+            "schema.sql": [*base, "--no-data", "--routines", "--events", "--skip-triggers", db_name],
+            "triggers.sql": [*base, "--no-create-info", "--no-data", "--no-create-db", "--skip-opt", "--triggers", db_name],
+        }
+
+        lock_session = subprocess.Popen(
+            [self._get_tool_path("mysql"), *self._connection_args(), "--batch", "--skip-column-names", "--unbuffered", db_name],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        processes, threads, members, lock = [], [], {}, threading.Lock()
+        try:
+            lock_session.stdin.write(b"FLUSH TABLES WITH READ LOCK;\nSELECT '" + _LOCK_MARKER + b"';\n")
+            lock_session.stdin.flush()
+            if lock_session.stdout.readline().strip() != _LOCK_MARKER:
+                raise RuntimeError(f"گرفتن قفل سراسری برای dump سازگار ممکن نشد: {lock_session.stderr.read().decode(errors='replace')}")
+
+            # dump ساختار (بدون داده و سریع) پیش از شروع کارگرها و زیر همان قفل کامل می‌شود؛ در غیر این صورت
+            # DDL ثبت شده پس از snapshot داده (مثلاً ADD COLUMN) به schema.sql راه می‌یابد و INSERT های --compact
+            # (بدون لیست ستون‌ها) هنگام بازیابی شکست می‌خورند.
+            schema_processes = []
+            for member, command in commands.items():
+                with open(work_dir / member, 'wb') as f:
+                    schema_processes.append(subprocess.Popen(command, stdout=f, stderr=subprocess.PIPE))
+            processes += [(process, None) for process in schema_processes]
+            for process in schema_processes:
+                stderr = process.stderr.read()
+                if process.wait() != 0:
+                    raise RuntimeError(f"dump ساختار دیتابیس MySQL شکست خورد: {stderr.decode(errors='replace')}")
+            for group in groups:
+                command = [*base, "--no-create-info", "--skip-triggers", "--compact", db_name, *group]
+                process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                started = threading.Event()
+                thread = threading.Thread(target=self._split_table_output, args=(process, started, data_dir, members, lock))
+                thread.start()
+                processes.append((process, started))
+                threads.append(thread)
+
+            # منتظر شروع همه کارگرها (اولین خروجی یا پایان پروسس) و سپس آزاد کردن قفل
+            for process, started in processes:
+                while started is not None and not started.wait(0.1) and process.poll() is None:
+                    pass
+            lock_session.stdin.write(b"UNLOCK TABLES;\n")
+            lock_session.stdin.close()
+            print("🔓 snapshot سازگار گرفته شد و قفل سراسری آزاد شد.")
+
+            errors = []
+            for process, _ in processes:
+                stderr = process.stderr.read()
+                if process.wait() != 0:
+                    errors.append(stderr.decode(errors='replace'))
+            for thread in threads:
+                thread.join()
+            if errors:
+                raise RuntimeError(f"پشتیبان‌گیری موازی MySQL شکست خورد: {' | '.join(errors)}")
+        finally:
+            for process, _ in processes:
+                if process.poll() is None:
+                    process.kill()
+            if lock_session.poll() is None:
+                lock_session.kill()
+            lock_session.wait()
+
+        manifest = {"database": db_name, "tables": {table: members.get(table) for table, _ in tables}}
+        with open(work_dir / "manifest.json", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        return ["manifest.json", "schema.sql", *sorted(members.values()), "triggers.sql"]
+
+    def _load_sql(self, chunks, preamble: bytes = b""):
+        """یک اسکریپت SQL را روی یک اتصال جدید کلاینت mysql اجرا می‌کند."""
+        command = [self._get_tool_path("mysql"), *self._connection_args(), "--default-character-set=utf8mb4",
+                   self.db_config['database']]
+
+        def with_preamble():
+            if preamble:
+                yield preamble
+            yield from chunks
+
+        self._feed_command(command, with_preamble(), "فرآیند بازیابی MySQL شکست خورد")
+
+    def _parallel_restore(self, chunks):
+        """
+        بازیابی آرشیو حالت موازی: ابتدا schema روی یک اتصال ساخته می‌شود، سپس داده جداول روی استخری از
+        اتصال‌های هم‌زمان بارگذاری شده و در پایان trigger ها ایجاد می‌شوند (تا هنگام بارگذاری داده اجرا نشوند).
+        """
+        workers = int(self.dump_options.get("restore_jobs", self.dump_options.get("jobs", 4)))
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        spool_dir = self.temp_dir / f"{self.db_config['database']}_{timestamp}.restore"
+        spool_dir.mkdir(parents=True, exist_ok=True)
+        futures, tables = [], {}
+
+        def load_member(path: Path):
+            try:
+                with open(path, 'rb') as f:
+                    self._load_sql(iter(lambda: f.read(STREAM_CHUNK_SIZE), b""), _DATA_PREAMBLE)
+            finally:
+                path.unlink()
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                for name, member in iter_tar_stream(chunks):
+                    reader = iter(lambda: member.read(STREAM_CHUNK_SIZE), b"")
+                    if name == "manifest.json":
+                        tables = {v: k for k, v in json.loads(member.read()).get("tables", {}).items() if v}
+                    elif name == "schema.sql":
+                        print("🧱 ایجاد schema...")
+                        self._load_sql(reader)
+                        print(f"🧵 بارگذاری داده {len(tables) or 'جداول'} جدول با {workers} اتصال موازی...")
+                    elif name == "triggers.sql":
+                        for future in futures:
+                            future.result()
+                        print("⚙️ ایجاد trigger ها...")
+                        self._load_sql(reader)
+                    elif name.startswith("data/"):
+                        # اعضای tar به ترتیب خوانده می‌شوند؛ هر عضو داده در فایل موقت ذخیره شده و به استخر سپرده می‌شود
+                        path = spool_dir / Path(name).name
+                        with open(path, 'wb') as f:
+                            for chunk in reader:
+                                f.write(chunk)
+                        futures.append(pool.submit(load_member, path))
+                for future in futures:
+                    future.result()
+        finally:
+            shutil.rmtree(spool_dir, ignore_errors=True)
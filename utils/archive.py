@@ -0,0 +1,96 @@
+import tarfile
+from pathlib import Path
+
+# بسته‌بندی جریانی یک پوشه (مثلاً خروجی pg_dump با فرمت directory) در قالب tar استاندارد.
+# هدر و محتوای هر فایل قطعه‌به‌قطعه تولید می‌شود، بنابراین حتی فایل‌های چند گیگابایتی هم
+# بدون بارگذاری کامل در حافظه از پایپ‌لاین فشرده‌سازی/رمزگذاری/آپلود عبور می‌کنند.
+TAR_BLOCK = 512
+READ_SIZE = 1024 * 1024
+
+
+def iter_tar_directory(directory: Path, chunk_size: int = READ_SIZE):
+    """محتوای یک پوشه را به صورت یک جریان tar (iterator از bytes) برمی‌گرداند."""
+    directory = Path(directory)
+    names = [path.relative_to(directory).as_posix() for path in sorted(directory.rglob("*")) if path.is_file()]
+    yield from iter_tar_files(directory, names, chunk_size)
+
+
+def iter_tar_files(directory: Path, names: list, chunk_size: int = READ_SIZE):
+    """
+    فایل‌های مشخص شده از یک پوشه را به همان ترتیب داده شده در یک جریان tar قرار می‌دهد؛
+    ترتیب اعضا برای بازیابی جریانی مهم است (مثلاً schema باید پیش از داده‌ها بیاید).
+    """
+    directory = Path(directory)
+    for name in names:
+        path = directory / name
+        stat = path.stat()
+        info = tarfile.TarInfo(name=name)
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = 0o600
+        yield info.tobuf(tarfile.PAX_FORMAT)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                yield chunk
+        padding = (-info.size) % TAR_BLOCK
+        if padding:
+            yield b"\0" * padding
+    yield b"\0" * (TAR_BLOCK * 2)
+
+
+class IterReader:
+    """یک iterator از bytes را به شیء فایل‌مانند فقط-خواندنی (با متد read) تبدیل می‌کند."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                self._eof = True
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def drain(self):
+        """باقی‌مانده جریان (مثلاً padding انتهای tar) را بدون نگه داشتن در حافظه مصرف می‌کند."""
+        self._buffer.clear()
+        for _ in self._chunks:
+            pass
+        self._eof = True
+
+
+def iter_tar_stream(chunks):
+    """
+    اعضای یک جریان tar را به ترتیب برمی‌گرداند: (نام عضو، شیء فایل‌مانند محتوای آن).
+    محتوای هر عضو باید پیش از رفتن به عضو بعدی خوانده شود.
+    """
+    reader = IterReader(chunks)
+    with tarfile.open(fileobj=reader, mode="r|") as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, archive.extractfile(member)
+    reader.drain()
+
+
+def extract_tar_stream(chunks, destination: Path):
+    """یک جریان tar را بدون ذخیره خود آرشیو، مستقیماً در پوشه مقصد باز می‌کند."""
+    destination = Path(destination)
+    destination.mkdir(parents=True, exist_ok=True)
+    reader = IterReader(chunks)
+    with tarfile.open(fileobj=reader, mode="r|") as archive:
+        # فیلتر 'data' از نوشتن خارج از پوشه مقصد و فایل‌های خاص جلوگیری می‌کند
+        if hasattr(tarfile, "data_filter"):
+            archive.extractall(destination, filter="data")
+        else:
+            archive.extractall(destination)
+    reader.drain()
@@ -0,0 +1,229 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from utils.compression import codec_from_name
+from utils.dedup import CHUNK_PREFIX, DEDUP_SUFFIX
+from utils.transfer import MANIFEST_SUFFIX
+from utils.wal import BASE_PREFIX, WAL_PREFIX, TIME_FORMAT
+
+# کاتالوگ محلی بکاپ‌های هر باکت (یک فایل SQLite برای هر باکت) تا لیست و جستجوی بکاپ‌ها بدون دریافت لیست
+# کامل باکت انجام شود. بکاپ‌هایی که همین agent آپلود می‌کند با حجم، زمان، کدک و checksum ثبت می‌شوند و
+# بقیه با همگام‌سازی افزایشی از سرور اضافه یا حذف می‌شوند:
+#   GET {base}/api/v1/storage/list/{bucket}?cursor=<c>&limit=<n>   سرآیند If-None-Match: <ETag پاسخ قبلی>
+#     304                          از همگام‌سازی قبلی تغییری نیست
+#     {"files": [...], "deleted": [...], "cursor": "...", "has_more": true}
+#                                  تغییرات پس از cursor؛ cursor آخر برای همگام‌سازی بعدی ذخیره می‌شود
+#     {"files": [...]}             سرور cursor را پشتیبانی نمی‌کند: لیست کامل با کاتالوگ تطبیق داده می‌شود
+# هر عضو files می‌تواند نام شیء یا {"name", "size", "last_modified"} باشد. size حجم شیء ذخیره شده است، به جز
+# بکاپ‌های dedup که حجم داده بکاپ (مجموع قطعات) ثبت می‌شود.
+PAGE_SIZE = 1000
+_LOCAL_TIME_RE = re.compile(r"_(\d{8}_\d{6})")
+_UTC_TIME_RE = re.compile(r"(\d{8}T\d{6}Z)")
+
+
+def backup_kind(object_name: str):
+    """نوع بکاپ بر اساس نام شیء؛ برای اشیائی که خودشان بکاپ نیستند (قطعه، WAL، مانیفست) None."""
+    if object_name.endswith(MANIFEST_SUFFIX) or object_name.startswith((CHUNK_PREFIX, WAL_PREFIX)):
+        return None
+    if not object_name.endswith(".enc"):
+        return None
+    if object_name.endswith(DEDUP_SUFFIX):
+        return "dedup"
+    if object_name.startswith(BASE_PREFIX):
+        return "base"
+    return "logical"
+
+
+def time_from_name(object_name: str):
+    """زمان ثبت شده در نام بکاپ (epoch)؛ بکاپ‌های پایه UTC و dump ها وقت محلی agent هستند."""
+    match = _UTC_TIME_RE.search(object_name)
+    if match:
+        return datetime.strptime(match.group(1), TIME_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+    match = _LOCAL_TIME_RE.search(object_name)
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+    return None
+
+
+def manifest_checksum(manifest: dict) -> str:
+    """checksum کل شیء از روی هش بخش‌های مانیفست (SHA-256 هش‌های پشت سر هم)، بدون خواندن دوباره داده."""
+    return hashlib.sha256("".join(part["sha256"] for part in manifest["parts"]).encode()).hexdigest()
+
+
+def _timestamp(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return moment.timestamp()
+
+
+class BackupCatalog:
+    """کاتالوگ SQLite بکاپ‌های یک باکت؛ از چند نخ (executor و WebSocket) قابل استفاده است."""
+
+    def __init__(self, path: Path, bucket_name: str):
+        self.bucket_name = bucket_name
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS backups ("
+                " name TEXT PRIMARY KEY, kind TEXT NOT NULL, created_at REAL, size INTEGER, checksum TEXT,"
+                " job TEXT, codec TEXT, origin TEXT NOT NULL, synced_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS backups_created ON backups (created_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS backups_size ON backups (size)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+
+    # ---------------------------------------------------------------- writes
+    def _upsert(self, rows: list):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO backups (name, kind, created_at, size, checksum, job, codec, origin, synced_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET"
+                " created_at = COALESCE(excluded.created_at, created_at), size = COALESCE(excluded.size, size),"
+                " checksum = COALESCE(excluded.checksum, checksum), job = COALESCE(excluded.job, job),"
+                " codec = COALESCE(excluded.codec, codec), synced_at = excluded.synced_at",
+                rows,
+            )
+
+    @staticmethod
+    def _row(object_name: str, size=None, checksum=None, created_at=None, job=None, codec=None, origin="agent"):
+        kind = backup_kind(object_name)
+        if kind is None:
+            return None
+        if created_at is None:
+            created_at = time_from_name(object_name)
+        if codec is None and kind != "dedup":
+            codec = codec_from_name(object_name)
+        return object_name, kind, created_at, size, checksum, job, codec, origin, time.time()
+
+    def record(self, object_name: str, size: int = None, checksum: str = None, created_at: float = None,
+               job: str = None, codec: str = None) -> bool:
+        """یک بکاپ را ثبت یا به‌روز می‌کند؛ مقادیر None اطلاعات موجود را پاک نمی‌کنند. برای اشیاء غیر بکاپ False."""
+        row = self._row(object_name, size, checksum, created_at, job, codec)
+        if row is not None:
+            self._upsert([row])
+        return row is not None
+
+    def remove(self, object_names):
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM backups WHERE name = ?", [(name,) for name in object_names])
+
+    def _state(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, **values):
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO sync_state VALUES (?, ?)",
+                                 [(key, None if value is None else str(value)) for key, value in values.items()])
+
+    # ------------------------------------------------------------------ sync
+    def _apply(self, entries: list):
+        rows = []
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {"name": entry}
+            row = self._row(entry["name"], size=entry.get("size"), created_at=_timestamp(entry.get("last_modified")),
+                            origin="server")
+            if row is not None:
+                rows.append(row)
+        self._upsert(rows)
+
+    def sync(self, transport, page_size: int = PAGE_SIZE) -> dict:
+        """
+        کاتالوگ را با باکت همگام می‌کند (transport یک utils.transport.Transport است). تنها تغییرات پس از
+        cursor قبلی دریافت می‌شوند و اگر سرور cursor را پشتیبانی نکند، لیست کامل با کاتالوگ تطبیق داده می‌شود.
+        """
+        stats = {"pages": 0, "received": 0, "removed": 0, "unchanged": False}
+        cursor, etag = self._state("cursor"), self._state("etag")
+        started, full_listing = time.time(), False
+        while True:
+            params = {"limit": page_size, **({"cursor": cursor} if cursor else {})}
+            headers = {"If-None-Match": etag} if etag and not stats["pages"] else {}
+            response = transport.request("GET", f"/api/v1/storage/list/{self.bucket_name}", headers=headers,
+                                         params=params, timeout=60)
+            if response.status_code == 304:
+                stats["unchanged"] = True
+                return stats
+            stats["pages"] += 1
+            payload = response.json()
+            self._apply(payload.get("files", []))
+            stats["received"] += len(payload.get("files", []))
+            if payload.get("deleted"):
+                self.remove(payload["deleted"])
+                stats["removed"] += len(payload["deleted"])
+            if "cursor" not in payload:
+                full_listing = True
+                break
+            cursor = payload["cursor"] or cursor
+            if not payload.get("has_more") or not payload.get("files"):
+                break
+        if full_listing:
+            # هر بکاپ موجود در لیست (یا ثبت شده در حین همگام‌سازی) اکنون synced_at جدیدتری دارد
+            with self._lock:
+                stale = [row[0] for row in self._db.execute("SELECT name FROM backups WHERE synced_at < ?", (started,))]
+            self.remove(stale)
+            stats["removed"] += len(stale)
+            cursor = None
+        self._set_state(cursor=cursor, etag=response.headers.get("ETag"), synced_at=time.time())
+        return stats
+
+    def synced_at(self):
+        value = self._state("synced_at")
+        return float(value) if value else None
+
+    # ---------------------------------------------------------------- queries
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM backups").fetchone()[0]
+
+    def get(self, object_name: str):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM backups WHERE name = ?", (object_name,)).fetchone()
+        return dict(row) if row else None
+
+    def query(self, since: float = None, until: float = None, kind: str = None, order: str = "created_at",
+              descending: bool = True, limit: int = None, offset: int = 0) -> list:
+        """بکاپ‌ها با فیلتر زمانی و نوع، مرتب‌شده بر اساس created_at یا size، صفحه‌به‌صفحه."""
+        if order not in ("created_at", "size", "name"):
+            raise ValueError(f"مرتب‌سازی بر اساس '{order}' پشتیبانی نمی‌شود.")
+        conditions, values = [], []
+        if since is not None:
+            conditions.append("created_at >= ?")
+            values.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            values.append(until)
+        if kind:
+            conditions.append("kind = ?")
+            values.append(kind)
+        sql = "SELECT * FROM backups"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {order} IS NULL, {order} {'DESC' if descending else 'ASC'}, name"
+        sql += " LIMIT ? OFFSET ?"
+        values += [-1 if limit is None else limit, offset]
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, values)]
+
+    def latest(self, before: float = None, kind: str = None):
+        """آخرین بکاپ پیش از زمان before (یا آخرین بکاپ)."""
+        rows = self.query(until=before, kind=kind, limit=1)
+        return rows[0] if rows else None
+
+    def largest(self, since: float = None, limit: int = 10) -> list:
+        return self.query(since=since, order="size", limit=limit)
+
+    def close(self):
+        self._db.close()
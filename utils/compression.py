@@ -0,0 +1,412 @@
+import bz2
+import lzma
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+try:
+    import zstandard
+except ImportError:  # وابستگی اختیاری؛ فقط برای کدک zstd لازم است
+    zstandard = None
+
+# لایه فشرده‌سازی مشترک درایورها و پایپ‌لاین جریانی.
+# کدک هر بکاپ در پسوند فایل ثبت می‌شود تا بازیابی بدون تنظیمات اضافه، decompressor درست را انتخاب کند.
+# pgzip یک gzip استاندارد چند عضوی تولید می‌کند (بلوک‌های مستقل که موازی فشرده شده‌اند) و پسوند آن همان .gz است.
+CODEC_SUFFIXES = {
+    "gzip": ".gz",
+    "pgzip": ".gz",
+    "zstd": ".zst",
+    "xz": ".xz",
+    "bz2": ".bz2",
+    "none": "",
+}
+DEFAULT_LEVELS = {"gzip": 9, "pgzip": 9, "zstd": 3, "xz": 6, "bz2": 9, "none": 0}
+DEFAULT_CODEC = "gzip"
+BLOCK_SIZE = 4 * 1024 * 1024
+# حالت تطبیقی ({"level": "adaptive"}، فقط gzip و pgzip): سطح هر بلوک جداگانه انتخاب می‌شود
+ADAPTIVE = "adaptive"
+ADAPTIVE_LEVELS = (1, 3, 6, 9)
+ADAPTIVE_FALLBACK_LEVEL = 6
+INCOMPRESSIBLE_RATIO = 0.95
+SAMPLE_SIZE = 64 * 1024
+EXPLORE_EVERY = 16
+
+
+class GzipCompressor:
+    """فشرده‌سازی جریانی با خروجی استاندارد gzip (معادل gzip.open با همان سطح فشرده‌سازی)."""
+
+    def __init__(self, level: int = 9):
+        self.level = level
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def update(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def end_member(self) -> bytes:
+        """عضو gzip فعلی را می‌بندد تا داده بعدی از یک عضو مستقل شروع شود (بکاپ با فهرست جداول)."""
+        tail = self._compressor.flush()
+        self._compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return tail
+
+    def finalize(self) -> bytes:
+        return self._compressor.flush()
+
+
+def _gzip_block(data: bytes, level: int) -> bytes:
+    """یک بلوک را به عنوان یک عضو مستقل gzip فشرده می‌کند (برای اجرا در نخ یا پروسس کارگر)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ParallelGzipCompressor:
+    """
+    فشرده‌سازی gzip بلوکی و موازی. ورودی به بلوک‌های ثابت تقسیم شده، هر بلوک روی یک استخر نخ
+    (zlib هنگام فشرده‌سازی GIL را آزاد می‌کند) یا پروسس به یک عضو gzip مستقل تبدیل می‌شود و
+    خروجی به ترتیب اصلی کنار هم قرار می‌گیرد. نتیجه یک فایل .gz استاندارد است که با gunzip باز می‌شود.
+    حداکثر (workers × 2) بلوک هم‌زمان در حافظه نگه داشته می‌شود.
+    """
+
+    def __init__(self, level: int = 9, workers: int = 4, block_size: int = BLOCK_SIZE, pool: str = "thread"):
+        self.level = level
+        self.block_size = block_size
+        self._window = max(1, workers) * 2
+        executor_class = ProcessPoolExecutor if pool == "process" else ThreadPoolExecutor
+        self._executor = executor_class(max_workers=max(1, workers))
+        self._pending = []
+        self._buffer = bytearray()
+
+    def _submit(self, block: bytes):
+        self._pending.append(self._executor.submit(_gzip_block, block, self.level))
+
+    def _collect(self, wait_until: int) -> bytes:
+        """نتایج آماده را به ترتیب برمی‌گرداند و تا زمانی که تعداد در صف بیش از wait_until باشد منتظر می‌ماند."""
+        out = bytearray()
+        while self._pending and (len(self._pending) > wait_until or self._pending[0].done()):
+            out += self._pending.pop(0).result()
+        return bytes(out)
+
+    def update(self, data: bytes) -> bytes:
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return self._collect(self._window)
+
+    def end_member(self) -> bytes:
+        """بلوک نیمه‌پر فعلی را به عنوان یک عضو جدا فشرده می‌کند و منتظر همه بلوک‌های در صف می‌ماند."""
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        return self._collect(0)
+
+    def finalize(self) -> bytes:
+        try:
+            if self._buffer or not self._pending:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            return self._collect(0)
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def close(self):
+        """
+        استخر کارگرها را بدون انتظار برای بلوک‌های در صف آزاد می‌کند؛ برای وقتی که جریان پیش از finalize()
+        شکست خورده است. پس از finalize() فراخوانی آن بی‌اثر است.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._pending.clear()
+
+
+class LevelController:
+    """
+    انتخاب سطح فشرده‌سازی هر بلوک برای کمترین زمان کل بکاپ. برای هر سطح سرعت فشرده‌سازی (مجموع کارگرها) و
+    نسبت حجم خروجی به ورودی با میانگین متحرک نگه داشته می‌شود و سرعت تولید داده (dump) و ظرفیت آپلود از rates()
+    خوانده می‌شود. در حالت جریانی (overlap) مراحل هم‌زمان‌اند و توان کل کمینه سه مقدار است؛ در حالت فایل مراحل
+    پشت سر هم‌اند و زمان‌ها جمع می‌شوند. از بین سطح‌هایی که توانشان تا ۵٪ با بهترین فاصله دارد، سطحی که خروجی
+    کوچک‌تری می‌دهد انتخاب می‌شود. تا وقتی ظرفیت آپلود معلوم نیست، سطح پیش‌فرض استفاده می‌شود.
+    """
+
+    def __init__(self, levels=ADAPTIVE_LEVELS, workers: int = 1, rates=None, uplink_bps: float = None,
+                 overlap: bool = True, fallback_level: int = ADAPTIVE_FALLBACK_LEVEL, explore_every: int = EXPLORE_EVERY):
+        self.levels = sorted(levels)
+        self.workers = max(1, workers)
+        self.rates = rates
+        self.uplink_bps = uplink_bps
+        self.overlap = overlap
+        self.fallback_level = min(self.levels, key=lambda level: abs(level - fallback_level))
+        self.explore_every = explore_every
+        self._speed = {}
+        self._ratio = {}
+        self._chosen = 0
+        self._lock = threading.Lock()
+
+    def record(self, level: int, size_in: int, size_out: int, seconds: float):
+        if level not in self.levels or not size_in or seconds <= 0:
+            return
+        with self._lock:
+            speed, ratio = size_in / seconds * self.workers, size_out / size_in
+            self._speed[level] = speed if level not in self._speed else 0.7 * self._speed[level] + 0.3 * speed
+            self._ratio[level] = ratio if level not in self._ratio else 0.7 * self._ratio[level] + 0.3 * ratio
+
+    def _limits(self) -> tuple:
+        source, sink = self.rates() if self.rates else (None, None)
+        return source, sink or self.uplink_bps
+
+    def _throughput(self, level: int, source, sink) -> float:
+        speed, ratio = self._speed[level], max(self._ratio[level], 1e-6)
+        if self.overlap:
+            return min(speed, sink / ratio, source or float("inf"))
+        return 1 / (1 / speed + ratio / sink)
+
+    def choose(self) -> int:
+        with self._lock:
+            self._chosen += 1
+            unknown = [level for level in self.levels if level not in self._speed]
+            if unknown:
+                # هر سطح یک بار آزموده می‌شود تا سرعت و نسبت آن روی همین داده معلوم شود
+                return unknown[0]
+            source, sink = self._limits()
+            if not sink:
+                return self.fallback_level
+            scores = {level: self._throughput(level, source, sink) for level in self.levels}
+            best = max(scores.values())
+            level = min((level for level in self.levels if scores[level] >= 0.95 * best), key=self._ratio.get)
+            if self._chosen % self.explore_every == 0:
+                # سطح همسایه دوباره آزموده می‌شود تا تخمین‌ها با تغییر داده یا شبکه به‌روز بمانند
+                index = self.levels.index(level)
+                neighbours = self.levels[max(0, index - 1):index] + self.levels[index + 1:index + 2]
+                return neighbours[(self._chosen // self.explore_every) % len(neighbours)] if neighbours else level
+            return level
+
+
+class AdaptiveGzipCompressor(ParallelGzipCompressor):
+    """
+    gzip بلوکی با سطح تطبیقی: سطح هر بلوک را LevelController انتخاب می‌کند و بلوکی که نمونه ابتدای آن حتی با
+    سطح 1 فشرده نمی‌شود (مثلاً داده از پیش فشرده) بدون فشرده‌سازی (سطح 0) ذخیره می‌شود. خروجی همان gzip چند
+    عضوی استاندارد است. خلاصه سطح‌های استفاده شده در report نگه داشته می‌شود تا در مانیفست بکاپ ثبت شود.
+    """
+
+    def __init__(self, workers: int = 4, block_size: int = BLOCK_SIZE, min_level: int = 1, max_level: int = 9,
+                 rates=None, uplink_bps: float = None, codec: str = "pgzip"):
+        super().__init__(max_level, workers, block_size)
+        levels = [level for level in ADAPTIVE_LEVELS if min_level <= level <= max_level] or [max_level]
+        self.controller = LevelController(levels, max(1, workers), rates, uplink_bps, overlap=rates is not None)
+        self.report = {"codec": codec, "level": ADAPTIVE, "blocks": 0, "stored_blocks": 0, "levels": {},
+                       "bytes_in": 0, "bytes_out": 0}
+        self._report_lock = threading.Lock()
+
+    def _submit(self, block: bytes):
+        self._pending.append(self._executor.submit(self._compress_block, block, self.controller.choose()))
+
+    def _compress_block(self, block: bytes, level: int) -> bytes:
+        sample = block[:SAMPLE_SIZE]
+        if sample and len(zlib.compress(sample, 1)) > INCOMPRESSIBLE_RATIO * len(sample):
+            level = 0
+        started = time.perf_counter()
+        output = _gzip_block(block, level)
+        self.controller.record(level, len(block), len(output), time.perf_counter() - started)
+        with self._report_lock:
+            self.report["blocks"] += 1
+            self.report["stored_blocks"] += int(level == 0)
+            self.report["levels"][str(level)] = self.report["levels"].get(str(level), 0) + 1
+            self.report["bytes_in"] += len(block)
+            self.report["bytes_out"] += len(output)
+        return output
+
+
+class ZstdCompressor:
+    """فشرده‌سازی zstd؛ کتابخانه zstandard خودش از چند نخ (threads) پشتیبانی می‌کند."""
+
+    def __init__(self, level: int = 3, workers: int = 1):
+        if zstandard is None:
+            raise RuntimeError("برای کدک zstd باید بسته 'zstandard' نصب شود (pip install zstandard).")
+        self._compressor = zstandard.ZstdCompressor(level=level, threads=workers if workers > 1 else 0).compressobj()
+
+    def update(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finalize(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _StdlibCompressor:
+    """آداپتور کمپرسورهای کتابخانه استاندارد (lzma/bz2) به رابط update/finalize."""
+
+    def __init__(self, compressor):
+        self._compressor = compressor
+
+    def update(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finalize(self) -> bytes:
+        return self._compressor.flush()
+
+
+class PassThrough:
+    """کدک 'none': داده را بدون تغییر عبور می‌دهد."""
+
+    def update(self, data: bytes) -> bytes:
+        return data
+
+    def finalize(self) -> bytes:
+        return b""
+
+
+class MultiStreamDecompressor:
+    """
+    باز کردن جریانی فرمت‌هایی که ممکن است چند عضو پشت سر هم داشته باشند (gzip، bz2، xz).
+    فایل‌های چند عضوی مانند خروجی pgzip همانند gzip.open به صورت کامل باز می‌شوند.
+    """
+
+    def __init__(self, factory, name: str):
+        self._factory = factory
+        self._name = name
+        self._decompressor = factory()
+        self._member_started = False
+
+    def update(self, data: bytes) -> bytes:
+        out = bytearray()
+        while data:
+            self._member_started = True
+            out += self._decompressor.decompress(data)
+            if not self._decompressor.eof:
+                break
+            data = self._decompressor.unused_data
+            self._decompressor = self._factory()
+            self._member_started = False
+        return bytes(out)
+
+    def finalize(self) -> bytes:
+        if self._member_started:
+            raise ValueError(f"فایل فشرده {self._name} ناقص است.")
+        return b""
+
+
+class GzipDecompressor(MultiStreamDecompressor):
+    """باز کردن جریانی gzip (تک یا چند عضوی)."""
+
+    def __init__(self):
+        super().__init__(lambda: zlib.decompressobj(31), "gzip")
+
+
+class ZstdDecompressor(MultiStreamDecompressor):
+    """باز کردن جریانی zstd؛ چند frame پشت سر هم (مثلاً بکاپ با فهرست جداول) نیز پشتیبانی می‌شود."""
+
+    def __init__(self):
+        if zstandard is None:
+            raise RuntimeError("برای باز کردن فایل‌های .zst باید بسته 'zstandard' نصب شود (pip install zstandard).")
+        super().__init__(lambda: zstandard.ZstdDecompressor().decompressobj(), "zstd")
+
+
+def normalize_settings(settings: dict = None) -> dict:
+    """تنظیمات فشرده‌سازی یک جاب (کلید 'compression' در JOBS) را با مقادیر پیش‌فرض کامل می‌کند."""
+    settings = dict(settings or {})
+    codec = settings.get("codec", DEFAULT_CODEC)
+    if codec not in CODEC_SUFFIXES:
+        raise ValueError(f"کدک فشرده‌سازی '{codec}' پشتیبانی نمی‌شود. کدک‌های مجاز: {', '.join(CODEC_SUFFIXES)}")
+    settings["codec"] = codec
+    settings.setdefault("level", DEFAULT_LEVELS[codec])
+    if settings["level"] == ADAPTIVE and codec not in ("gzip", "pgzip"):
+        raise ValueError(f"سطح فشرده‌سازی تطبیقی فقط برای کدک‌های gzip و pgzip پشتیبانی می‌شود (نه '{codec}').")
+    settings.setdefault("workers", 1)
+    return settings
+
+
+def suffix_for(settings: dict = None) -> str:
+    return CODEC_SUFFIXES[normalize_settings(settings)["codec"]]
+
+
+def create_compressor(settings: dict = None, rates=None):
+    """
+    یک کمپرسور جریانی (با متدهای update/finalize) بر اساس تنظیمات جاب می‌سازد. rates (اختیاری) در حالت تطبیقی
+    تابعی است که (سرعت تولید داده، ظرفیت آپلود) را بر حسب بایت در ثانیه (یا None) برمی‌گرداند.
+    """
+    settings = normalize_settings(settings)
+    codec, level, workers = settings["codec"], settings["level"], settings["workers"]
+    if level == ADAPTIVE:
+        uplink_mbps = float(settings.get("uplink_mbps", 0))
+        return AdaptiveGzipCompressor(workers, settings.get("block_size", BLOCK_SIZE), int(settings.get("min_level", 1)),
+                                      int(settings.get("max_level", 9)), rates,
+                                      uplink_mbps * 1_000_000 / 8 if uplink_mbps else None, codec)
+    if codec == "gzip":
+        return GzipCompressor(level)
+    if codec == "pgzip":
+        return ParallelGzipCompressor(level, workers, settings.get("block_size", BLOCK_SIZE), settings.get("pool", "thread"))
+    if codec == "zstd":
+        return ZstdCompressor(level, workers)
+    if codec == "xz":
+        return _StdlibCompressor(lzma.LZMACompressor(preset=level))
+    if codec == "bz2":
+        return _StdlibCompressor(bz2.BZ2Compressor(level))
+    return PassThrough()
+
+
+def compression_report(compressor, settings: dict = None) -> dict:
+    """
+    تنظیمات فشرده‌سازی واقعاً استفاده شده برای ثبت در مانیفست بکاپ. در حالت تطبیقی همان دیکشنری report
+    کمپرسور برگردانده می‌شود که تا پایان finalize به‌روز می‌شود.
+    """
+    report = getattr(compressor, "report", None)
+    if report is not None:
+        return report
+    settings = normalize_settings(settings)
+    return {"codec": settings["codec"], "level": settings["level"]}
+
+
+def codec_from_name(file_name: str) -> str:
+    """کدک یک فایل بکاپ را از روی پسوند آن (پس از حذف .enc) تشخیص می‌دهد."""
+    name = file_name.removesuffix(".enc")
+    for codec, suffix in CODEC_SUFFIXES.items():
+        if suffix and name.endswith(suffix):
+            return codec
+    return "none"
+
+
+def strip_codec_suffix(file_name: str) -> str:
+    """نام فایل را بدون پسوندهای .enc و پسوند کدک برمی‌گرداند (مثلاً 'db.sql.zst.enc' → 'db.sql')."""
+    name = file_name.removesuffix(".enc")
+    return name.removesuffix(CODEC_SUFFIXES[codec_from_name(name)])
+
+
+def create_decompressor(file_name: str):
+    """decompressor مناسب را بر اساس پسوند نام فایل بکاپ برمی‌گرداند."""
+    codec = codec_from_name(file_name)
+    if codec in ("gzip", "pgzip"):
+        return GzipDecompressor()
+    if codec == "zstd":
+        return ZstdDecompressor()
+    if codec == "xz":
+        return MultiStreamDecompressor(lzma.LZMADecompressor, "xz")
+    if codec == "bz2":
+        return MultiStreamDecompressor(bz2.BZ2Decompressor, "bz2")
+    return PassThrough()
+
+
+def compress_file(input_path, output_path, settings: dict = None, chunk_size: int = BLOCK_SIZE,
+                  compressor=None) -> dict:
+    """
+    یک فایل را با کدک انتخاب شده و حافظه ثابت فشرده می‌کند و تنظیمات استفاده شده را برمی‌گرداند.
+    compressor (اختیاری) کمپرسور از پیش ساخته شده است، مثلاً SectionedCompressor بکاپ با فهرست جداول.
+    """
+    compressor = compressor or create_compressor(settings)
+    try:
+        with open(input_path, "rb") as f_in, open(output_path, "wb") as f_out:
+            for chunk in iter(lambda: f_in.read(chunk_size), b""):
+                f_out.write(compressor.update(chunk))
+            f_out.write(compressor.finalize())
+    finally:
+        # در صورت خطا، استخر کارگرهای کمپرسور موازی تا جمع‌آوری زباله زنده نمی‌ماند
+        close = getattr(compressor, "close", None)
+        if close:
+            close()
+    return compression_report(compressor, settings)
+
+
+def decompress_file(input_path, output_path, chunk_size: int = BLOCK_SIZE):
+    """یک فایل فشرده را بر اساس پسوند نام آن باز می‌کند."""
+    decompressor = create_decompressor(str(input_path))
+    with open(input_path, "rb") as f_in, open(output_path, "wb") as f_out:
+        for chunk in iter(lambda: f_in.read(chunk_size), b""):
+            f_out.write(decompressor.update(chunk))
+        f_out.write(decompressor.finalize())
@@ -0,0 +1,293 @@
+import hashlib
+import hmac
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from utils.compression import create_compressor, create_decompressor, CODEC_SUFFIXES, DEFAULT_LEVELS, ADAPTIVE
+from utils.metrics import propagate
+from utils.security import derive_chunk_id_key, encrypt_bytes, decrypt_bytes
+from utils.transfer import create_session, send_with_retries, WORKERS, MAX_RETRIES
+
+# بکاپ با حذف داده تکراری (dedup):
+# جریان dump به قطعات با مرز وابسته به محتوا تقسیم می‌شود، بنابراین تغییر چند سطر از دیتابیس فقط
+# قطعات اطراف همان سطرها را عوض می‌کند. هر قطعه با شناسه HMAC محتوایش و به صورت جداگانه فشرده و
+# رمزگذاری شده ذخیره می‌شود و قطعه‌ای که قبلاً در باکت وجود دارد دوباره آپلود نمی‌شود.
+# هر بکاپ فقط یک مانیفست رمزگذاری شده است (<نام>.dedup.enc) که لیست مرتب شناسه قطعات را نگه می‌دارد.
+#
+# اشیاء سمت سرور:
+#   chunks.<id>          یک قطعه (فشرده و رمزگذاری شده)
+#   <backup>.dedup.enc   مانیفست یک بکاپ
+#   DELETE {base}/api/v1/storage/delete/{bucket}/{object}    حذف یک شیء (برای جمع‌آوری زباله)
+CHUNK_PREFIX = "chunks."
+DEDUP_SUFFIX = ".dedup.enc"
+MIN_CHUNK = 256 * 1024
+AVG_CHUNK = 1024 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
+GC_GRACE_HOURS = 24
+
+
+class LineChunker:
+    """
+    تقسیم با مرز وابسته به محتوا، مخصوص خروجی متنی dump ها (هر سطر یک دستور یا یک ردیف COPY):
+    مرزها فقط در انتهای سطرها قرار می‌گیرند و اینکه انتهای یک سطر مرز باشد تنها به محتوای همان سطر
+    (crc32 آن) بستگی دارد. احتمال مرز بودن هر سطر متناسب با طول آن است تا میانگین اندازه قطعه
+    تقریباً avg_size شود. برای داده باینری بدون سطر (فرمت custom/tar) قطعات در max_size بریده می‌شوند.
+    """
+
+    def __init__(self, min_size: int = MIN_CHUNK, avg_size: int = AVG_CHUNK, max_size: int = MAX_CHUNK):
+        if not 0 < min_size < avg_size < max_size:
+            raise ValueError("اندازه‌های قطعه باید به صورت min < avg < max باشند.")
+        self.min_size = min_size
+        self.max_size = max_size
+        self._target = avg_size - min_size
+        self._buffer = bytearray()
+        self._line_start = 0
+
+    def _cut(self, end: int) -> bytes:
+        chunk = bytes(self._buffer[:end])
+        del self._buffer[:end]
+        self._line_start = 0
+        return chunk
+
+    def update(self, data: bytes) -> list:
+        self._buffer += data
+        chunks = []
+        while True:
+            end = self._buffer.find(b"\n", self._line_start) + 1
+            if not end or end > self.max_size:
+                if len(self._buffer) < self.max_size:
+                    break
+                chunks.append(self._cut(self.max_size))
+                continue
+            line_length = end - self._line_start
+            if end >= self.min_size and zlib.crc32(self._buffer[self._line_start:end]) * self._target < line_length << 32:
+                chunks.append(self._cut(end))
+            else:
+                self._line_start = end
+        return chunks
+
+    def finalize(self) -> list:
+        return [self._cut(len(self._buffer))] if self._buffer else []
+
+
+class ChunkIndex:
+    """
+    ایندکس محلی (SQLite) قطعاتی که هر باکت در اختیار دارد. last_seen آخرین زمانی است که یک بکاپ به قطعه
+    ارجاع داده و در جمع‌آوری زباله از حذف قطعات بکاپ‌های در حال اجرا جلوگیری می‌کند.
+    """
+
+    def __init__(self, path: Path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " bucket TEXT NOT NULL, id TEXT NOT NULL, size INTEGER NOT NULL, stored_size INTEGER NOT NULL,"
+            " last_seen REAL NOT NULL, PRIMARY KEY (bucket, id))"
+        )
+        self._db.commit()
+
+    def has(self, bucket_name: str, chunk_id: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM chunks WHERE bucket = ? AND id = ?", (bucket_name, chunk_id)).fetchone()
+        return row is not None
+
+    def add(self, bucket_name: str, chunk_id: str, size: int, stored_size: int):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)",
+                             (bucket_name, chunk_id, size, stored_size, time.time()))
+
+    def touch(self, bucket_name: str, chunk_ids):
+        with self._lock, self._db:
+            self._db.executemany("UPDATE chunks SET last_seen = ? WHERE bucket = ? AND id = ?",
+                                 [(time.time(), bucket_name, chunk_id) for chunk_id in chunk_ids])
+
+    def remove(self, bucket_name: str, chunk_ids):
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM chunks WHERE bucket = ? AND id = ?",
+                                 [(bucket_name, chunk_id) for chunk_id in chunk_ids])
+
+    def ids(self, bucket_name: str) -> set:
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT id FROM chunks WHERE bucket = ?", (bucket_name,))}
+
+    def seen_since(self, bucket_name: str, since: float) -> set:
+        with self._lock:
+            rows = self._db.execute("SELECT id FROM chunks WHERE bucket = ? AND last_seen >= ?", (bucket_name, since))
+            return {row[0] for row in rows}
+
+    def close(self):
+        self._db.close()
+
+
+def _chunk_codec(settings: dict) -> dict:
+    # قطعات کوچک‌اند و موازی فشرده می‌شوند؛ pgzip برای یک قطعه همان gzip است
+    settings = dict(settings or {})
+    if settings.get("codec") == "pgzip":
+        settings["codec"] = "gzip"
+    settings["workers"] = 1
+    if settings.get("level") == ADAPTIVE:
+        # سطح تطبیقی بلوکی است؛ برای قطعات کوچک dedup سطح پیش‌فرض همان کدک استفاده می‌شود
+        settings["level"] = DEFAULT_LEVELS[settings.get("codec", "gzip")]
+    return settings
+
+
+def _compress(settings: dict, data: bytes) -> bytes:
+    compressor = create_compressor(settings)
+    return compressor.update(data) + compressor.finalize()
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    decompressor = create_decompressor(f"chunk{CODEC_SUFFIXES[codec]}")
+    return decompressor.update(data) + decompressor.finalize()
+
+
+class DedupStore:
+    """آپلود، بازیابی و جمع‌آوری زباله بکاپ‌های dedup برای یک agent."""
+
+    def __init__(self, server_url: str, headers: dict, key: bytes, index: ChunkIndex, workers: int = WORKERS,
+                 max_retries: int = MAX_RETRIES, proxies: dict = None, chunking: dict = None,
+                 session: requests.Session = None):
+        self.server_url = server_url
+        self.headers = headers
+        self.key = key
+        self.index = index
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.proxies = proxies
+        chunking = chunking or {}
+        self.chunking = {
+            "min_size": int(chunking.get("min_kb", MIN_CHUNK // 1024)) * 1024,
+            "avg_size": int(chunking.get("avg_kb", AVG_CHUNK // 1024)) * 1024,
+            "max_size": int(chunking.get("max_kb", MAX_CHUNK // 1024)) * 1024,
+        }
+        self._id_key = derive_chunk_id_key(key)
+        self._session = session or create_session(self.workers)
+
+    def chunk_id(self, data: bytes) -> str:
+        return hmac.new(self._id_key, data, hashlib.sha256).hexdigest()
+
+    def _request(self, method: str, path: str, **kwargs):
+        return send_with_retries(self._session, method, f"{self.server_url}/api/v1/storage/{path}", self.headers,
+                                 self.proxies, self.max_retries, **kwargs)
+
+    def _put(self, bucket_name: str, object_name: str, data: bytes):
+        headers = {**self.headers, "Content-Type": "application/octet-stream"}
+        send_with_retries(self._session, "PUT", f"{self.server_url}/api/v1/storage/upload/{bucket_name}/{object_name}",
+                          headers, self.proxies, self.max_retries, data=data)
+
+    def _get(self, bucket_name: str, object_name: str) -> bytes:
+        return self._request("GET", f"download/{bucket_name}/{object_name}").content
+
+    def _store_chunk(self, bucket_name: str, chunk_id: str, data: bytes, settings: dict) -> int:
+        blob = encrypt_bytes(self.key, _compress(settings, data))
+        self._put(bucket_name, f"{CHUNK_PREFIX}{chunk_id}", blob)
+        self.index.add(bucket_name, chunk_id, len(data), len(blob))
+        return len(blob)
+
+    def backup(self, chunks, bucket_name: str, object_name: str, backup_name: str, compression: dict = None) -> dict:
+        """
+        جریان dump را قطعه‌بندی کرده و فقط قطعات جدید را (موازی) فشرده، رمزگذاری و آپلود می‌کند.
+        مانیفست تنها پس از آپلود موفق همه قطعات ذخیره می‌شود، بنابراین بکاپ ناقص هرگز قابل مشاهده نیست.
+        """
+        settings = _chunk_codec(compression)
+        chunker = LineChunker(**self.chunking)
+        manifest_chunks, seen, pending = [], set(), deque()
+        stats = {"chunks": 0, "new_chunks": 0, "bytes": 0, "new_bytes": 0, "uploaded_bytes": 0}
+
+        def handle(data: bytes):
+            chunk_id = self.chunk_id(data)
+            manifest_chunks.append([chunk_id, len(data)])
+            stats["chunks"] += 1
+            stats["bytes"] += len(data)
+            if chunk_id in seen or self.index.has(bucket_name, chunk_id):
+                seen.add(chunk_id)
+                return
+            seen.add(chunk_id)
+            stats["new_chunks"] += 1
+            stats["new_bytes"] += len(data)
+            pending.append(pool.submit(propagate(self._store_chunk), bucket_name, chunk_id, data, settings))
+            # حداکثر (workers × 2) قطعه در حال پردازش در حافظه نگه داشته می‌شود
+            while len(pending) > self.workers * 2:
+                stats["uploaded_bytes"] += pending.popleft().result()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                for block in chunks:
+                    for data in chunker.update(block):
+                        handle(data)
+                for data in chunker.finalize():
+                    handle(data)
+                while pending:
+                    stats["uploaded_bytes"] += pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        self.index.touch(bucket_name, seen)
+        manifest = {
+            "version": 1,
+            "object": object_name,
+            "backup_name": backup_name,
+            "codec": settings.get("codec", "gzip"),
+            "created_at": datetime.now().isoformat(),
+            "size": stats["bytes"],
+            "chunks": manifest_chunks,
+        }
+        self._put(bucket_name, object_name, encrypt_bytes(self.key, zlib.compress(json.dumps(manifest).encode())))
+        return stats
+
+    def load_manifest(self, bucket_name: str, object_name: str) -> dict:
+        return json.loads(zlib.decompress(decrypt_bytes(self.key, self._get(bucket_name, object_name))))
+
+    def _fetch_chunk(self, bucket_name: str, chunk_id: str, codec: str) -> bytes:
+        data = _decompress(codec, decrypt_bytes(self.key, self._get(bucket_name, f"{CHUNK_PREFIX}{chunk_id}")))
+        if not hmac.compare_digest(self.chunk_id(data), chunk_id):
+            raise ValueError(f"محتوای قطعه '{chunk_id}' با شناسه آن مطابقت ندارد.")
+        return data
+
+    def iter_restore(self, bucket_name: str, manifest: dict):
+        """قطعات بکاپ را به ترتیب مانیفست (با دانلود موازی و پنجره محدود) برمی‌گرداند."""
+        chunk_ids = [chunk_id for chunk_id, _ in manifest["chunks"]]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            position = 0
+            try:
+                while position < len(chunk_ids) or pending:
+                    while position < len(chunk_ids) and len(pending) < self.workers * 2:
+                        pending.append(pool.submit(propagate(self._fetch_chunk), bucket_name, chunk_ids[position], manifest["codec"]))
+                        position += 1
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def gc(self, bucket_name: str, objects: list, grace_hours: float = GC_GRACE_HOURS, dry_run: bool = False) -> dict:
+        """
+        قطعاتی را که هیچ مانیفستی به آن‌ها ارجاع نمی‌دهد حذف می‌کند. objects لیست کامل اشیاء باکت است.
+        قطعاتی که در grace_hours اخیر توسط یک بکاپ استفاده شده‌اند حذف نمی‌شوند، چون ممکن است متعلق به
+        بکاپی باشند که مانیفستش هنوز آپلود نشده است.
+        """
+        referenced = set()
+        for object_name in objects:
+            if object_name.endswith(DEDUP_SUFFIX):
+                referenced.update(chunk_id for chunk_id, _ in self.load_manifest(bucket_name, object_name)["chunks"])
+        stored = {name[len(CHUNK_PREFIX):] for name in objects if name.startswith(CHUNK_PREFIX)}
+        protected = self.index.seen_since(bucket_name, time.time() - grace_hours * 3600)
+        orphans = sorted(stored - referenced - protected)
+        # قطعاتی که ایندکس دارد ولی در باکت نیستند (مثلاً حذف شده از جای دیگر) از ایندکس پاک می‌شوند تا دوباره آپلود شوند
+        self.index.remove(bucket_name, self.index.ids(bucket_name) - stored)
+        if not dry_run:
+            for chunk_id in orphans:
+                self._request("DELETE", f"delete/{bucket_name}/{CHUNK_PREFIX}{chunk_id}")
+                self.index.remove(bucket_name, [chunk_id])
+        return {"manifests": sum(1 for o in objects if o.endswith(DEDUP_SUFFIX)), "chunks": len(stored),
+                "referenced": len(referenced & stored), "deleted": len(orphans), "missing": len(referenced - stored)}
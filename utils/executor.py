@@ -0,0 +1,222 @@
+import json
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from utils.resources import ResourceRequest
+
+# اجرای جاب‌ها (بکاپ/بازیابی) خارج از event loop شنونده WebSocket.
+# جاب‌ها در یک صف محدود قرار گرفته و توسط تعداد ثابتی نخ کارگر اجرا می‌شوند؛ بنابراین
+# شنونده همیشه آزاد است تا ping ها و فرمان‌های جدید را پاسخ دهد.
+# ترتیب برداشتن از صف: اولویت بالاتر، سپس ددلاین زودتر، سپس زمان ورود به صف.
+WORKERS = 2
+QUEUE_SIZE = 16
+# جاب‌های کوچک‌تر می‌توانند از جاب منتظری که منابعش آزاد نیست جلو بزنند، اما اگر انتظار آن جاب
+# از این مقدار بیشتر شود، جلو زدن متوقف می‌شود تا منابع برای آن آزاد شود (جلوگیری از گرسنگی جاب‌های بزرگ).
+STARVATION_SECONDS = 600
+
+_context = threading.local()
+
+
+class JobRejected(RuntimeError):
+    """جاب پذیرفته نشد (صف پر است یا همین جاب در حال اجرا/انتظار است)."""
+
+
+class JobTask:
+    def __init__(self, job_name: str, action: str, func, args: tuple, kwargs: dict, priority: int = 0,
+                 deadline: float = None, resources: ResourceRequest = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.job_name = job_name
+        self.action = action
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.deadline = deadline
+        self.resources = resources or ResourceRequest()
+        self.status = "queued"
+        self.stage = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def sort_key(self) -> tuple:
+        return -self.priority, self.deadline if self.deadline is not None else float("inf"), self.submitted_at
+
+    def timings(self) -> dict:
+        now = time.time()
+        timings = {"wait_seconds": round((self.started_at or now) - self.submitted_at, 3)}
+        if self.started_at:
+            timings["run_seconds"] = round((self.finished_at or now) - self.started_at, 3)
+        if self.deadline is not None:
+            timings["deadline_missed"] = (self.finished_at or now) > self.deadline
+        return timings
+
+    def snapshot(self) -> dict:
+        return {
+            "task_id": self.id,
+            "job": self.job_name,
+            "action": self.action,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "priority": self.priority,
+            "resources": self.resources.as_dict(),
+            **self.timings(),
+            "submitted_at": datetime.fromtimestamp(self.submitted_at).isoformat(),
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
+            "finished_at": datetime.fromtimestamp(self.finished_at).isoformat() if self.finished_at else None,
+        }
+
+
+def current_task():
+    """جاب در حال اجرا در نخ جاری (یا None خارج از نخ‌های executor)."""
+    return getattr(_context, "task", None)
+
+
+def report_progress(stage: str, **details):
+    """
+    مرحله جاری جاب را به executor گزارش می‌دهد. خارج از نخ‌های executor (مثلاً اجرای دستی از CLI)
+    هیچ کاری انجام نمی‌دهد، بنابراین توابع جاب می‌توانند همیشه آن را صدا بزنند.
+    """
+    executor = getattr(_context, "executor", None)
+    task = getattr(_context, "task", None)
+    if executor is None or task is None:
+        return
+    task.stage = stage
+    executor._emit(task, "progress", **details)
+
+
+class JobExecutor:
+    """
+    اجرای غیرمسدودکننده جاب‌ها روی استخر نخ:
+    - صف محدود: اگر queue_size جاب در انتظار باشند، جاب جدید با JobRejected رد می‌شود.
+    - انحصار هر جاب: تا زمانی که یک جاب در صف یا در حال اجراست، نمونه دیگری از آن پذیرفته نمی‌شود.
+    - محدودیت سراسری: حداکثر workers جاب هم‌زمان اجرا می‌شوند.
+    - کنترل پذیرش: اگر budget (ResourceBudget) داده شود، جاب فقط وقتی اجرا می‌شود که منابع آن آزاد باشد؛
+      جاب‌هایی که منابعشان آزاد نیست جای جاب‌های بعدی صف را نمی‌گیرند.
+    on_event با هر تغییر وضعیت (queued/started/progress/succeeded/failed) و از نخ کارگر صدا زده می‌شود.
+    زمان انتظار در صف و زمان اجرای هر جاب در history_path (هر خط یک JSON) ثبت می‌شود.
+    """
+
+    def __init__(self, workers: int = WORKERS, queue_size: int = QUEUE_SIZE, on_event=None, budget=None,
+                 history_path: Path = None, starvation_seconds: float = STARVATION_SECONDS):
+        self.workers = max(1, workers)
+        self.starvation_seconds = starvation_seconds
+        self.queue_size = max(1, queue_size)
+        self.on_event = on_event
+        self.budget = budget
+        self.history_path = Path(history_path) if history_path else None
+        self._condition = threading.Condition()
+        self._pending = []
+        self._active = {}
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self, wait: bool = True):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def submit(self, job_name: str, action: str, func, *args, priority: int = 0, deadline: float = None,
+               resources: ResourceRequest = None, **kwargs) -> JobTask:
+        """یک جاب را در صف قرار می‌دهد؛ در صورت عدم پذیرش JobRejected رخ می‌دهد."""
+        task = JobTask(job_name, action, func, args, kwargs, priority, deadline, resources)
+        with self._condition:
+            running = self._active.get(job_name)
+            if running is not None:
+                raise JobRejected(f"جاب '{job_name}' هم‌اکنون در وضعیت '{running.status}' است ({running.action}).")
+            if len(self._pending) >= self.queue_size:
+                raise JobRejected(f"صف اجرای جاب‌ها پر است ({self.queue_size} جاب در انتظار).")
+            self._pending.append(task)
+            self._pending.sort(key=JobTask.sort_key)
+            self._active[job_name] = task
+            self._condition.notify_all()
+        self._emit(task, "queued")
+        return task
+
+    def status(self) -> list:
+        """وضعیت جاب‌های در صف و در حال اجرا."""
+        with self._condition:
+            return [task.snapshot() for task in self._active.values()]
+
+    def _next_admissible(self):
+        """اولین جاب صف (به ترتیب اولویت) که منابع آن قابل رزرو است را از صف خارج می‌کند."""
+        now = time.time()
+        for index, task in enumerate(self._pending):
+            if self.budget is None or self.budget.try_acquire(task.resources):
+                return self._pending.pop(index)
+            if now - task.submitted_at > self.starvation_seconds and not self.budget.host_busy(task.resources):
+                return None
+        return None
+
+    def _take(self):
+        with self._condition:
+            while not self._stopping:
+                task = self._next_admissible()
+                if task is not None:
+                    return task
+                # فضای آزاد دیسک ممکن است بدون آزاد شدن جاب دیگری تغییر کند، پس بررسی دوره‌ای هم انجام می‌شود
+                self._condition.wait(timeout=5 if self._pending else None)
+            return None
+
+    def _record(self, task: JobTask):
+        if self.history_path is None:
+            return
+        record = {"task_id": task.id, "job": task.job_name, "action": task.action, "status": task.status,
+                  "finished_at": datetime.fromtimestamp(task.finished_at).isoformat(),
+                  "priority": task.priority, "resources": task.resources.as_dict(), **task.timings()}
+        try:
+            with open(self.history_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ ثبت آمار اجرای جاب '{task.job_name}' ناموفق بود: {e}")
+
+    def _emit(self, task: JobTask, event: str, **details):
+        if self.on_event is None:
+            return
+        try:
+            self.on_event({"type": "job_status", "event": event, **task.snapshot(), **details})
+        except Exception as e:
+            print(f"⚠️ ارسال وضعیت جاب '{task.job_name}' ناموفق بود: {e}")
+
+    def _worker(self):
+        while True:
+            task = self._take()
+            if task is None:
+                return
+            task.status, task.started_at = "running", time.time()
+            self._emit(task, "started")
+            _context.executor, _context.task = self, task
+            try:
+                # توابع جاب خطاها را خودشان چاپ کرده و در صورت شکست False برمی‌گردانند
+                result = task.func(*task.args, **task.kwargs)
+                task.status = "failed" if result is False else "succeeded"
+            except Exception as e:
+                task.status, task.error = "failed", str(e)
+                print(f"🔥 جاب '{task.job_name}' ({task.action}) با خطا متوقف شد: {e}")
+            finally:
+                _context.executor, _context.task = None, None
+                task.finished_at = time.time()
+                with self._condition:
+                    if self.budget is not None:
+                        self.budget.release(task.resources)
+                    self._active.pop(task.job_name, None)
+                    self._condition.notify_all()
+                self._record(task)
+                self._emit(task, task.status)
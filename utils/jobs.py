@@ -0,0 +1,154 @@
+import fnmatch
+import json
+import time
+from pathlib import Path
+
+# تعریف جاب‌ها از پوشه کانفیگ (بخش [Jobs] فایل client_config.ini) برای agent هایی که صدها دیتابیس را پوشش می‌دهند.
+# هر فایل *.json پوشه یک نگاشت «نام جاب → تعریف جاب» با همان ساختار JOBS است؛ جاب‌های فایل‌ها به JOBS داخلی
+# افزوده می‌شوند (و جاب هم‌نام آن را جایگزین می‌کنند). جابی که کلید discover دارد یک قالب است و برای هر دیتابیس
+# منطبق روی همان سرور یک جاب ساخته می‌شود:
+#   "tenants": {"type": "postgresql", "bucket": "tenant-{database}", "schedule": "0 2 * * *",
+#               "discover": {"match": "tenant_*", "exclude": ["tenant_test"], "name": "tenant-{database}"},
+#               "config": {"host": "db1", "port": 5432, "user": "backup", "password": "..."}}
+# لیست دیتابیس‌های هر سرور با یک کوئری روی کاتالوگ سرور گرفته می‌شود (یک کوئری برای همه قالب‌های همان سرور) و
+# الگوها با fnmatch در خود agent تطبیق داده می‌شوند.
+JOB_FILE_PATTERN = "*.json"
+RELOAD_SECONDS = 30
+DISCOVER_SECONDS = 300
+# دیتابیس‌های staging و نسخه قبلی بازیابی swap نباید به جاب جداگانه تبدیل شوند
+DEFAULT_EXCLUDE = ("*_staging", "*_previous")
+_REQUIRED_KEYS = ("type", "bucket", "config")
+
+
+def database_key(job_config: dict) -> str:
+    """کلید نام دیتابیس در کانفیگ اتصال جاب (PostgreSQL: dbname، MySQL: database)."""
+    return "dbname" if job_config["type"] == "postgresql" else "database"
+
+
+def server_key(job_config: dict) -> tuple:
+    """قالب‌های یک سرور (با یک کاربر) لیست دیتابیس‌های مشترکی دارند و فقط یک بار کوئری می‌شوند."""
+    config = job_config["config"]
+    return job_config["type"], config.get("host"), str(config.get("port", "")), config.get("user")
+
+
+def directory_signature(directory: Path) -> tuple:
+    """نام، زمان تغییر و حجم فایل‌های تعریف جاب؛ با هر تغییر پوشه این امضا عوض می‌شود."""
+    signature = []
+    for path in sorted(Path(directory).glob(JOB_FILE_PATTERN)):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        signature.append((path.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def read_job_files(directory: Path) -> dict:
+    """تعریف جاب‌ها (و قالب‌ها) از فایل‌های پوشه؛ نام تکراری در دو فایل یا تعریف ناقص ValueError می‌دهد."""
+    jobs, origins = {}, {}
+    for path in sorted(Path(directory).glob(JOB_FILE_PATTERN)):
+        try:
+            with open(path, encoding="utf-8") as f:
+                definitions = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"فایل جاب '{path.name}' JSON معتبر نیست: {e}")
+        if not isinstance(definitions, dict):
+            raise ValueError(f"فایل جاب '{path.name}' باید نگاشت «نام جاب → تعریف جاب» باشد.")
+        for name, job in definitions.items():
+            missing = [key for key in _REQUIRED_KEYS if key not in job]
+            if missing:
+                raise ValueError(f"جاب '{name}' در '{path.name}' کلید {', '.join(missing)} را ندارد.")
+            if job.get("discover") is not None and not job["discover"].get("match"):
+                raise ValueError(f"قالب '{name}' در '{path.name}' الگوی discover.match ندارد.")
+            if name in origins:
+                raise ValueError(f"جاب '{name}' هم در '{origins[name]}' و هم در '{path.name}' تعریف شده است.")
+            jobs[name], origins[name] = job, path.name
+    return jobs
+
+
+def expand_template(name: str, template: dict, databases: list) -> dict:
+    """جاب‌های یک قالب برای دیتابیس‌های منطبق؛ {database} در نام جاب و نام باکت با نام دیتابیس جایگزین می‌شود."""
+    discover = template["discover"]
+    patterns = discover["match"] if isinstance(discover["match"], list) else [discover["match"]]
+    exclude = discover.get("exclude", DEFAULT_EXCLUDE)
+    naming = discover.get("name", name + "-{database}")
+    db_key = database_key(template)
+    jobs = {}
+    for database in databases:
+        if not any(fnmatch.fnmatchcase(database, pattern) for pattern in patterns):
+            continue
+        if any(fnmatch.fnmatchcase(database, pattern) for pattern in exclude):
+            continue
+        job = {key: value for key, value in template.items() if key != "discover"}
+        job["config"] = {**template["config"], db_key: database}
+        job["bucket"] = template["bucket"].format(database=database)
+        job["template"] = name
+        jobs[naming.format(database=database)] = job
+    return jobs
+
+
+class JobSource:
+    """
+    مجموعه جاب‌های agent: JOBS داخلی به همراه جاب‌ها و قالب‌های پوشه کانفیگ. reload() فقط وقتی فایل‌ها تغییر
+    کرده‌اند یا زمان کشف دوباره دیتابیس‌ها رسیده است کاری انجام می‌دهد. list_databases(job_config) لیست
+    دیتابیس‌های سرور یک قالب را برمی‌گرداند (درایور همان نوع دیتابیس).
+    """
+
+    def __init__(self, builtin: dict, directory: Path, list_databases, discover_seconds: float = DISCOVER_SECONDS):
+        self.builtin = builtin
+        self.directory = Path(directory)
+        self.list_databases = list_databases
+        self.discover_seconds = discover_seconds
+        self.jobs = dict(builtin)
+        self._signature = None
+        self._definitions = {}
+        self._databases = {}
+        self._discovered_at = None
+
+    def _discover(self, templates: dict):
+        """لیست دیتابیس‌های هر سرور؛ اگر سرور در دسترس نباشد، آخرین لیست همان سرور استفاده می‌شود."""
+        servers = {}
+        for template in templates.values():
+            servers.setdefault(server_key(template), template)
+        databases = {}
+        for key, template in servers.items():
+            try:
+                databases[key] = self.list_databases(template)
+            except Exception as e:
+                print(f"⚠️ کشف دیتابیس‌های سرور '{key[1]}:{key[2]}' ناموفق بود (لیست قبلی حفظ می‌شود): {e}")
+                databases[key] = self._databases.get(key, [])
+        self._databases = databases
+        self._discovered_at = time.monotonic()
+
+    def reload(self, force: bool = False):
+        """
+        جاب‌ها را در صورت تغییر دوباره می‌سازد و (اضافه شده، تغییر یافته، حذف شده) را برمی‌گرداند، یا None اگر
+        چیزی عوض نشده است. فایل نامعتبر ValueError می‌دهد و جاب‌های فعلی حفظ می‌شوند.
+        """
+        signature = directory_signature(self.directory)
+        files_changed = signature != self._signature
+        if files_changed:
+            self._definitions = read_job_files(self.directory)
+            self._signature = signature
+        templates = {name: job for name, job in self._definitions.items() if job.get("discover") is not None}
+        due = self._discovered_at is None or time.monotonic() - self._discovered_at >= self.discover_seconds
+        if templates and (force or due or files_changed):
+            self._discover(templates)
+        elif not files_changed and not force:
+            return None
+
+        jobs = dict(self.builtin)
+        for name, job in self._definitions.items():
+            if job.get("discover") is None:
+                jobs[name] = job
+        for name, template in templates.items():
+            for job_name, job in expand_template(name, template, self._databases.get(server_key(template), [])).items():
+                if job_name in jobs:
+                    print(f"⚠️ جاب '{job_name}' از قالب '{name}' با جاب هم‌نام دیگری تداخل دارد و نادیده گرفته شد.")
+                    continue
+                jobs[job_name] = job
+        added = [name for name in jobs if name not in self.jobs]
+        removed = [name for name in self.jobs if name not in jobs]
+        changed = [name for name in jobs if name in self.jobs and jobs[name] != self.jobs[name]]
+        self.jobs = jobs
+        return (added, changed, removed) if added or changed or removed else None
@@ -0,0 +1,352 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# اندازه‌گیری مراحل هر اجرای جاب (dump، فشرده‌سازی، رمزگذاری، آپلود و ...):
+#   seconds       زمانی که مرحله واقعاً مشغول کار بوده است (در حالت جریانی، بدون زمان انتظار برای مرحله قبل)
+#   wait_seconds  زمانی که مرحله منتظر داده مرحله قبل مانده است
+#   bytes_in/out  حجم ورودی و خروجی مرحله
+# در حالت جریانی مراحل هم‌زمان اجرا می‌شوند، پس مرحله‌ای که seconds آن به مدت کل جاب نزدیک است گلوگاه است.
+METRIC_PREFIX = "cloud_haven"
+
+_context = threading.local()
+
+
+class StageStats:
+    def __init__(self):
+        self.seconds = 0.0
+        self.wait_seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.calls = 0
+        self.started_at = None
+        self.active = 0
+
+    def as_dict(self) -> dict:
+        stats = {"seconds": round(self.seconds, 3), "bytes_in": self.bytes_in, "bytes_out": self.bytes_out}
+        if self.wait_seconds:
+            stats["wait_seconds"] = round(self.wait_seconds, 3)
+        moved = max(self.bytes_in, self.bytes_out)
+        if moved and self.seconds:
+            stats["mb_per_second"] = round(moved / (1024 * 1024) / self.seconds, 2)
+        if self.bytes_in and self.bytes_out:
+            stats["ratio"] = round(self.bytes_in / self.bytes_out, 3)
+        return stats
+
+
+class _MeteredTransform:
+    """یک تبدیل پایپ‌لاین (update/finalize) که زمان و حجم ورودی/خروجی آن ثبت می‌شود."""
+
+    def __init__(self, stats: StageStats, lock: threading.Lock, transform):
+        self._stats = stats
+        self._lock = lock
+        self._transform = transform
+
+    def _measure(self, func, *args) -> bytes:
+        started = time.perf_counter()
+        output = func(*args)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats.seconds += elapsed
+            self._stats.bytes_in += len(args[0]) if args else 0
+            self._stats.bytes_out += len(output or b"")
+            self._stats.calls += 1
+        return output
+
+    def update(self, data: bytes) -> bytes:
+        return self._measure(self._transform.update, data)
+
+    def finalize(self) -> bytes:
+        return self._measure(self._transform.finalize)
+
+    def close(self):
+        close = getattr(self._transform, "close", None)
+        if close:
+            close()
+
+
+class JobMetrics:
+    """آمار یک اجرای جاب؛ با bind() به نخ جاری متصل می‌شود تا تلاش‌های مجدد شبکه به همین جاب نسبت داده شوند."""
+
+    def __init__(self, job_name: str, action: str):
+        self.job_name = job_name
+        self.action = action
+        self.stages = {}
+        self.retries = 0
+        self.queue_wait_seconds = None
+        self.status = None
+        # طرح انتخاب شده توسط برنامه‌ریز بکاپ (utils/planner.py) در صورت وجود
+        self.plan = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def stage(self, name: str) -> StageStats:
+        with self._lock:
+            return self.stages.setdefault(name, StageStats())
+
+    def add(self, name: str, seconds: float = 0, bytes_in: int = 0, bytes_out: int = 0):
+        stats = self.stage(name)
+        with self._lock:
+            stats.seconds += seconds
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+            stats.calls += 1
+
+    @contextmanager
+    def timed(self, name: str):
+        """زمان اجرای یک مرحله ترتیبی؛ حجم‌ها را می‌توان داخل بلوک با add(name, bytes_in=...) ثبت کرد."""
+        started = time.perf_counter()
+        try:
+            yield self.stage(name)
+        finally:
+            self.add(name, seconds=time.perf_counter() - started)
+
+    @contextmanager
+    def concurrent(self, name: str, size: int):
+        """
+        یک عملیات از چند عملیات هم‌زمان یک مرحله (مثلاً آپلود موازی بخش‌ها). زمان مرحله زمانی است که دست‌کم یک
+        عملیات در جریان بوده و حجم عملیات پس از پایان موفق آن ثبت می‌شود.
+        """
+        stats = self.stage(name)
+        with self._lock:
+            if not stats.active:
+                stats.started_at = time.perf_counter()
+            stats.active += 1
+        succeeded = False
+        try:
+            yield stats
+            succeeded = True
+        finally:
+            with self._lock:
+                stats.active -= 1
+                stats.bytes_out += size if succeeded else 0
+                stats.calls += 1
+                if not stats.active:
+                    stats.seconds += time.perf_counter() - stats.started_at
+                    stats.started_at = None
+
+    def source(self, name: str, chunks):
+        """منبع جریان (مثلاً stdout ابزار dump): زمان انتظار برای هر قطعه، زمان کار همان مرحله است."""
+        return self._metered_source(self.stage(name), chunks)
+
+    def _metered_source(self, stats: StageStats, chunks):
+        iterator = iter(chunks)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    with self._lock:
+                        stats.seconds += time.perf_counter() - started
+                with self._lock:
+                    stats.bytes_out += len(chunk)
+                yield chunk
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+
+    def sink(self, name: str, chunks):
+        """ورودی مقصد جریان (مثلاً آپلود): زمان انتظار برای قطعه بعدی جدا ثبت و از زمان کار مرحله کم می‌شود."""
+        stats = self.stage(name)
+        stats.started_at = time.perf_counter()
+        for chunk in self.source(f"{name}:wait", chunks):
+            with self._lock:
+                stats.bytes_in += len(chunk)
+            yield chunk
+
+    def capacity(self, name: str):
+        """
+        ظرفیت تخمینی یک مرحله در حال اجرا (بایت در ثانیه مشغول بودن) یا None اگر هنوز داده‌ای عبور نکرده است.
+        برای sink ها زمان انتظار برای مرحله قبل از زمان سپری شده کم می‌شود و برای مراحل concurrent فقط زمانی
+        که عملیاتی در جریان بوده حساب می‌شود.
+        """
+        with self._lock:
+            stats, wait = self.stages.get(name), self.stages.get(f"{name}:wait")
+            if stats is None:
+                return None
+            if stats.active:
+                moved = stats.bytes_out
+                busy = stats.seconds + time.perf_counter() - stats.started_at
+            elif stats.started_at is not None:
+                moved = stats.bytes_in
+                busy = time.perf_counter() - stats.started_at - (wait.seconds if wait else 0.0)
+            else:
+                moved, busy = max(stats.bytes_in, stats.bytes_out), stats.seconds
+        return moved / busy if moved and busy > 0 else None
+
+    def instrument(self, name: str, transform):
+        return _MeteredTransform(self.stage(name), self._lock, transform)
+
+    @contextmanager
+    def bind(self):
+        previous = getattr(_context, "metrics", None)
+        _context.metrics = self
+        try:
+            yield self
+        finally:
+            _context.metrics = previous
+
+    def _fold_waits(self):
+        """زمان‌های ':wait' ثبت شده توسط sink را به wait_seconds مرحله اصلی منتقل می‌کند."""
+        with self._lock:
+            for name in [name for name in self.stages if name.endswith(":wait")]:
+                wait = self.stages.pop(name)
+                stats = self.stages.setdefault(name.rsplit(":", 1)[0], StageStats())
+                stats.wait_seconds += wait.seconds
+                stats.seconds = max(0.0, stats.seconds - wait.seconds)
+
+    def finish(self, status: str) -> dict:
+        self.finished_at = time.time()
+        self.status = status
+        self._fold_waits()
+        return self.summary()
+
+    def summary(self) -> dict:
+        with self._lock:
+            stages = {name: stats.as_dict() for name, stats in self.stages.items()}
+        duration = (self.finished_at or time.time()) - self.started_at
+        summary = {
+            "job": self.job_name,
+            "action": self.action,
+            "status": self.status,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+            "duration_seconds": round(duration, 3),
+            "retries": self.retries,
+            "stages": stages,
+        }
+        if self.queue_wait_seconds is not None:
+            summary["queue_wait_seconds"] = round(self.queue_wait_seconds, 3)
+        compress = self.stages.get("compress")
+        if compress and compress.bytes_out:
+            summary["compression_ratio"] = round(compress.bytes_in / compress.bytes_out, 3)
+        if self.plan is not None:
+            summary["plan"] = self.plan
+        return summary
+
+
+def current():
+    """JobMetrics متصل به نخ جاری (یا None خارج از یک جاب)."""
+    return getattr(_context, "metrics", None)
+
+
+def propagate(func):
+    """func را طوری می‌پیچد که در نخ دیگر (استخر نخ، مراحل پایپ‌لاین) هم به JobMetrics نخ فعلی متصل باشد."""
+    metrics = current()
+    if metrics is None:
+        return func
+
+    def run(*args, **kwargs):
+        with metrics.bind():
+            return func(*args, **kwargs)
+    return run
+
+
+def record_retry():
+    """یک تلاش مجدد شبکه برای جاب جاری و شمارنده سراسری ثبت می‌کند."""
+    metrics = current()
+    job_name = metrics.job_name if metrics else ""
+    if metrics is not None:
+        with metrics._lock:
+            metrics.retries += 1
+    REGISTRY.inc("retries_total", 1, job=job_name)
+
+
+class MetricsRegistry:
+    """مقادیر تجمعی (counter) و آخرین مقدار (gauge) با برچسب، برای خروجی متنی سازگار با Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def record_job(self, summary: dict):
+        labels = {"job": summary["job"], "action": summary["action"]}
+        self.inc("jobs_total", 1, status=summary["status"], **labels)
+        self.set("job_duration_seconds", summary["duration_seconds"], **labels)
+        if summary["status"] == "succeeded":
+            self.set("job_last_success_timestamp_seconds", round(time.time()), **labels)
+        if "queue_wait_seconds" in summary:
+            self.set("job_queue_wait_seconds", summary["queue_wait_seconds"], **labels)
+        if "compression_ratio" in summary:
+            self.set("compression_ratio", summary["compression_ratio"], **labels)
+        for stage, stats in summary["stages"].items():
+            self.inc("stage_seconds_total", stats["seconds"], stage=stage, **labels)
+            self.inc("stage_bytes_in_total", stats["bytes_in"], stage=stage, **labels)
+            self.inc("stage_bytes_out_total", stats["bytes_out"], stage=stage, **labels)
+            self.set("stage_last_seconds", stats["seconds"], stage=stage, **labels)
+
+    @staticmethod
+    def _labels(labels: tuple) -> str:
+        if not labels:
+            return ""
+        escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for kind, values in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({name for name, _ in values}):
+                    lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+                    for (metric, labels), value in sorted(values.items()):
+                        if metric == name:
+                            lines.append(f"{METRIC_PREFIX}_{name}{self._labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def append_jsonl(path: Path, record: dict):
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️ ثبت آمار در '{path}' ناموفق بود: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port: int, bind: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """endpoint متنی /metrics را در یک نخ پس‌زمینه اجرا می‌کند."""
+    server = ThreadingHTTPServer((bind, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"📈 endpoint آمار روی http://{bind}:{port}/metrics فعال شد.")
+    return server
@@ -0,0 +1,138 @@
+import queue
+import threading
+
+from utils.metrics import propagate
+
+# اندازه هر قطعه و ظرفیت هر صف؛ حافظه مصرفی پایپ‌لاین تقریباً برابر
+# (تعداد مراحل × QUEUE_SIZE × CHUNK_SIZE) است و به حجم دیتابیس بستگی ندارد.
+CHUNK_SIZE = 1024 * 1024
+QUEUE_SIZE = 8
+
+_EOF = object()
+
+
+class PipelineAborted(Exception):
+    """زمانی رخ می‌دهد که مرحله دیگری از پایپ‌لاین شکست خورده و این مرحله باید متوقف شود."""
+
+
+class StreamPipeline:
+    """
+    یک منبع داده را از میان چند مرحله تبدیل (فشرده‌سازی، رمزگذاری و ...) به یک مقصد می‌رساند.
+    هر مرحله در نخ جداگانه اجرا می‌شود و مراحل با صف‌های محدود به هم وصل هستند؛ بنابراین
+    همه مراحل هم‌زمان کار می‌کنند و زمان کل را کندترین مرحله تعیین می‌کند، نه مجموع آن‌ها.
+
+    source: یک iterable از bytes (مثلاً خروجی stdout ابزار dump)
+    transforms: اشیایی با متدهای update(bytes) -> bytes و finalize() -> bytes (و close() اختیاری برای آزاد کردن منابع)
+    """
+
+    def __init__(self, source, transforms=(), queue_size: int = QUEUE_SIZE):
+        self.source = source
+        self.transforms = list(transforms)
+        self.queue_size = queue_size
+        self._abort = threading.Event()
+        self._lock = threading.Lock()
+        self._error = None
+
+    def _fail(self, error: BaseException):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._abort.set()
+
+    def _put(self, q: queue.Queue, item):
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise PipelineAborted()
+
+    def _get(self, q: queue.Queue):
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise PipelineAborted()
+
+    def _run_source(self, out_q: queue.Queue):
+        try:
+            for chunk in self.source:
+                if chunk:
+                    self._put(out_q, chunk)
+            self._put(out_q, _EOF)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            # بستن generator منبع باعث می‌شود پروسس dump در صورت توقف زودهنگام kill شود
+            close = getattr(self.source, "close", None)
+            if close:
+                close()
+
+    def _run_transform(self, transform, in_q: queue.Queue, out_q: queue.Queue):
+        try:
+            while True:
+                item = self._get(in_q)
+                if item is _EOF:
+                    tail = transform.finalize()
+                    if tail:
+                        self._put(out_q, tail)
+                    self._put(out_q, _EOF)
+                    return
+                data = transform.update(item)
+                if data:
+                    self._put(out_q, data)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            # مراحلی مثل فشرده‌سازی موازی استخر کارگر دارند که در صورت توقف پیش از finalize باید آزاد شود
+            close = getattr(transform, "close", None)
+            if close:
+                close()
+
+    def _drain(self, q: queue.Queue):
+        while True:
+            try:
+                item = self._get(q)
+            except PipelineAborted:
+                raise self._error or PipelineAborted()
+            if item is _EOF:
+                self._drained = True
+                return
+            yield item
+
+    def run(self, sink):
+        """
+        پایپ‌لاین را اجرا می‌کند. sink تابعی است که یک iterator از قطعات خروجی را دریافت
+        کرده و آن را به طور کامل مصرف می‌کند (مثلاً آپلود chunked).
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.transforms) + 1)]
+        threads = [threading.Thread(target=propagate(self._run_source), args=(queues[0],), daemon=True)]
+        for index, transform in enumerate(self.transforms):
+            threads.append(threading.Thread(
+                target=propagate(self._run_transform), args=(transform, queues[index], queues[index + 1]), daemon=True
+            ))
+        self._drained = False
+        for thread in threads:
+            thread.start()
+
+        result = None
+        try:
+            result = sink(self._drain(queues[-1]))
+            if not self._drained:
+                raise RuntimeError("مقصد پایپ‌لاین پیش از پایان جریان داده متوقف شد.")
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._abort.set()
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+        return result
@@ -0,0 +1,168 @@
+import json
+import os
+import statistics
+from pathlib import Path
+
+# برنامه‌ریز بکاپ منطقی: پیش از هر اجرا بر اساس حجم و تعداد جداول دیتابیس، فضای آزاد پوشه موقت، تعداد هسته‌ها
+# و سرعت اجراهای موفق قبلی همان جاب (metrics.jsonl) فرمت dump و تعداد کارگرهای آن، تنظیمات فشرده‌سازی و
+# جریانی یا فایلی بودن اجرا را انتخاب می‌کند:
+#   کوچک (کمتر از SMALL_BYTES)  dump متنی، gzip تک‌نخی و حالت فایلی (بدون هزینه نخ‌ها و پایپ‌لاین جریانی)
+#   متوسط                       dump متنی، pgzip تطبیقی با همه هسته‌ها و حالت جریانی
+#   بزرگ (از LARGE_BYTES)        dump موازی (directory در PostgreSQL، parallel در MySQL) در صورت جا داشتن پوشه موقت
+# اگر سابقه جاب نشان دهد آپلود گلوگاه است، اجرا فایلی می‌شود تا dump (و snapshot دیتابیس) زودتر تمام شود و آپلود
+# چندبخشی قابل ادامه باشد؛ اگر فضای موقت برای فایل‌های میانی کافی نباشد، اجرا جریانی می‌شود.
+# کلیدهای streaming، dump و compression که در تعریف جاب آمده‌اند (یا در کلید plan تعیین شده‌اند) ثابت می‌مانند.
+SMALL_BYTES = 256 * 1024 * 1024
+LARGE_BYTES = 20 * 1024 ** 3
+MAX_DUMP_JOBS = 8
+HISTORY_RUNS = 5
+HISTORY_TAIL_BYTES = 512 * 1024
+# نسبت فشرده‌سازی فرضی تا وقتی اجرای قبلی برای جاب ثبت نشده است
+DEFAULT_RATIO = 3.0
+# فضای آزاد پوشه موقت باید این ضریب از فضای لازم برای فایل‌های میانی باشد
+SCRATCH_HEADROOM = 1.5
+# اگر آپلود در اجراهای قبلی این ضریب کندتر از dump بوده باشد، آپلود گلوگاه به حساب می‌آید
+UPLINK_BOUND_FACTOR = 1.5
+PLANNED_KEYS = ("streaming", "dump", "compression")
+PARALLEL_FORMATS = {"postgresql": "directory", "mysql": "parallel"}
+
+
+def recent_runs(path: Path, job_name: str, action: str = "backup", limit: int = HISTORY_RUNS) -> list:
+    """آخرین اجراهای موفق یک جاب از انتهای فایل metrics.jsonl (خطوط ناقص یا نامعتبر نادیده گرفته می‌شوند)."""
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path, 'rb') as f:
+        f.seek(max(0, f.seek(0, os.SEEK_END) - HISTORY_TAIL_BYTES))
+        lines = f.read().splitlines()
+    runs = []
+    for line in reversed(lines):
+        try:
+            summary = json.loads(line)
+        except ValueError:
+            continue
+        if summary.get("job") == job_name and summary.get("action") == action and summary.get("status") == "succeeded":
+            runs.append(summary)
+            if len(runs) >= limit:
+                break
+    return runs
+
+
+def history_rates(runs: list) -> dict:
+    """
+    میانه سرعت‌های اجراهای قبلی: upload_bps (بایت آپلود شده در ثانیه)، uplink_bound (آیا آپلود کندتر از dump
+    بوده است) و ratio (حجم دیتابیس طرح قبلی به حجم آپلود شده). مقدار نامعلوم None است.
+    """
+    upload_rates, bound, ratios = [], [], []
+    for run in runs:
+        stages = run.get("stages", {})
+        upload, dump = stages.get("upload", {}), stages.get("dump", {})
+        if upload.get("bytes_in") and upload.get("seconds"):
+            upload_rates.append(upload["bytes_in"] / upload["seconds"])
+            size = (run.get("plan") or {}).get("size_bytes")
+            if size:
+                ratios.append(size / upload["bytes_in"])
+        if upload.get("seconds") and dump.get("seconds"):
+            bound.append(upload["seconds"] > dump["seconds"] * UPLINK_BOUND_FACTOR)
+    return {
+        "upload_bps": statistics.median(upload_rates) if upload_rates else None,
+        "uplink_bound": sum(bound) * 2 > len(bound) if bound else None,
+        "ratio": statistics.median(ratios) if ratios else None,
+    }
+
+
+def pinned_settings(job_config: dict) -> dict:
+    """تنظیماتی که برنامه‌ریز نباید تغییر دهد: کلیدهای صریح جاب و کلیدهای دیکشنری plan."""
+    plan = job_config.get("plan")
+    pinned = {key: job_config[key] for key in PLANNED_KEYS if key in job_config}
+    if isinstance(plan, dict):
+        unknown = [key for key in plan if key not in PLANNED_KEYS]
+        if unknown:
+            raise ValueError(f"کلید {', '.join(unknown)} در plan پشتیبانی نمی‌شود. کلیدهای مجاز: {', '.join(PLANNED_KEYS)}")
+        pinned.update(plan)
+    return pinned
+
+
+def plan_backup(db_type: str, profile: dict, free_bytes: int, cpu_count: int, rates: dict, pinned: dict = None) -> dict:
+    """
+    طرح اجرای بکاپ. profile شامل size_bytes و tables دیتابیس است و rates خروجی history_rates. خروجی
+    کلیدهای streaming، dump و compression (برای ادغام در تعریف جاب) به همراه برآوردها و دلایل انتخاب است.
+    """
+    pinned = pinned or {}
+    size, tables = int(profile["size_bytes"]), int(profile["tables"])
+    cpu_count = max(1, int(cpu_count))
+    ratio = rates.get("ratio") or DEFAULT_RATIO
+    compressed = size / ratio
+    reasons = []
+
+    if "dump" in pinned:
+        dump = pinned["dump"] or {}
+    elif size >= LARGE_BYTES and tables > 1 and cpu_count > 1 and free_bytes >= size * SCRATCH_HEADROOM:
+        dump = {"format": PARALLEL_FORMATS[db_type], "jobs": max(2, min(cpu_count // 2, tables, MAX_DUMP_JOBS))}
+        reasons.append("dump موازی برای دیتابیس بزرگ")
+    else:
+        dump = {"format": "plain"}
+        if size >= LARGE_BYTES and tables > 1 and cpu_count > 1:
+            reasons.append("dump متنی چون فضای موقت برای dump موازی کافی نیست")
+    parallel = dump.get("format", "plain") != "plain"
+    dump_jobs = int(dump.get("jobs", 1)) if parallel else 0
+
+    if "compression" in pinned:
+        compression = pinned["compression"]
+    elif size < SMALL_BYTES:
+        compression = {"codec": "gzip", "level": 6}
+        reasons.append("gzip تک‌نخی برای دیتابیس کوچک")
+    else:
+        compression = {"codec": "pgzip", "level": "adaptive", "workers": max(1, cpu_count - dump_jobs)}
+
+    # فایل‌های میانی حالت فایلی: dump خام (و tar آن در فرمت‌های موازی) در کنار خروجی فشرده و رمزگذاری شده
+    file_scratch = size * (2 if parallel else 1) + compressed
+    if "streaming" in pinned:
+        streaming = bool(pinned["streaming"])
+    elif free_bytes < file_scratch * SCRATCH_HEADROOM:
+        streaming = True
+        reasons.append("جریانی چون فضای موقت برای فایل‌های میانی کافی نیست")
+    elif size < SMALL_BYTES:
+        streaming = False
+    elif rates.get("uplink_bound"):
+        streaming = False
+        reasons.append("فایلی چون آپلود گلوگاه است و snapshot زودتر آزاد می‌شود")
+    else:
+        streaming = True
+
+    # فضای موقتی که این اجرا واقعاً اشغال می‌کند (برای رزرو در بودجه منابع)
+    scratch = file_scratch if not streaming else (size if parallel else 0)
+
+    plan = {
+        "streaming": streaming,
+        "dump": dump,
+        "compression": compression,
+        "size_bytes": size,
+        "tables": tables,
+        "free_bytes": int(free_bytes),
+        "cpus": cpu_count,
+        "cpu_needed": max(int((compression or {}).get("workers", 1)), dump_jobs, 1),
+        "scratch_bytes": int(scratch),
+        "pinned": sorted(pinned),
+        "reasons": reasons,
+    }
+    if rates.get("upload_bps"):
+        plan["estimated_minutes"] = round(compressed / rates["upload_bps"] / 60, 1)
+    return plan
+
+
+def describe(plan: dict) -> str:
+    """خلاصه یک خطی طرح برای لاگ."""
+    dump, compression = plan["dump"] or {}, plan["compression"] or {}
+    parts = [
+        f"{plan['size_bytes'] / (1024 * 1024):.1f}MB/{plan['tables']} جدول",
+        "جریانی" if plan["streaming"] else "فایلی",
+        f"dump {dump.get('format', 'plain')}" + (f"×{dump['jobs']}" if dump.get("jobs") else ""),
+        f"{compression.get('codec', 'gzip')} سطح {compression.get('level', '-')}"
+        + (f"×{compression['workers']}" if compression.get("workers") else ""),
+    ]
+    if "estimated_minutes" in plan:
+        parts.append(f"~{plan['estimated_minutes']} دقیقه آپلود")
+    if plan["pinned"]:
+        parts.append(f"ثابت: {', '.join(plan['pinned'])}")
+    return "، ".join(parts) + (f" ({'؛ '.join(plan['reasons'])})" if plan["reasons"] else "")
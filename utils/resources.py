@@ -0,0 +1,127 @@
+import os
+import shutil
+import threading
+from pathlib import Path
+
+# بودجه منابع مشترک بین جاب‌های هم‌زمان روی یک میزبان.
+# هر جاب پیش از اجرا سهم خود را (اتصال dump به میزبان دیتابیس، نخ‌های CPU، فضای دیسک موقت
+# و پهنای باند آپلود) رزرو می‌کند و تا زمانی که سهمش آزاد نباشد در صف می‌ماند.
+DUMPS_PER_HOST = 1
+
+
+class ResourceRequest:
+    """منابع مورد نیاز یک اجرای جاب."""
+
+    def __init__(self, db_host: str = None, cpu: int = 1, scratch_bytes: int = 0, bandwidth_mbps: float = 0):
+        self.db_host = db_host
+        self.cpu = max(1, int(cpu))
+        self.scratch_bytes = max(0, int(scratch_bytes))
+        self.bandwidth_mbps = max(0.0, float(bandwidth_mbps))
+
+    def as_dict(self) -> dict:
+        return {
+            "db_host": self.db_host,
+            "cpu": self.cpu,
+            "scratch_mb": round(self.scratch_bytes / (1024 * 1024), 1),
+            "bandwidth_mbps": self.bandwidth_mbps,
+        }
+
+
+class ResourceBudget:
+    """
+    کنترل پذیرش بر اساس بودجه‌های قابل تنظیم. مقدار 0 برای scratch_bytes یعنی فضای آزاد دیسک پوشه موقت
+    و برای upload_mbps یعنی بدون محدودیت. درخواستی که از کل ظرفیت بیشتر باشد به اندازه ظرفیت محدود می‌شود
+    تا جاب بزرگ هرگز برای همیشه در صف نماند (در این حالت به تنهایی اجرا می‌شود).
+    """
+
+    def __init__(self, dumps_per_host: int = DUMPS_PER_HOST, cpu_workers: int = None, scratch_bytes: int = 0,
+                 upload_mbps: float = 0, scratch_dir: Path = None):
+        self.dumps_per_host = max(1, dumps_per_host)
+        self.cpu_workers = max(1, cpu_workers or os.cpu_count() or 1)
+        self.scratch_dir = Path(scratch_dir) if scratch_dir else None
+        self.scratch_bytes = scratch_bytes
+        self.upload_mbps = upload_mbps
+        self._lock = threading.Lock()
+        self._host_dumps = {}
+        self._cpu = 0
+        self._scratch = 0
+        self._bandwidth = 0.0
+
+    def _scratch_capacity(self) -> int:
+        if self.scratch_bytes:
+            return self.scratch_bytes
+        if self.scratch_dir is None:
+            return 0
+        # فضای آزاد فعلی به علاوه فضایی که جاب‌های در حال اجرا رزرو کرده‌اند (و شاید هنوز پر نکرده‌اند)
+        return shutil.disk_usage(self.scratch_dir).free + self._scratch
+
+    def _clamped(self, request: ResourceRequest) -> tuple:
+        scratch_capacity = self._scratch_capacity()
+        scratch = min(request.scratch_bytes, scratch_capacity) if scratch_capacity else 0
+        bandwidth = min(request.bandwidth_mbps, self.upload_mbps) if self.upload_mbps else 0
+        return min(request.cpu, self.cpu_workers), scratch, bandwidth, scratch_capacity
+
+    def host_busy(self, request: ResourceRequest) -> bool:
+        """آیا سقف dump هم‌زمان میزبان دیتابیس این درخواست پر است؟ (منبعی که جاب‌های دیگر میزبان‌ها آن را مصرف نمی‌کنند)"""
+        with self._lock:
+            return bool(request.db_host) and self._host_dumps.get(request.db_host, 0) >= self.dumps_per_host
+
+    def try_acquire(self, request: ResourceRequest) -> bool:
+        """در صورت کافی بودن همه بودجه‌ها سهم درخواست را رزرو کرده و True برمی‌گرداند."""
+        with self._lock:
+            cpu, scratch, bandwidth, scratch_capacity = self._clamped(request)
+            if request.db_host and self._host_dumps.get(request.db_host, 0) >= self.dumps_per_host:
+                return False
+            if self._cpu + cpu > self.cpu_workers:
+                return False
+            if scratch_capacity and self._scratch + scratch > scratch_capacity:
+                return False
+            if self.upload_mbps and self._bandwidth + bandwidth > self.upload_mbps:
+                return False
+            if request.db_host:
+                self._host_dumps[request.db_host] = self._host_dumps.get(request.db_host, 0) + 1
+            self._cpu += cpu
+            self._scratch += scratch
+            self._bandwidth += bandwidth
+            request._granted = (cpu, scratch, bandwidth)
+            return True
+
+    def release(self, request: ResourceRequest):
+        with self._lock:
+            cpu, scratch, bandwidth = request._granted
+            if request.db_host:
+                self._host_dumps[request.db_host] -= 1
+                if not self._host_dumps[request.db_host]:
+                    del self._host_dumps[request.db_host]
+            self._cpu -= cpu
+            self._scratch -= scratch
+            self._bandwidth -= bandwidth
+
+    def resize(self, request: ResourceRequest, cpu: int, scratch_bytes: int) -> tuple:
+        """
+        سهم CPU و فضای موقت یک جاب در حال اجرا را به cpu و scratch_bytes تغییر می‌دهد؛ افزایش فقط تا جایی که از
+        بودجه آزاد مانده است. سهم نهایی (cpu, scratch_bytes) برگردانده و با release همه آن آزاد می‌شود. برنامه‌ریز
+        بکاپ ابتدا همه بودجه آزاد را می‌گیرد، طرح را در همان محدوده می‌چیند و سپس سهم را به نیاز طرح برمی‌گرداند.
+        """
+        with self._lock:
+            granted_cpu, granted_scratch, bandwidth = request._granted
+            cpu = max(1, min(int(cpu), granted_cpu + self.cpu_workers - self._cpu))
+            scratch_capacity = self._scratch_capacity()
+            if scratch_capacity:
+                scratch = max(0, min(int(scratch_bytes), granted_scratch + scratch_capacity - self._scratch))
+            else:
+                scratch = 0
+            self._cpu += cpu - granted_cpu
+            self._scratch += scratch - granted_scratch
+            request._granted = (cpu, scratch, bandwidth)
+            request.cpu, request.scratch_bytes = cpu, scratch
+            return cpu, scratch
+
+    def usage(self) -> dict:
+        with self._lock:
+            return {
+                "db_hosts": dict(self._host_dumps),
+                "cpu": f"{self._cpu}/{self.cpu_workers}",
+                "scratch_mb": round(self._scratch / (1024 * 1024), 1),
+                "bandwidth_mbps": f"{self._bandwidth}/{self.upload_mbps or '∞'}",
+            }
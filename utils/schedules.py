@@ -0,0 +1,99 @@
+import json
+import os
+import time
+from pathlib import Path
+
+# دریافت شرطی و تطبیق تدریجی زمان‌بندی‌ها. پاسخ my-schedules می‌تواند یک لیست یا
+# {"version": ..., "schedules": [...]} باشد. ETag پاسخ قبلی در If-None-Match و نسخه قبلی در پارامتر version
+# ارسال می‌شود و سرور می‌تواند با 304 (یا همان version) اعلام کند که تغییری نبوده است.
+# هر زمان‌بندی با یک کلید پایدار شناخته می‌شود (id زمان‌بندی، یا نام جاب اگر سرور id نفرستد) تا با هر
+# reload فقط موارد اضافه، تغییر یافته یا حذف شده در زمان‌بند محلی اعمال شوند و زمان اجرای بعدی بقیه حفظ شود.
+SCHEDULES_PATH = "/api/v1/agent/my-schedules"
+
+
+def schedule_key(entry: dict) -> str:
+    for field in ("id", "schedule_id"):
+        if entry.get(field) is not None:
+            return f"schedule-{entry[field]}"
+    return f"job-{entry['job_name']}"
+
+
+def active_schedules(entries: list) -> dict:
+    """زمان‌بندی‌های فعال به تفکیک کلید؛ زمان‌بندی غیرفعال مانند حذف شده در نظر گرفته می‌شود."""
+    schedules = {}
+    for entry in entries:
+        if not entry.get("is_active", True):
+            continue
+        key = schedule_key(entry)
+        if key in schedules:
+            # چند زمان‌بندی بدون id برای یک جاب
+            key = f"{key}-{entry['cron_string']}"
+        schedules[key] = entry
+    return schedules
+
+
+def diff_schedules(current: dict, desired: dict) -> tuple:
+    """(اضافه شده، تغییر یافته، حذف شده) بین دو نگاشت کلید → زمان‌بندی."""
+    added = [key for key in desired if key not in current]
+    removed = [key for key in current if key not in desired]
+    changed = [key for key in desired if key in current and
+               (desired[key]["job_name"], desired[key]["cron_string"]) !=
+               (current[key]["job_name"], current[key]["cron_string"])]
+    return added, changed, removed
+
+
+class ScheduleSource:
+    """
+    زمان‌بندی‌ها را به صورت شرطی از سرور دریافت و آخرین مجموعه معتبر را روی دیسک نگه می‌دارد تا agent
+    پس از راه‌اندازی، حتی پیش از دسترسی به سرور، زمان‌بندی را شروع کند.
+    """
+
+    def __init__(self, cache_path: Path):
+        self.cache_path = Path(cache_path)
+        self.etag = None
+        self.version = None
+        self.schedules = None
+        self.fetched_at = None
+
+    def load_cached(self):
+        """زمان‌بندی‌های ذخیره شده (یا None)."""
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self.etag, self.version = cached.get("etag"), cached.get("version")
+        self.schedules, self.fetched_at = cached.get("schedules"), cached.get("fetched_at")
+        return self.schedules
+
+    def _save(self):
+        temp_path = self.cache_path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"etag": self.etag, "version": self.version, "schedules": self.schedules,
+                       "fetched_at": self.fetched_at}, f, ensure_ascii=False)
+        os.replace(temp_path, self.cache_path)
+
+    def fetch(self, transport):
+        """
+        زمان‌بندی‌های جدید، یا None اگر از دریافت قبلی تغییری نکرده‌اند. (درخواست مسدودکننده است؛ در
+        event loop باید با asyncio.to_thread اجرا شود.)
+        """
+        headers = {"If-None-Match": self.etag} if self.etag and self.schedules is not None else {}
+        params = {"version": self.version} if self.version is not None and self.schedules is not None else None
+        response = transport.request("GET", SCHEDULES_PATH, headers=headers, params=params, timeout=60)
+        self.fetched_at = time.time()
+        if response.status_code == 304:
+            return None
+        payload = response.json()
+        if isinstance(payload, dict):
+            version, schedules = payload.get("version"), payload.get("schedules", [])
+        else:
+            version, schedules = None, payload
+        if self.schedules is not None and version is not None and version == self.version:
+            return None
+        self.etag, self.version, self.schedules = response.headers.get("ETag"), version, schedules
+        try:
+            self._save()
+        except OSError as e:
+            print(f"⚠️ ذخیره زمان‌بندی‌ها در '{self.cache_path}' ناموفق بود: {e}")
+        return schedules
@@ -1,5 +1,33 @@
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+import base64
 import os
+import struct
+
+# قالب جریانی نسخه‌دار: هر فایل با STREAM_MAGIC و شماره نسخه شروع می‌شود.
+#  نسخه 1: فریم‌های Fernet با طول مشخص (base64، فقط برای خواندن بکاپ‌های قدیمی نگه داشته شده است)
+#  نسخه 2: قطعات باینری با اندازه ثابت، رمزگذاری شده با AES-256-GCM
+#
+# ساختار نسخه 2:
+#   هدر: MAGIC(4) | version(1) | chunk_size(4) | salt(16)
+#   فریم i: ciphertext(chunk_size) | tag(16)   (آخرین فریم می‌تواند کوتاه‌تر یا حتی خالی باشد)
+# کلید هر فایل با HKDF از کلید اصلی و salt تصادفی همان فایل مشتق می‌شود. nonce هر قطعه از شماره
+# ترتیبی و پرچم «آخرین فریم» ساخته می‌شود، بنابراین جابه‌جایی، حذف یا بریدن فریم‌ها تشخیص داده
+# می‌شود و چون اندازه فریم‌ها ثابت است، هر قطعه به صورت مستقل (مثلاً با Range request) قابل رمزگشایی است.
+STREAM_MAGIC = b"CHVN"
+STREAM_VERSION_FERNET = 1
+STREAM_VERSION_AESGCM = 2
+STREAM_CHUNK_SIZE = 1024 * 1024
+TAG_SIZE = 16
+_PREFIX = struct.Struct(">4sB")
+_HEADER_V2 = struct.Struct(">4sBI16s")
+HEADER_SIZE = _HEADER_V2.size
+_NONCE = struct.Struct(">QI")
+_FRAME_LENGTH = struct.Struct(">I")
+_FRAME_META = struct.Struct(">QB")
 
 
 def generate_key() -> bytes:
@@ -7,25 +35,248 @@ def generate_key() -> bytes:
     return Fernet.generate_key()
 
 
-def encrypt_file(key: bytes, input_file_path: str, output_file_path: str):
-    """یک فایل را با استفاده از کلید داده شده رمزگذاری می‌کند."""
-    fernet = Fernet(key)
-    with open(input_file_path, 'rb') as file:
-        original_data = file.read()
+def _derive_key(key: bytes, salt: bytes) -> bytes:
+    """کلید AES-256 مخصوص یک فایل را از کلید اصلی (قالب Fernet) و salt آن فایل مشتق می‌کند."""
+    master = base64.urlsafe_b64decode(key)
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=b"cloud-haven-stream-v2").derive(master)
 
-    encrypted_data = fernet.encrypt(original_data)
 
-    with open(output_file_path, 'wb') as file:
-        file.write(encrypted_data)
+def derive_chunk_id_key(key: bytes) -> bytes:
+    """
+    کلید HMAC شناسه قطعات dedup. شناسه هر قطعه HMAC محتوای آن است (نه هش ساده)، بنابراین سرور
+    از روی شناسه‌ها نمی‌تواند وجود یک محتوای مشخص را در بکاپ‌ها حدس بزند.
+    """
+    master = base64.urlsafe_b64decode(key)
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"cloud-haven-chunk-id-v1").derive(master)
 
 
-def decrypt_file(key: bytes, input_file_path: str, output_file_path: str):
-    """یک فایل رمزگذاری شده را با استفاده از کلید داده شده رمزگشایی می‌کند."""
-    fernet = Fernet(key)
-    with open(input_file_path, 'rb') as file:
-        encrypted_data = file.read()
+def frame_size(chunk_size: int) -> int:
+    """اندازه هر فریم رمزگذاری شده (به جز آخرین فریم) در قالب نسخه 2."""
+    return chunk_size + TAG_SIZE
+
+
+class StreamEncryptor:
+    """رمزگذاری جریانی: داده را در قطعات ثابت رمز می‌کند تا کل فایل هرگز در حافظه قرار نگیرد."""
+
+    def __init__(self, key: bytes, chunk_size: int = STREAM_CHUNK_SIZE):
+        salt = os.urandom(16)
+        self.header = _HEADER_V2.pack(STREAM_MAGIC, STREAM_VERSION_AESGCM, chunk_size, salt)
+        self._aead = AESGCM(_derive_key(key, salt))
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._index = 0
+        self._header_written = False
+
+    def _take_header(self) -> bytes:
+        if self._header_written:
+            return b""
+        self._header_written = True
+        return self.header
+
+    def _seal(self, chunk: bytes, last: bool) -> bytes:
+        nonce = _NONCE.pack(self._index, int(last))
+        self._index += 1
+        return self._aead.encrypt(nonce, chunk, self.header)
+
+    def update(self, data: bytes) -> bytes:
+        self._buffer += data
+        out = bytearray(self._take_header())
+        while len(self._buffer) >= self._chunk_size:
+            out += self._seal(bytes(self._buffer[:self._chunk_size]), last=False)
+            del self._buffer[:self._chunk_size]
+        return bytes(out)
+
+    def finalize(self) -> bytes:
+        out = self._take_header() + self._seal(bytes(self._buffer), last=True)
+        self._buffer.clear()
+        return out
+
+
+class StreamDecryptor:
+    """
+    نقطه مقابل StreamEncryptor؛ ورودی را به هر اندازه‌ای می‌پذیرد و متن اصلی را برمی‌گرداند.
+    نسخه از روی هدر تشخیص داده می‌شود. فایل‌های Fernet قدیمی (بدون هدر) نیز پشتیبانی می‌شوند،
+    اما چون Fernet جریانی نیست، کل آن‌ها تا finalize در حافظه نگه داشته می‌شود.
+    """
+
+    def __init__(self, key: bytes):
+        self._key = key
+        self._buffer = bytearray()
+        self._version = None
+        self._index = 0
+        self._finished = False
+
+    def _read_header(self) -> bool:
+        if len(self._buffer) < len(STREAM_MAGIC):
+            return False
+        if bytes(self._buffer[:len(STREAM_MAGIC)]) != STREAM_MAGIC:
+            self._version = 0
+            return True
+        if len(self._buffer) < _PREFIX.size:
+            return False
+        _, version = _PREFIX.unpack_from(self._buffer)
+        if version == STREAM_VERSION_FERNET:
+            self._fernet = Fernet(self._key)
+            del self._buffer[:_PREFIX.size]
+        elif version == STREAM_VERSION_AESGCM:
+            if len(self._buffer) < _HEADER_V2.size:
+                return False
+            self._header = bytes(self._buffer[:_HEADER_V2.size])
+            _, _, chunk_size, salt = _HEADER_V2.unpack(self._header)
+            self._frame_size = frame_size(chunk_size)
+            self._aead = AESGCM(_derive_key(self._key, salt))
+            del self._buffer[:_HEADER_V2.size]
+        else:
+            raise ValueError(f"نسخه {version} قالب رمزگذاری پشتیبانی نمی‌شود.")
+        self._version = version
+        return True
+
+    def _open(self, frame: bytes, last: bool) -> bytes:
+        nonce = _NONCE.pack(self._index, int(last))
+        try:
+            plaintext = self._aead.decrypt(nonce, frame, self._header)
+        except InvalidTag:
+            raise ValueError("احراز اصالت یک قطعه رمزگذاری شده ناموفق بود (فایل ناقص یا دستکاری شده است).")
+        self._index += 1
+        return plaintext
+
+    def _update_v1(self) -> bytes:
+        out = bytearray()
+        while len(self._buffer) >= _FRAME_LENGTH.size:
+            (length,) = _FRAME_LENGTH.unpack_from(self._buffer)
+            if len(self._buffer) < _FRAME_LENGTH.size + length:
+                break
+            if self._finished:
+                raise ValueError("داده اضافی پس از آخرین فریم رمزگذاری شده یافت شد.")
+            token = bytes(self._buffer[_FRAME_LENGTH.size:_FRAME_LENGTH.size + length])
+            del self._buffer[:_FRAME_LENGTH.size + length]
+            plaintext = self._fernet.decrypt(token)
+            index, last = _FRAME_META.unpack_from(plaintext)
+            if index != self._index:
+                raise ValueError("ترتیب فریم‌های رمزگذاری شده به هم خورده است.")
+            self._index += 1
+            self._finished = bool(last)
+            out += plaintext[_FRAME_META.size:]
+        return bytes(out)
+
+    def _update_v2(self) -> bytes:
+        # همیشه حداقل یک فریم در بافر می‌ماند، چون تا پایان جریان معلوم نیست کدام فریم آخرین است
+        out = bytearray()
+        while len(self._buffer) > self._frame_size:
+            out += self._open(bytes(self._buffer[:self._frame_size]), last=False)
+            del self._buffer[:self._frame_size]
+        return bytes(out)
+
+    def update(self, data: bytes) -> bytes:
+        self._buffer += data
+        if self._version is None and not self._read_header():
+            return b""
+        if self._version == STREAM_VERSION_FERNET:
+            return self._update_v1()
+        if self._version == STREAM_VERSION_AESGCM:
+            return self._update_v2()
+        return b""
+
+    def finalize(self) -> bytes:
+        if self._version == 0:
+            return Fernet(self._key).decrypt(bytes(self._buffer))
+        if self._version == STREAM_VERSION_AESGCM:
+            if len(self._buffer) < TAG_SIZE:
+                raise ValueError("فایل رمزگذاری شده ناقص است (آخرین فریم دریافت نشد).")
+            return self._open(bytes(self._buffer), last=True)
+        if self._version is None or not self._finished or self._buffer:
+            raise ValueError("فایل رمزگذاری شده ناقص است (آخرین فریم دریافت نشد).")
+        return b""
+
 
-    decrypted_data = fernet.decrypt(encrypted_data)
+class FrameReader:
+    """
+    رمزگشایی مستقل فریم‌های یک فایل نسخه 2 بر اساس موقعیت آن‌ها، تا بتوان چند فریم دلخواه را با Range request
+    و بدون دریافت کل فایل احراز اصالت کرد. header همان HEADER_SIZE بایت ابتدای فایل است.
+    """
 
-    with open(output_file_path, 'wb') as file:
-        file.write(decrypted_data)
\ No newline at end of file
+    def __init__(self, key: bytes, header: bytes):
+        if len(header) < HEADER_SIZE or header[:len(STREAM_MAGIC)] != STREAM_MAGIC:
+            raise ValueError("فایل در قالب جریانی رمزگذاری نشده است.")
+        _, version, chunk_size, salt = _HEADER_V2.unpack(header[:HEADER_SIZE])
+        if version != STREAM_VERSION_AESGCM:
+            raise ValueError(f"رمزگشایی مستقل فریم‌ها برای نسخه {version} قالب رمزگذاری ممکن نیست.")
+        self._header = bytes(header[:HEADER_SIZE])
+        self._aead = AESGCM(_derive_key(key, salt))
+        self.frame_size = frame_size(chunk_size)
+
+    def frame_count(self, size: int) -> int:
+        """تعداد فریم‌های فایلی با حجم size."""
+        body = size - HEADER_SIZE
+        if body < TAG_SIZE:
+            raise ValueError("فایل رمزگذاری شده ناقص است (آخرین فریم دریافت نشد).")
+        return (body - TAG_SIZE) // self.frame_size + 1
+
+    def frames(self, size: int, start: int = 0, end: int = None):
+        """
+        فریم‌هایی از فایلی با حجم size که کامل در بازه [start, end) قرار دارند، به صورت
+        (شماره، offset، طول، آخرین فریم است)؛ آخرین فریم کوتاه‌تر (یا فقط tag) است.
+        """
+        count = self.frame_count(size)
+        end = size if end is None else min(end, size)
+        index = max(0, -(-(start - HEADER_SIZE) // self.frame_size))
+        while index < count:
+            offset = HEADER_SIZE + index * self.frame_size
+            length = self.frame_size if index < count - 1 else size - offset
+            if offset + length > end:
+                break
+            yield index, offset, length, index == count - 1
+            index += 1
+
+    def open(self, index: int, frame: bytes, last: bool) -> bytes:
+        try:
+            return self._aead.decrypt(_NONCE.pack(index, int(last)), frame, self._header)
+        except InvalidTag:
+            raise ValueError(f"احراز اصالت فریم {index} ناموفق بود (فایل ناقص یا دستکاری شده است).")
+
+
+def is_stream_encrypted(header: bytes) -> bool:
+    """بررسی می‌کند که ابتدای یک فایل با قالب جریانی رمزگذاری شده باشد."""
+    return header[:len(STREAM_MAGIC)] == STREAM_MAGIC
+
+
+def encrypt_stream(key: bytes, source, destination, chunk_size: int = STREAM_CHUNK_SIZE):
+    """داده یک شیء فایل‌مانند را با حافظه ثابت رمزگذاری کرده و در شیء مقصد می‌نویسد."""
+    encryptor = StreamEncryptor(key, chunk_size)
+    for chunk in iter(lambda: source.read(chunk_size), b""):
+        destination.write(encryptor.update(chunk))
+    destination.write(encryptor.finalize())
+
+
+def decrypt_stream(key: bytes, source, destination):
+    """داده رمزگذاری شده (هر نسخه‌ای) را از یک شیء فایل‌مانند خوانده و متن اصلی را در مقصد می‌نویسد."""
+    decryptor = StreamDecryptor(key)
+    for chunk in iter(lambda: source.read(STREAM_CHUNK_SIZE), b""):
+        destination.write(decryptor.update(chunk))
+    destination.write(decryptor.finalize())
+
+
+def encrypt_bytes(key: bytes, data: bytes) -> bytes:
+    """یک بلوک کوچک داده (مثلاً قطعه dedup یا مانیفست) را در قالب جریانی نسخه 2 رمزگذاری می‌کند."""
+    encryptor = StreamEncryptor(key)
+    return encryptor.update(data) + encryptor.finalize()
+
+
+def decrypt_bytes(key: bytes, data: bytes) -> bytes:
+    decryptor = StreamDecryptor(key)
+    return decryptor.update(data) + decryptor.finalize()
+
+
+def encrypt_file(key: bytes, input_file_path: str, output_file_path: str):
+    """یک فایل را با استفاده از کلید داده شده (قالب جریانی نسخه 2) رمزگذاری می‌کند."""
+    with open(input_file_path, 'rb') as source, open(output_file_path, 'wb') as destination:
+        encrypt_stream(key, source, destination)
+
+
+def decrypt_file(key: bytes, input_file_path: str, output_file_path: str):
+    """
+    یک فایل رمزگذاری شده را با استفاده از کلید داده شده رمزگشایی می‌کند.
+    قالب (جریانی یا Fernet قدیمی) به صورت خودکار از روی هدر تشخیص داده می‌شود.
+    """
+    with open(input_file_path, 'rb') as source, open(output_file_path, 'wb') as destination:
+        decrypt_stream(key, source, destination)
@@ -0,0 +1,263 @@
+import json
+import re
+
+from utils.compression import create_compressor, create_decompressor
+from utils.security import FrameReader, HEADER_SIZE, TAG_SIZE, encrypt_bytes, decrypt_bytes
+
+# بکاپ با فهرست جداول (TOC) برای بازیابی تک‌جدول. dump متنی (فرمت plain) هنگام فشرده‌سازی از روی خطوط
+# توضیح هر بخش (pg_dump: «-- Name: users; Type: TABLE; ...»، mysqldump: «-- Table structure for table `users`»)
+# به بخش‌های مستقل تقسیم می‌شود: پیش‌درآمد (تنظیمات نشست)، ساختار هر جدول، داده هر جدول و بقیه اشیاء. هر بخش
+# از یک عضو جدید فشرده‌سازی شروع می‌شود، بنابراین بازه بایت آن در جریان فشرده به تنهایی باز می‌شود و فایل
+# همچنان یک بکاپ معمولی است که به صورت کامل هم بازیابی می‌شود. فهرست (offset و طول هر بخش در جریان فشرده)
+# رمزگذاری شده و در شیء '<بکاپ>.toc' کنار بکاپ ذخیره می‌شود. چون فریم‌های رمزگذاری نسخه 2 اندازه ثابت دارند،
+# هر بخش فقط با دریافت فریم‌های همان بازه (Range request) رمزگشایی می‌شود.
+TOC_SUFFIX = ".toc"
+TOC_VERSION = 1
+PREAMBLE = "PREAMBLE"
+TABLE = "TABLE"
+TABLE_DATA = "TABLE DATA"
+OTHER = "OTHER"
+# خطی طولانی‌تر از این نمی‌تواند خط توضیح یک بخش باشد و بدون انتظار برای پایان خط فشرده می‌شود
+MAX_HEADER_LINE = 64 * 1024
+
+_PG_HEADER = re.compile(rb"-- (?:Data for )?Name: (.*?); Type: (.*?); Schema: (.*?);")
+_MYSQL_HEADER = re.compile(rb"-- (Table structure|Dumping data) for table `((?:[^`]|``)+)`")
+_MYSQL_OTHER = re.compile(rb"-- (?:Temporary view structure|Final view structure|Dumping routines|Dumping events)")
+
+
+def _postgres_section(line: bytes):
+    match = _PG_HEADER.match(line)
+    if not match:
+        return None
+    name, kind, schema = (value.decode("utf-8", "replace") for value in match.groups())
+    if kind not in (TABLE, TABLE_DATA):
+        return OTHER, None, None
+    return kind, None if schema == "-" else schema, name
+
+
+def _mysql_section(line: bytes):
+    match = _MYSQL_HEADER.match(line)
+    if match:
+        kind = TABLE if match.group(1) == b"Table structure" else TABLE_DATA
+        return kind, None, match.group(2).replace(b"``", b"`").decode("utf-8", "replace")
+    return (OTHER, None, None) if _MYSQL_OTHER.match(line) else None
+
+
+_DIALECTS = {"postgresql": _postgres_section, "mysql": _mysql_section}
+
+
+class SectionedCompressor:
+    """
+    کمپرسوری (update/finalize) که dump متنی را فشرده کرده و هم‌زمان فهرست بخش‌های آن را در toc می‌سازد.
+    در ابتدای ساختار یا داده هر جدول، عضو فشرده‌سازی فعلی بسته می‌شود؛ بقیه اشیاء (تابع، index، constraint و ...)
+    پشت سر هم در یک بخش OTHER می‌مانند تا نسبت فشرده‌سازی کم نشود. در PostgreSQL خطوط داخل بلوک COPY بررسی
+    نمی‌شوند تا داده‌ای شبیه خط توضیح، بخش جدیدی نسازد.
+    """
+
+    def __init__(self, compressor, dialect: str, settings: dict = None):
+        if dialect not in _DIALECTS:
+            raise ValueError(f"فهرست جداول برای '{dialect}' پشتیبانی نمی‌شود.")
+        self._compressor = compressor
+        self._settings = settings
+        self._parse = _DIALECTS[dialect]
+        self._copy_blocks = dialect == "postgresql"
+        self.report = getattr(compressor, "report", None)
+        self.toc = {"version": TOC_VERSION, "dialect": dialect, "sections": []}
+        self._section = {"type": PREAMBLE, "schema": None, "name": None, "offset": 0, "raw_size": 0}
+        self._buffer = bytearray()
+        self._fed = 0
+        self._output = bytearray()
+        self._written = 0
+        self._midline = False
+        self._in_copy = False
+
+    def _feed(self, end: int):
+        """بافر را تا موقعیت end به کمپرسور می‌دهد."""
+        if end > self._fed:
+            data = bytes(self._buffer[self._fed:end])
+            self._section["raw_size"] += len(data)
+            self._emit(self._compressor.update(data))
+            self._fed = end
+
+    def _emit(self, data: bytes):
+        self._output += data
+        self._written += len(data)
+
+    def _cut(self):
+        """عضو فعلی را می‌بندد تا بخش بعدی از یک عضو مستقل شروع شود."""
+        end_member = getattr(self._compressor, "end_member", None)
+        if end_member:
+            self._emit(end_member())
+            return
+        self._emit(self._compressor.finalize())
+        self._compressor = create_compressor(self._settings)
+
+    def _close_section(self):
+        section = self._section
+        section["length"] = self._written - section["offset"]
+        if section["raw_size"]:
+            self.toc["sections"].append(section)
+
+    def _start(self, position: int, kind: str, schema: str, name: str):
+        if kind == OTHER and self._section["type"] == OTHER:
+            return
+        self._feed(position)
+        if self._section["raw_size"]:
+            self._cut()
+            self._close_section()
+        self._section = {"type": kind, "schema": schema, "name": name, "offset": self._written, "raw_size": 0}
+
+    def _find_line(self, token: bytes, start: int, end: int) -> int:
+        """اولین خطی در بازه [start, end) (start ابتدای یک خط است) که با token شروع می‌شود، یا -1."""
+        if self._buffer.startswith(token, start, end):
+            return start
+        index = self._buffer.find(b"\n" + token, start, end)
+        return index + 1 if index >= 0 else -1
+
+    def _scan(self, end: int):
+        """خطوط کامل بافر (تا موقعیت end) را برای شروع بخش‌ها بررسی می‌کند."""
+        position = 0
+        while position < end:
+            if self._in_copy:
+                stop = self._find_line(b"\\.\n", position, end)
+                if stop < 0:
+                    return
+                self._in_copy = False
+                position = stop + 3
+                continue
+            header = self._find_line(b"-- ", position, end)
+            copy = -1
+            if self._copy_blocks and self._section["type"] == TABLE_DATA:
+                copy = self._find_line(b"COPY ", position, header if header >= 0 else end)
+            if copy >= 0:
+                self._in_copy = True
+                position = self._buffer.index(b"\n", copy) + 1
+                continue
+            if header < 0:
+                return
+            line_end = self._buffer.index(b"\n", header) + 1
+            section = self._parse(bytes(self._buffer[header:line_end]))
+            if section:
+                self._start(header, *section)
+            position = line_end
+
+    def update(self, data: bytes) -> bytes:
+        self._buffer += data
+        if self._midline:
+            newline = self._buffer.find(b"\n")
+            if newline < 0:
+                self._feed(len(self._buffer))
+            else:
+                self._feed(newline + 1)
+                self._midline = False
+            del self._buffer[:self._fed]
+            self._fed = 0
+        if not self._midline:
+            end = self._buffer.rfind(b"\n") + 1
+            self._scan(end)
+            self._feed(end)
+            if len(self._buffer) - end > MAX_HEADER_LINE:
+                self._feed(len(self._buffer))
+                self._midline = True
+            del self._buffer[:self._fed]
+            self._fed = 0
+        output, self._output = bytes(self._output), bytearray()
+        return output
+
+    def finalize(self) -> bytes:
+        self._feed(len(self._buffer))
+        self._buffer.clear()
+        self._emit(self._compressor.finalize())
+        self._close_section()
+        output, self._output = bytes(self._output), bytearray()
+        return output
+
+    def close(self):
+        close = getattr(self._compressor, "close", None)
+        if close:
+            close()
+
+
+def table_count(toc: dict) -> int:
+    return len({(s["schema"], s["name"]) for s in toc["sections"] if s["type"] in (TABLE, TABLE_DATA)})
+
+
+def seal_toc(key: bytes, toc: dict, object_name: str) -> bytes:
+    """فهرست بکاپ را رمزگذاری می‌کند؛ نام شیء داخل آن ثبت می‌شود تا فهرست بکاپ دیگری جایگزین نشود."""
+    return encrypt_bytes(key, json.dumps({**toc, "object": object_name}, ensure_ascii=False).encode())
+
+
+def open_toc(key: bytes, sealed: bytes, object_name: str) -> dict:
+    toc = json.loads(decrypt_bytes(key, sealed))
+    if toc.get("object") != object_name:
+        raise ValueError(f"فهرست جداول ذخیره شده متعلق به بکاپ '{object_name}' نیست.")
+    if toc.get("version") != TOC_VERSION:
+        raise ValueError(f"نسخه {toc.get('version')} فهرست جداول پشتیبانی نمی‌شود.")
+    return toc
+
+
+def find_table(toc: dict, table: str) -> dict:
+    """
+    بخش‌های لازم برای بازیابی یک جدول: {PREAMBLE, TABLE, TABLE DATA} (بخش‌های ناموجود None). table نام جدول
+    یا 'schema.table' است؛ اگر نام جدول بدون schema در چند schema وجود داشته باشد خطا رخ می‌دهد.
+    """
+    sections = [s for s in toc["sections"] if s["type"] in (TABLE, TABLE_DATA)]
+    matches = [s for s in sections if s["name"] == table]
+    if not matches and "." in table:
+        schema, _, name = table.partition(".")
+        matches = [s for s in sections if (s["schema"], s["name"]) == (schema, name)]
+    if not matches:
+        raise ValueError(f"جدول '{table}' در فهرست این بکاپ یافت نشد.")
+    schemas = {s["schema"] for s in matches}
+    if len(schemas) > 1:
+        raise ValueError(f"جدول '{table}' در چند schema وجود دارد ({', '.join(sorted(schemas))}); "
+                         f"آن را به صورت schema.table مشخص کنید.")
+    found = {PREAMBLE: next((s for s in toc["sections"] if s["type"] == PREAMBLE), None), TABLE: None, TABLE_DATA: None}
+    for section in matches:
+        found[section["type"]] = section
+    return found
+
+
+class SectionReader:
+    """
+    خواندن بخش‌های یک بکاپ با فهرست (downloader یک RangedDownloader است): فقط فریم‌های رمزگذاری شده‌ای که
+    بازه بخش را پوشش می‌دهند با Range request دریافت، احراز اصالت و رمزگشایی شده و از حالت فشرده خارج می‌شوند.
+    """
+
+    def __init__(self, downloader, key: bytes, bucket_name: str, object_name: str):
+        self.downloader = downloader
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.size = downloader.probe(bucket_name, object_name)
+        header = downloader.fetch_ranges(bucket_name, object_name, [(0, HEADER_SIZE, None)])[0]
+        self.reader = FrameReader(key, header)
+
+    def read(self, section: dict):
+        """قطعات خام (از حالت فشرده خارج شده) یک بخش فهرست."""
+        start, end = section["offset"], section["offset"] + section["length"]
+        frame_size = self.reader.frame_size
+        chunk_size = frame_size - TAG_SIZE
+        count = self.reader.frame_count(self.size)
+        first, last = start // chunk_size, (end - 1) // chunk_size
+        if end <= start or last >= count:
+            raise ValueError(f"بازه بخش '{section['name'] or section['type']}' با حجم بکاپ مطابقت ندارد.")
+        per_range = max(1, self.downloader.range_size // frame_size)
+        ranges = []
+        for index in range(first, last + 1, per_range):
+            offset = HEADER_SIZE + index * frame_size
+            stop = min(self.size, HEADER_SIZE + min(last + 1, index + per_range) * frame_size)
+            ranges.append((offset, stop - offset, None))
+
+        decompressor = create_decompressor(self.object_name)
+        index = first
+        for data in self.downloader.iter_ranges(self.bucket_name, self.object_name, ranges):
+            for position in range(0, len(data), frame_size):
+                plaintext = self.reader.open(index, data[position:position + frame_size], index == count - 1)
+                base = index * chunk_size
+                output = decompressor.update(plaintext[max(0, start - base):max(0, end - base)])
+                index += 1
+                if output:
+                    yield output
+        tail = decompressor.finalize()
+        if tail:
+            yield tail
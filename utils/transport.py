@@ -0,0 +1,186 @@
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from utils.transfer import mount_pool, WORKERS
+
+# لایه انتقال مشترک همه درخواست‌های HTTP agent به سرور:
+# - یک Session با استخر اتصال keep-alive (بدون handshake جدید TLS برای هر درخواست)
+# - نسخه async درخواست‌ها (اجرا در نخ جداگانه) تا event loop شنونده WebSocket مسدود نشود
+# - محدودکننده پهنای باند token bucket برای بدنه درخواست‌ها (آپلود) با سقف‌های متفاوت در بازه‌های زمانی
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+# حداکثر انفجار مجاز برحسب ثانیه ارسال با نرخ جاری
+BURST_SECONDS = 1.0
+READ_BLOCK = 64 * 1024
+
+
+class BandwidthWindow:
+    """یک بازه زمانی با سقف پهنای باند، مثلاً 'mon-fri 08:00-18:00=50' (50 مگابیت بر ثانیه در ساعات کاری)."""
+
+    def __init__(self, spec: str):
+        try:
+            period, mbps = spec.rsplit("=", 1)
+            parts = period.split()
+            days = parts[0] if len(parts) == 2 else None
+            start, end = parts[-1].split("-")
+            self.start = self._minutes(start)
+            self.end = self._minutes(end)
+            self.mbps = float(mbps)
+            self.days = self._days(days) if days else set(range(7))
+        except (ValueError, IndexError):
+            raise ValueError(f"بازه پهنای باند '{spec}' معتبر نیست (نمونه: 'mon-fri 08:00-18:00=50').")
+
+    @staticmethod
+    def _minutes(text: str) -> int:
+        hour, minute = text.strip().split(":")
+        if not (0 <= int(hour) <= 24 and 0 <= int(minute) < 60):
+            raise ValueError(text)
+        return int(hour) * 60 + int(minute)
+
+    @staticmethod
+    def _days(text: str) -> set:
+        first, _, last = text.lower().partition("-")
+        first, last = DAYS.index(first), DAYS.index(last or first)
+        return {day % 7 for day in range(first, last + 1 if last >= first else last + 8)}
+
+    def contains(self, moment: datetime) -> bool:
+        minute = moment.hour * 60 + moment.minute
+        if self.start <= self.end:
+            return moment.weekday() in self.days and self.start <= minute < self.end
+        # بازه‌های شبانه (مثلاً 22:00-06:00): روز بازه، روز شروع آن است
+        if minute >= self.start:
+            return moment.weekday() in self.days
+        return minute < self.end and (moment.weekday() - 1) % 7 in self.days
+
+
+class BandwidthSchedule:
+    """سقف پهنای باند (مگابیت بر ثانیه) بر اساس زمان؛ اولین بازه منطبق اعمال می‌شود و 0 یعنی بدون محدودیت."""
+
+    def __init__(self, default_mbps: float = 0, windows: list = None):
+        self.default_mbps = default_mbps
+        self.windows = windows or []
+
+    @classmethod
+    def from_config(cls, section: dict):
+        """از بخش [Bandwidth] فایل کانفیگ؛ بازه‌ها با ';' از هم جدا می‌شوند."""
+        specs = [spec.strip() for spec in section.get("windows", "").split(";") if spec.strip()]
+        return cls(float(section.get("upload_mbps", 0)), [BandwidthWindow(spec) for spec in specs])
+
+    def mbps_at(self, moment: datetime = None) -> float:
+        moment = moment or datetime.now()
+        for window in self.windows:
+            if window.contains(moment):
+                return window.mbps
+        return self.default_mbps
+
+    def is_limited(self) -> bool:
+        return bool(self.default_mbps) or any(window.mbps for window in self.windows)
+
+
+class BandwidthLimiter:
+    """
+    token bucket مشترک بین همه نخ‌ها، بنابراین سقف برای مجموع آپلودهای هم‌زمان (بخش‌های موازی و جاب‌های
+    مختلف) اعمال می‌شود. نرخ هر ثانیه از روی برنامه زمانی دوباره خوانده می‌شود تا تغییر بازه در میانه یک
+    آپلود طولانی هم اعمال شود.
+    """
+
+    def __init__(self, schedule: BandwidthSchedule, burst_seconds: float = BURST_SECONDS):
+        self.schedule = schedule
+        self.burst_seconds = burst_seconds
+        self._lock = threading.Lock()
+        self._rate = None
+        self._rate_checked = 0.0
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+
+    def _current_rate(self, now: float) -> float:
+        """نرخ بر حسب بایت بر ثانیه (0 یعنی بدون محدودیت)."""
+        if self._rate is None or now - self._rate_checked >= 1:
+            rate = self.schedule.mbps_at() * 1_000_000 / 8
+            if rate != self._rate:
+                self._tokens = min(self._tokens, rate * self.burst_seconds)
+            self._rate, self._rate_checked = rate, now
+        return self._rate
+
+    def consume(self, size: int):
+        """تا زمانی که ارسال size بایت در سقف جاری مجاز شود صبر می‌کند."""
+        with self._lock:
+            now = time.monotonic()
+            rate = self._current_rate(now)
+            if not rate:
+                self._updated = now
+                return
+            self._tokens = min(self._tokens + (now - self._updated) * rate, rate * self.burst_seconds) - size
+            self._updated = now
+            # سهم این نخ رزرو شده است؛ انتظار خارج از قفل انجام می‌شود تا نخ‌های دیگر در صف بعدی قرار گیرند
+            delay = -self._tokens / rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+    def wrap(self, chunks):
+        for chunk in chunks:
+            self.consume(len(chunk))
+            yield chunk
+
+
+class _ThrottledBody:
+    """بدنه با طول مشخص که هنگام ارسال توسط http.client بلوک به بلوک و با رعایت سقف پهنای باند خوانده می‌شود."""
+
+    def __init__(self, data: bytes, limiter: BandwidthLimiter):
+        self._view = memoryview(data)
+        self._offset = 0
+        self._limiter = limiter
+
+    def __len__(self):
+        return len(self._view)
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = len(self._view) - self._offset
+        block = self._view[self._offset:self._offset + min(size, READ_BLOCK)]
+        self._offset += len(block)
+        self._limiter.consume(len(block))
+        return bytes(block)
+
+
+class ShapedSession(requests.Session):
+    """Session ای که بدنه درخواست‌ها (bytes یا جریان قطعات) را از محدودکننده پهنای باند عبور می‌دهد."""
+
+    def __init__(self, limiter: BandwidthLimiter = None):
+        super().__init__()
+        self.limiter = limiter
+
+    def request(self, method, url, *args, data=None, **kwargs):
+        if self.limiter is not None and data is not None and self.limiter.schedule.is_limited():
+            if isinstance(data, (bytes, bytearray)):
+                data = _ThrottledBody(data, self.limiter)
+            elif not isinstance(data, (str, dict, list, tuple)) and not hasattr(data, "read"):
+                data = self.limiter.wrap(data)
+        return super().request(method, url, *args, data=data, **kwargs)
+
+
+class Transport:
+    """
+    نقطه مشترک ارتباط HTTP با سرور. session آن به آپلودر، دانلودر و انبار dedup نیز داده می‌شود تا همه
+    درخواست‌ها از یک استخر اتصال و یک محدودکننده پهنای باند استفاده کنند.
+    """
+
+    def __init__(self, server_url: str, headers_factory, pool_size: int = WORKERS, limiter: BandwidthLimiter = None,
+                 proxies: dict = None):
+        self.server_url = server_url
+        self.headers_factory = headers_factory
+        self.proxies = proxies
+        self.session = mount_pool(ShapedSession(limiter), pool_size)
+
+    def request(self, method: str, path: str, headers: dict = None, timeout=(10, 300), **kwargs) -> requests.Response:
+        """درخواست به مسیر path روی سرور؛ برای پاسخ‌های ناموفق requests.HTTPError رخ می‌دهد."""
+        response = self.session.request(method, f"{self.server_url}{path}",
+                                        headers={**self.headers_factory(), **(headers or {})},
+                                        proxies=self.proxies, timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,120 @@
+import hashlib
+import random
+
+from utils.compression import create_decompressor
+from utils.dedup import CHUNK_PREFIX
+from utils.security import FrameReader, HEADER_SIZE
+
+# بررسی درستی بکاپ بدون بازیابی روی دیتابیس اصلی.
+#   quick  چند بخش تصادفی شیء (همیشه اولین و آخرین) با Range request دریافت و با هش SHA-256 مانیفست بررسی
+#          می‌شوند و فریم‌های AES-GCM داخل آن‌ها احراز اصالت می‌شوند؛ برای بکاپ dedup وجود همه قطعات مانیفست در
+#          باکت و محتوای چند قطعه تصادفی بررسی می‌شود.
+#   full   کل شیء به صورت جریانی دانلود، رمزگشایی و از حالت فشرده خارج می‌شود، ولی داده فقط شمرده و هش می‌شود
+#          (حافظه ثابت، بدون نوشتن روی دیسک).
+QUICK_SAMPLES = 8
+VERIFY_MODES = ("quick", "full")
+
+
+def sample_indices(count: int, samples: int, rng: random.Random = None) -> list:
+    """شماره‌های نمونه از بین count مورد؛ اولین و آخرین همیشه انتخاب می‌شوند (هدر و پایان جریان)."""
+    if count <= max(samples, 2):
+        return list(range(count))
+    rng = rng or random.SystemRandom()
+    return sorted({0, count - 1, *rng.sample(range(1, count - 1), max(0, samples - 2))})
+
+
+class DigestSink:
+    """مقصد پایپ‌لاین در حالت full: داده فقط شمرده و هش می‌شود و هیچ‌جا نوشته نمی‌شود."""
+
+    def __init__(self):
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    def wrap(self, chunks):
+        for chunk in chunks:
+            self.size += len(chunk)
+            self._hash.update(chunk)
+            yield chunk
+
+    def __call__(self, stream):
+        for _ in self.wrap(stream):
+            pass
+        return self.size
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+
+def _contiguous(ranges: list, blocks: list) -> list:
+    """بخش‌های نمونه پشت سر هم را به هم می‌چسباند تا فریم‌هایی که از مرز دو بخش می‌گذرند هم بررسی شوند."""
+    segments = []
+    for (offset, _, _), data in zip(ranges, blocks):
+        if segments and segments[-1][0] + len(segments[-1][1]) == offset:
+            segments[-1][1].extend(data)
+        else:
+            segments.append((offset, bytearray(data)))
+    return segments
+
+
+def verify_sampled(downloader, key: bytes, bucket_name: str, object_name: str, manifest: dict = None,
+                   samples: int = QUICK_SAMPLES) -> dict:
+    """
+    بررسی سریع یک بکاپ معمولی (downloader یک RangedDownloader است). بدون مانیفست فقط احراز اصالت فریم‌ها
+    انجام می‌شود. ابتدای داده رمزگشایی شده نیز با کدک فشرده‌سازی باز می‌شود تا قالب فشرده‌سازی هم بررسی شود.
+    """
+    size = downloader.probe(bucket_name, object_name)
+    if manifest and manifest["size"] != size:
+        raise ValueError(f"حجم شیء ({size} بایت) با مانیفست ({manifest['size']} بایت) مطابقت ندارد.")
+    ranges = downloader.plan(size, manifest)
+    chosen = [ranges[index] for index in sample_indices(len(ranges), samples)]
+    blocks = downloader.fetch_ranges(bucket_name, object_name, chosen)
+
+    try:
+        reader = FrameReader(key, blocks[0][:HEADER_SIZE])
+    except ValueError as e:
+        # بکاپ‌های قالب قدیمی (Fernet) فریم مستقل ندارند؛ تنها هش بخش‌ها بررسی می‌شود
+        print(f"ℹ️ {e} احراز اصالت نمونه‌ای فریم‌ها انجام نمی‌شود.")
+        reader = None
+    frames = 0
+    if reader is not None:
+        for offset, data in _contiguous(chosen, blocks):
+            for index, frame_offset, frame_length, last in reader.frames(size, offset, offset + len(data)):
+                plaintext = reader.open(index, data[frame_offset - offset:frame_offset - offset + frame_length], last)
+                frames += 1
+                if index == 0 and plaintext:
+                    try:
+                        create_decompressor(object_name).update(plaintext)
+                    except Exception as e:
+                        raise ValueError(f"ابتدای داده با کدک فشرده‌سازی '{object_name}' باز نمی‌شود: {e}")
+    return {
+        "size": size,
+        "parts": len(ranges),
+        "checked_parts": len(chosen),
+        "checked_bytes": sum(length for _, length, _ in chosen),
+        "hashed": bool(manifest),
+        "frames": frames,
+    }
+
+
+def verify_dedup_sampled(store, bucket_name: str, manifest: dict, stored_objects: set,
+                         samples: int = QUICK_SAMPLES) -> dict:
+    """
+    بررسی سریع یک بکاپ dedup (store یک DedupStore است): وجود همه قطعات مانیفست در لیست اشیاء باکت، و محتوای
+    چند قطعه تصادفی (رمزگشایی، باز کردن فشرده‌سازی و مقایسه HMAC با شناسه قطعه).
+    """
+    unique = list(dict.fromkeys((chunk_id, size) for chunk_id, size in manifest["chunks"]))
+    missing = [chunk_id for chunk_id, _ in unique if f"{CHUNK_PREFIX}{chunk_id}" not in stored_objects]
+    if missing:
+        raise ValueError(f"{len(missing)} قطعه از {len(unique)} قطعه بکاپ در باکت یافت نشد (مثلاً '{missing[0]}').")
+    chosen = [unique[index] for index in sample_indices(len(unique), samples)]
+    sample = {"codec": manifest["codec"], "chunks": [list(chunk) for chunk in chosen]}
+    for (chunk_id, size), data in zip(chosen, store.iter_restore(bucket_name, sample)):
+        if len(data) != size:
+            raise ValueError(f"حجم قطعه '{chunk_id}' با مانیفست مطابقت ندارد.")
+    return {
+        "size": manifest["size"],
+        "chunks": len(unique),
+        "checked_chunks": len(chosen),
+        "checked_bytes": sum(size for _, size in chosen),
+    }
@@ -0,0 +1,155 @@
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from utils.archive import iter_tar_files
+
+# بکاپ فیزیکی PostgreSQL: بکاپ پایه دوره‌ای (pg_basebackup) به علاوه آرشیو پیوسته WAL (pg_receivewal).
+# زمان‌ها در نام اشیاء ثبت می‌شوند (UTC) تا بازیابی تا یک لحظه مشخص (PITR) تنها با لیست باکت و بدون
+# ایندکس جداگانه بداند به کدام بکاپ پایه و کدام دسته‌های WAL نیاز دارد:
+#   base_<شروع>.tar<کدک>.enc                       بکاپ پایه (خروجی tar از pg_basebackup، شامل WAL لازم برای سازگاری)
+#   wal_<اولین سگمنت>_<آخرین سگمنت>_<پایان>.tar<کدک>.enc   دسته‌ای از سگمنت‌های کامل WAL
+# زمان <پایان> زمان ارسال دسته است، نه زمان نوشتن WAL آن: دسته‌ای که کمی بعد از T ارسال شده ممکن است فقط
+# سگمنت‌های بسته شده پیش از T را داشته باشد و سگمنت حاوی T هنوز .partial باشد. بنابراین برای بازیابی تا T
+# همه دسته‌ها از شروع بکاپ پایه دانلود می‌شوند و recovery_target_time بازپخش را در T متوقف می‌کند.
+BASE_PREFIX = "base_"
+WAL_PREFIX = "wal_"
+TIME_FORMAT = "%Y%m%dT%H%M%SZ"
+BATCH_SEGMENTS = 16
+BATCH_SECONDS = 300
+POLL_SECONDS = 5
+# سگمنت‌های WAL (24 رقم hex) و فایل‌های history تایم‌لاین
+_WAL_FILE_RE = re.compile(r"^([0-9A-F]{24}|[0-9A-F]{8}\.history)$")
+# فقط خود اشیاء رمزگذاری شده (نه فایل‌های جانبی مثل مانیفست هش بخش‌ها)
+_BASE_RE = re.compile(rf"^{BASE_PREFIX}(\d{{8}}T\d{{6}}Z)\.tar(\.\w+)?\.enc$")
+_BATCH_RE = re.compile(rf"^{WAL_PREFIX}([0-9A-F.a-z]+)_([0-9A-F.a-z]+)_(\d{{8}}T\d{{6}}Z)\.tar(\.\w+)?\.enc$")
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _format(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).strftime(TIME_FORMAT)
+
+
+def _parse(text: str) -> datetime:
+    return datetime.strptime(text, TIME_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def base_backup_name(started_at: datetime) -> str:
+    return f"{BASE_PREFIX}{_format(started_at)}.tar"
+
+
+def wal_batch_name(first: str, last: str, ended_at: datetime) -> str:
+    return f"{WAL_PREFIX}{first}_{last}_{_format(ended_at)}.tar"
+
+
+def parse_target_time(text: str) -> datetime:
+    """زمان هدف بازیابی؛ زمان بدون منطقه زمانی به عنوان وقت محلی همین ماشین در نظر گرفته می‌شود."""
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"زمان هدف '{text}' معتبر نیست (نمونه: '2024-05-01 13:45:00' یا '2024-05-01T10:15:00+00:00').")
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    return moment.astimezone(timezone.utc)
+
+
+def plan_restore(objects: list, target: datetime) -> tuple:
+    """
+    برای رسیدن به لحظه target، آخرین بکاپ پایه‌ای که پیش از آن شروع شده و همه دسته‌های WAL از شروع آن بکاپ
+    پایه را انتخاب می‌کند (توقف در target بر عهده recovery_target_time است). اگر هیچ دسته‌ای پس از target
+    ارسال نشده باشد، WAL آرشیو شده به target نمی‌رسد و ValueError رخ می‌دهد.
+    """
+    bases = sorted((_parse(m.group(1)), name) for name in objects if (m := _BASE_RE.match(name)))
+    batches = sorted((_parse(m.group(3)), m.group(1), name) for name in objects if (m := _BATCH_RE.match(name)))
+    candidates = [(started, name) for started, name in bases if started <= target]
+    if not candidates:
+        raise ValueError(f"هیچ بکاپ پایه‌ای پیش از {target.isoformat()} یافت نشد.")
+    base_started, base_name = candidates[-1]
+
+    selected = [name for ended, _, name in batches if ended >= base_started]
+    if not batches or batches[-1][0] <= target:
+        last = batches[-1][0].isoformat() if batches else "-"
+        raise ValueError(f"WAL آرشیو شده تا {target.isoformat()} نمی‌رسد (آخرین دسته WAL: {last}).")
+    return base_name, selected
+
+
+class WalArchiver:
+    """
+    pg_receivewal را به صورت پیوسته اجرا کرده و سگمنت‌های کامل شده را دسته‌ای (هر batch_segments سگمنت
+    یا حداکثر هر batch_seconds ثانیه) به تابع ship می‌دهد. ship(object_name, chunks) باید جریان tar دسته را
+    فشرده، رمزگذاری و آپلود کند؛ فایل‌های محلی فقط پس از آپلود موفق حذف می‌شوند. چون pg_receivewal از
+    replication slot استفاده می‌کند، قطع شدن agent باعث از دست رفتن WAL نمی‌شود.
+    """
+
+    def __init__(self, command_factory, spool_dir: Path, ship, batch_segments: int = BATCH_SEGMENTS,
+                 batch_seconds: float = BATCH_SECONDS, poll_seconds: float = POLL_SECONDS, env: dict = None):
+        self.command_factory = command_factory
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.ship = ship
+        self.batch_segments = max(1, batch_segments)
+        self.batch_seconds = batch_seconds
+        self.poll_seconds = poll_seconds
+        self.env = env
+        self._process = None
+        self._stderr = None
+
+    def _ready_files(self) -> list:
+        return sorted(path.name for path in self.spool_dir.iterdir() if _WAL_FILE_RE.match(path.name))
+
+    def _ensure_receiver(self):
+        if self._process is not None and self._process.poll() is None:
+            return
+        if self._process is not None:
+            self._stderr.seek(0)
+            error = self._stderr.read().decode(errors="replace").strip()
+            self._stderr.close()
+            print(f"⚠️ [{datetime.now()}] pg_receivewal متوقف شد (کد {self._process.returncode}): {error}")
+        self._stderr = tempfile.TemporaryFile(dir=self.spool_dir.parent)
+        self._process = subprocess.Popen(self.command_factory(self.spool_dir), stdout=subprocess.DEVNULL,
+                                         stderr=self._stderr, env=self.env)
+        print(f"📡 [{datetime.now()}] دریافت پیوسته WAL در '{self.spool_dir}' شروع شد.")
+
+    def flush(self, force: bool = False) -> int:
+        """سگمنت‌های آماده را در دسته‌های batch_segments تایی ارسال می‌کند و تعداد سگمنت‌های ارسال شده را برمی‌گرداند."""
+        shipped = 0
+        while True:
+            names = self._ready_files()
+            if not names:
+                return shipped
+            oldest = min((self.spool_dir / name).stat().st_mtime for name in names)
+            if len(names) < self.batch_segments and not force and time.time() - oldest < self.batch_seconds:
+                return shipped
+            batch = names[:self.batch_segments]
+            segments = [name for name in batch if not name.endswith(".history")] or batch
+            object_name = wal_batch_name(segments[0], segments[-1], utc_now())
+            self.ship(object_name, iter_tar_files(self.spool_dir, batch))
+            for name in batch:
+                (self.spool_dir / name).unlink()
+            shipped += len(batch)
+            print(f"📦 [{datetime.now()}] {len(batch)} فایل WAL در '{object_name}' آرشیو شد.")
+
+    def run(self, stop_event: threading.Event = None):
+        """تا set شدن stop_event اجرا می‌شود؛ خطای آپلود فقط چاپ شده و در دور بعدی دوباره تلاش می‌شود."""
+        stop_event = stop_event or threading.Event()
+        try:
+            while not stop_event.is_set():
+                self._ensure_receiver()
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"❌ آرشیو WAL ناموفق بود (در دور بعدی دوباره تلاش می‌شود): {e}")
+                stop_event.wait(self.poll_seconds)
+        finally:
+            if self._process is not None and self._process.poll() is None:
+                self._process.terminate()
+                self._process.wait()
+            if self._stderr is not None:
+                self._stderr.close()